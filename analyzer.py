@@ -0,0 +1,424 @@
+from html.parser import HTMLParser
+from pathlib import Path
+from urllib.parse import unquote, urljoin, urlsplit
+import json
+
+from critical_css import DEFAULT_VIEWPORT_HEIGHT, above_the_fold_images
+from fingerprint import FINGERPRINTED_NAME
+from resources import load_image_manifest
+
+# Pages of a generated website, in navigation order
+PAGES = ["index.html", "page2.html"]
+
+# Layout width assumed when picking a srcset candidate, in CSS pixels
+DEFAULT_IMAGE_WIDTH = 800
+
+# Elements that can appear in <head>; any other element starts the body,
+# which matters for minified pages without <head>/<body> tags
+HEAD_ELEMENTS = {
+    "base",
+    "html",
+    "link",
+    "meta",
+    "noscript",
+    "script",
+    "style",
+    "template",
+    "title",
+}
+
+# Image types the simulated browser decodes, for <picture> source selection
+SUPPORTED_IMAGE_TYPES = {
+    "image/avif",
+    "image/webp",
+    "image/jpeg",
+    "image/png",
+    "image/gif",
+    "image/svg+xml",
+}
+
+# Transfer encodings reported for every resource, with their sidecar suffix
+ENCODINGS = [("identity", None), ("gzip", ".gz"), ("brotli", ".br")]
+
+# Relative difference of width/height from the image's aspect ratio that
+# still counts as matching, for rounding of the variant heights
+ASPECT_RATIO_TOLERANCE = 0.01
+
+
+def parse_srcset(srcset):
+    """Split a srcset attribute into (url, width) candidates"""
+    candidates = []
+    for candidate in srcset.split(","):
+        parts = candidate.split()
+        if not parts:
+            continue
+        width = 0
+        if len(parts) > 1 and parts[1].endswith("w"):
+            try:
+                width = int(parts[1][:-1])
+            except ValueError:
+                width = 0
+        candidates.append((parts[0], width))
+    return candidates
+
+
+def choose_srcset_candidate(candidates, image_width=DEFAULT_IMAGE_WIDTH):
+    """The candidate a browser would download for the given layout width"""
+    wide_enough = [c for c in candidates if c[1] >= image_width]
+    if wide_enough:
+        return min(wide_enough, key=lambda c: c[1])[0]
+    return max(candidates, key=lambda c: c[1])[0]
+
+
+class PageParser(HTMLParser):
+    """Collect the subresources of a page and how they are loaded"""
+
+    def __init__(self, image_width=DEFAULT_IMAGE_WIDTH):
+        super().__init__()
+        self.image_width = image_width
+        self.resources = []
+        self.in_head = True
+        # Browsers with scripting enabled do not load <noscript> content
+        self.in_noscript = 0
+        # The <source> a browser would pick in the open <picture>, if any
+        self.in_picture = False
+        self.picture_source = None
+        # Attributes of every <img>, and the text of inline stylesheets
+        self.images = []
+        self.styles = []
+        self.in_style = False
+
+    def add(self, url, kind, render_blocking=False, deferred=False, **extra):
+        if not url or urlsplit(url).scheme or url.startswith("#"):
+            return
+        if any(resource["url"] == url for resource in self.resources):
+            return
+        resource = {
+            "url": url,
+            "type": kind,
+            "render_blocking": render_blocking,
+            "deferred": deferred,
+        }
+        resource.update(extra)
+        self.resources.append(resource)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag not in HEAD_ELEMENTS:
+            self.in_head = False
+        if tag == "noscript":
+            self.in_noscript += 1
+        if self.in_noscript:
+            return
+        if tag == "style":
+            self.in_style = True
+        elif tag == "link":
+            rels = set((attrs.get("rel") or "").lower().split())
+            href = attrs.get("href")
+            if "stylesheet" in rels:
+                media = (attrs.get("media") or "all").lower()
+                blocking = media in ("all", "screen")
+                self.add(href, "stylesheet", render_blocking=blocking)
+            elif "icon" in rels:
+                self.add(href, "favicon", deferred=True)
+            elif "prefetch" in rels:
+                self.add(href, "prefetch", deferred=True)
+            elif "preload" in rels:
+                self.add(href, "preload:" + (attrs.get("as") or "fetch"))
+        elif tag == "script" and attrs.get("src"):
+            is_async = "defer" in attrs or "async" in attrs
+            is_async = is_async or attrs.get("type") == "module"
+            self.add(
+                attrs["src"],
+                "script",
+                render_blocking=self.in_head and not is_async,
+                deferred=is_async,
+            )
+        elif tag == "picture":
+            self.in_picture = True
+            self.picture_source = None
+        elif tag == "source" and self.in_picture:
+            # The first source of a supported type wins over the <img>
+            supported = (attrs.get("type") or "").lower() in SUPPORTED_IMAGE_TYPES | {""}
+            if self.picture_source is None and supported:
+                self.picture_source = attrs
+        elif tag in ("img", "source"):
+            candidates = parse_srcset(attrs.get("srcset") or "")
+            url = attrs.get("src")
+            if tag == "img" and self.in_picture and self.picture_source is not None:
+                candidates = parse_srcset(self.picture_source.get("srcset") or "")
+                url = self.picture_source.get("src")
+            if candidates:
+                url = choose_srcset_candidate(candidates, self.image_width)
+            if tag == "img":
+                self.images.append(attrs)
+            lazy = (attrs.get("loading") or "").lower() == "lazy"
+            self.add(
+                url,
+                "image",
+                deferred=lazy,
+                srcset=[candidate[0] for candidate in candidates],
+                srcset_widths=[candidate[1] for candidate in candidates],
+                fetchpriority=attrs.get("fetchpriority"),
+            )
+
+    def handle_data(self, data):
+        if self.in_style:
+            self.styles.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == "style":
+            self.in_style = False
+        elif tag == "head":
+            self.in_head = False
+        elif tag == "noscript" and self.in_noscript:
+            self.in_noscript -= 1
+        elif tag == "picture":
+            self.in_picture = False
+
+
+def site_path(site_dir, page, url):
+    """Path relative to site_dir of a URL referenced by page, or None if
+    it points outside the site"""
+    relative = unquote(urlsplit(urljoin(page, url)).path).lstrip("/")
+    root = Path(site_dir).resolve()
+    if not (root / relative).resolve().is_relative_to(root):
+        return None
+    return relative
+
+
+def lcp_candidate(html, css, viewport_height=DEFAULT_VIEWPORT_HEIGHT):
+    """src of the first image in document order that starts within the
+    first viewport, or None
+
+    The generator picks its LCP image by area; this simpler rule is
+    independent of that choice, so a page where the two disagree is
+    reported rather than trusted.
+    """
+    for src, _, _, _ in above_the_fold_images(html, css, viewport_height=viewport_height):
+        if src:
+            return src
+    return None
+
+
+def transfer_sizes(path):
+    """Bytes on the wire for each encoding, using sidecars where they exist"""
+    if path is None or not path.is_file():
+        return {encoding: 0 for encoding, _ in ENCODINGS}
+    identity = path.stat().st_size
+    sizes = {}
+    for encoding, suffix in ENCODINGS:
+        sidecar = Path(str(path) + suffix) if suffix else path
+        sizes[encoding] = sidecar.stat().st_size if sidecar.is_file() else identity
+    return sizes
+
+
+def add_sizes(total, sizes):
+    for encoding in total:
+        total[encoding] += sizes[encoding]
+
+
+def _dimension(value):
+    """An integer width or height attribute, or None if it is not valid"""
+    value = (value or "").strip()
+    return int(value) if value.isdigit() and int(value) > 0 else None
+
+
+def check_images(site_dir, page, html, parser, viewport_height=DEFAULT_VIEWPORT_HEIGHT):
+    """Layout shift and LCP checks of the images of a parsed page
+
+    Every image needs valid width and height attributes matching its
+    aspect ratio so the browser can reserve its space. The LCP candidate
+    in a viewport_height viewport (the one the pages were built for) must
+    not be lazy-loaded, and no other image may compete with it for
+    fetchpriority="high". Images missing from the site are left to the
+    list of missing resources.
+    """
+    css = list(parser.styles)
+    for resource in parser.resources:
+        if resource["type"] in ("stylesheet", "preload:style") and resource["exists"]:
+            css.append((site_dir / resource["path"]).read_text(encoding="utf-8"))
+    lcp = lcp_candidate(html, "\n".join(css), viewport_height)
+    manifest = load_image_manifest(site_dir)
+
+    issues = []
+    unsized = 0
+    for attrs in parser.images:
+        src = attrs.get("src") or ""
+        path = site_path(site_dir, page, src)
+        if path is None or not (site_dir / path).is_file():
+            continue
+        width, height = _dimension(attrs.get("width")), _dimension(attrs.get("height"))
+        if width is None or height is None:
+            unsized += 1
+            issues.append(f"{src} has no valid width/height, its space is not reserved")
+        else:
+            image = manifest.get(FINGERPRINTED_NAME.sub(r"\1", Path(src).name))
+            if image and abs(width * image["height"] / (height * image["width"]) - 1) > ASPECT_RATIO_TOLERANCE:
+                issues.append(
+                    f"{src} is {width}x{height} in the page but {image['width']}x{image['height']}"
+                )
+        lazy = (attrs.get("loading") or "").lower() == "lazy"
+        high = (attrs.get("fetchpriority") or "").lower() == "high"
+        if src == lcp and lazy:
+            issues.append(f"LCP image {src} is lazy-loaded")
+        if src != lcp and high:
+            issues.append(f"{src} has fetchpriority=high but is not the LCP image")
+    return {"lcp_image": lcp, "unsized_images": unsized, "image_issues": issues}
+
+
+def analyze_page(
+    site_dir, page, image_width=DEFAULT_IMAGE_WIDTH, viewport_height=DEFAULT_VIEWPORT_HEIGHT
+):
+    """Requests, render-blocking bytes and critical chain of one page"""
+    site_dir = Path(site_dir)
+    page_path = site_dir / page
+    parser = PageParser(image_width)
+    html = page_path.read_text(encoding="utf-8")
+    parser.feed(html)
+
+    html_sizes = transfer_sizes(page_path)
+    total = dict(html_sizes)
+    blocking = dict(html_sizes)
+    chain = [{"url": page, "type": "document", "bytes": html_sizes}]
+    missing = []
+
+    for resource in parser.resources:
+        path = site_path(site_dir, page, resource["url"])
+        resource["path"] = path
+        resource["exists"] = path is not None and (site_dir / path).is_file()
+        resource["bytes"] = transfer_sizes(None if path is None else site_dir / path)
+        if not resource["exists"]:
+            missing.append(resource["url"])
+        add_sizes(total, resource["bytes"])
+        if resource["render_blocking"]:
+            add_sizes(blocking, resource["bytes"])
+            chain.append(
+                {
+                    "url": resource["url"],
+                    "type": resource["type"],
+                    "bytes": resource["bytes"],
+                }
+            )
+
+    report = {
+        "page": page,
+        "requests": 1 + len(parser.resources),
+        "render_blocking_requests": len(chain),
+        "render_blocking_bytes": blocking,
+        "transfer_bytes": total,
+        "critical_request_chain": chain,
+        "missing": missing,
+        "resources": parser.resources,
+    }
+    report.update(check_images(site_dir, page, html, parser, viewport_height))
+    return report
+
+
+def diff_metrics(optimized, unoptimized):
+    """Side-by-side comparison of the headline metrics of two page reports"""
+    rows = {}
+    metrics = [("requests", None), ("render_blocking_requests", None), ("unsized_images", None)]
+    metrics += [("render_blocking_bytes", encoding) for encoding, _ in ENCODINGS]
+    metrics += [("transfer_bytes", encoding) for encoding, _ in ENCODINGS]
+    for metric, encoding in metrics:
+        name = f"{metric}.{encoding}" if encoding else metric
+        values = []
+        for report in (optimized, unoptimized):
+            value = report[metric]
+            values.append(value[encoding] if encoding else value)
+        change = values[0] - values[1]
+        rows[name] = {
+            "optimized": values[0],
+            "unoptimized": values[1],
+            "change": change,
+            "change_percent": (
+                round(100 * change / values[1], 1) if values[1] else None
+            ),
+        }
+    return rows
+
+
+def summarize_site(
+    site_dir, image_width=DEFAULT_IMAGE_WIDTH, viewport_height=DEFAULT_VIEWPORT_HEIGHT
+):
+    """Totals of the headline page metrics over all pages of one site"""
+    pages = [analyze_page(site_dir, page, image_width, viewport_height) for page in PAGES]
+    summary = {
+        "requests": sum(page["requests"] for page in pages),
+        "render_blocking_requests": sum(
+            page["render_blocking_requests"] for page in pages
+        ),
+    }
+    for metric in ("render_blocking_bytes", "transfer_bytes"):
+        for encoding, _ in ENCODINGS:
+            summary[f"{metric}.{encoding}"] = sum(
+                page[metric][encoding] for page in pages
+            )
+    return summary
+
+
+def analyze(output_dir, image_width=DEFAULT_IMAGE_WIDTH, viewport_height=DEFAULT_VIEWPORT_HEIGHT):
+    """Analyze every page of both versions and diff them"""
+    output_dir = Path(output_dir)
+    report = {
+        "image_width": image_width,
+        "viewport_height": viewport_height,
+        "variants": {},
+        "diff": {},
+    }
+    for variant in ("optimized", "unoptimized"):
+        report["variants"][variant] = {
+            page: analyze_page(output_dir / variant, page, image_width, viewport_height)
+            for page in PAGES
+        }
+    for page in PAGES:
+        report["diff"][page] = diff_metrics(
+            report["variants"]["optimized"][page],
+            report["variants"]["unoptimized"][page],
+        )
+    return report
+
+
+def print_report(report):
+    """Print the per-page diff of both versions"""
+    for page, rows in report["diff"].items():
+        print(
+            f"\n{page}".ljust(36)
+            + "optimized".rjust(14)
+            + "unoptimized".rjust(14)
+            + "change".rjust(9)
+        )
+        for name, row in rows.items():
+            percent = row["change_percent"]
+            percent = f"{percent:+.0f}%" if percent is not None else "-"
+            print(
+                f"  {name}".ljust(36)
+                + f"{row['optimized']:,}".rjust(14)
+                + f"{row['unoptimized']:,}".rjust(14)
+                + percent.rjust(9)
+            )
+        for variant, pages in report["variants"].items():
+            chain = pages[page]["critical_request_chain"]
+            chain = " -> ".join(step["url"] for step in chain)
+            print(f"  critical chain ({variant}): {chain}")
+            if pages[page]["missing"]:
+                print(f"  ⚠ missing in {variant}: {', '.join(pages[page]['missing'])}")
+            if variant == "optimized":
+                print(f"  LCP image ({variant}): {pages[page]['lcp_image'] or '-'}")
+                for issue in pages[page]["image_issues"]:
+                    print(f"  ⚠ {variant}: {issue}")
+
+
+def image_issues(report, variant="optimized"):
+    """The image checks a version of the site fails, over all pages"""
+    return [
+        f"{page}: {issue}"
+        for page, result in report["variants"][variant].items()
+        for issue in result["image_issues"]
+    ]
+
+
+def write_report(report, path):
+    """Store the analysis as JSON"""
+    Path(path).write_text(json.dumps(report, indent=2))
@@ -0,0 +1,253 @@
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+import asyncio
+import json
+import math
+import threading
+import time
+
+from analyzer import DEFAULT_IMAGE_WIDTH, PAGES, PageParser
+from server import (
+    KEEP_ALIVE_TIMEOUT,
+    OPTIMIZED_CACHE_CONTROL,
+    UNOPTIMIZED_CACHE_CONTROL,
+    StaticServer,
+    StaticSite,
+)
+
+# Accept-Encoding sent by current desktop browsers
+BROWSER_ACCEPT_ENCODING = "gzip, deflate, br, zstd"
+
+
+def collect_requests(site_dir, image_width=DEFAULT_IMAGE_WIDTH):
+    """Request paths of a full visit to every page of a generated site"""
+    requests = []
+    for page in PAGES:
+        requests.append("/" + page)
+        parser = PageParser(image_width)
+        parser.feed((Path(site_dir) / page).read_text(encoding="utf-8"))
+        for resource in parser.resources:
+            path = urlsplit(urljoin("/" + page, resource["url"])).path
+            if path not in requests:
+                requests.append(path)
+    return requests
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class ServerThread(threading.Thread):
+    """Run a StaticServer on an ephemeral port in a background event loop"""
+
+    def __init__(self, site, name):
+        super().__init__(daemon=True)
+        self.server = StaticServer(site, name, quiet=True)
+        self.ready = threading.Event()
+        self.loop = None
+        self.listener = None
+        self.port = None
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        self.listener = self.loop.run_until_complete(
+            self.server.start("127.0.0.1", 0)
+        )
+        self.port = self.listener.sockets[0].getsockname()[1]
+        self.ready.set()
+        self.loop.run_forever()
+        self.loop.close()
+
+    async def shutdown(self):
+        """Stop listening and let the open connections finish"""
+        self.listener.close()
+        handlers = asyncio.all_tasks() - {asyncio.current_task()}
+        if handlers:
+            _, pending = await asyncio.wait(handlers, timeout=KEEP_ALIVE_TIMEOUT)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        await self.listener.wait_closed()
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.join()
+
+
+async def fetch(reader, writer, host, path, accept_encoding):
+    """Send one keep-alive GET and read the response
+
+    Returns the status and the number of bytes received on the wire.
+    """
+    request = (
+        f"GET {path} HTTP/1.1\r\n"
+        f"Host: {host}\r\n"
+        f"Accept-Encoding: {accept_encoding}\r\n"
+        f"Connection: keep-alive\r\n\r\n"
+    )
+    writer.write(request.encode("latin-1"))
+    await writer.drain()
+
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ")[1])
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    received = len(head)
+    if "content-length" in headers:
+        length = int(headers["content-length"])
+        await reader.readexactly(length)
+        received += length
+    elif headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            size_line = await reader.readuntil(b"\r\n")
+            size = int(size_line.split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            received += len(size_line) + size + 2
+            if size == 0:
+                break
+    return status, received
+
+
+async def run_client(base_url, requests, iterations, accept_encoding, samples):
+    """Replay the request list over one keep-alive connection"""
+    url = urlsplit(base_url)
+    host = url.hostname or "127.0.0.1"
+    port = url.port or 80
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(iterations):
+            for path in requests:
+                start = time.perf_counter()
+                status, received = await fetch(
+                    reader, writer, url.netloc, path, accept_encoding
+                )
+                samples.append((time.perf_counter() - start, status, received))
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def run_load(base_url, requests, clients, iterations, accept_encoding):
+    """Run concurrent clients against one site and collect their samples"""
+    samples = []
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            run_client(base_url, requests, iterations, accept_encoding, samples)
+            for _ in range(clients)
+        )
+    )
+    return samples, time.perf_counter() - start
+
+
+def summarize(samples, elapsed, requests, clients, iterations):
+    """Throughput, latency percentiles and transfer size of one variant"""
+    latencies = sorted(sample[0] * 1000 for sample in samples)
+    errors = sum(1 for sample in samples if sample[1] >= 400)
+    total_bytes = sum(sample[2] for sample in samples)
+    visits = clients * iterations
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "bytes_total": total_bytes,
+        "bytes_per_visit": total_bytes // visits if visits else 0,
+        "resources_per_visit": len(requests),
+    }
+
+
+def bench(
+    output_dir,
+    clients=50,
+    iterations=10,
+    accept_encoding=BROWSER_ACCEPT_ENCODING,
+    image_width=DEFAULT_IMAGE_WIDTH,
+    urls=None,
+    json_path=None,
+):
+    """Load-test the optimized and unoptimized builds and compare them
+
+    Each simulated client replays a visit to every page (the HTML plus all
+    the resources it references) over a keep-alive connection. The sites
+    are served by the built-in server unless base URLs are given in urls.
+    """
+    output_dir = Path(output_dir)
+    variants = [
+        ("optimized", OPTIMIZED_CACHE_CONTROL, True),
+        ("unoptimized", UNOPTIMIZED_CACHE_CONTROL, False),
+    ]
+    urls = urls or {}
+    results = {}
+
+    print(
+        f"Benchmarking with {clients} concurrent clients x {iterations} visits "
+        f"(Accept-Encoding: {accept_encoding})"
+    )
+    for name, cache_control, precompressed in variants:
+        site_dir = output_dir / name
+        requests = collect_requests(site_dir, image_width)
+
+        server_thread = None
+        base_url = urls.get(name)
+        if base_url is None:
+            site = StaticSite(site_dir, cache_control, precompressed=precompressed)
+            server_thread = ServerThread(site, name)
+            server_thread.start()
+            server_thread.ready.wait()
+            base_url = f"http://127.0.0.1:{server_thread.port}"
+
+        try:
+            samples, elapsed = asyncio.run(
+                run_load(base_url, requests, clients, iterations, accept_encoding)
+            )
+        finally:
+            if server_thread is not None:
+                server_thread.stop()
+
+        results[name] = summarize(samples, elapsed, requests, clients, iterations)
+
+    print_comparison(results)
+    if json_path:
+        Path(json_path).write_text(json.dumps(results, indent=2))
+        print(f"\nResults written to {json_path}")
+    return results
+
+
+def print_comparison(results):
+    """Print the variants side by side"""
+    rows = [
+        ("Requests", "requests", "{}"),
+        ("Errors (4xx/5xx)", "errors", "{}"),
+        ("Requests/sec", "requests_per_s", "{:.1f}"),
+        ("Latency p50 (ms)", "p50_ms", "{:.2f}"),
+        ("Latency p95 (ms)", "p95_ms", "{:.2f}"),
+        ("Latency p99 (ms)", "p99_ms", "{:.2f}"),
+        ("Resources per visit", "resources_per_visit", "{}"),
+        ("Bytes per visit", "bytes_per_visit", "{:,}"),
+        ("Bytes on the wire", "bytes_total", "{:,}"),
+    ]
+    names = list(results)
+    print("\n" + "Metric".ljust(22) + "".join(name.rjust(16) for name in names))
+    print("-" * (22 + 16 * len(names)))
+    for label, key, fmt in rows:
+        print(
+            label.ljust(22)
+            + "".join(fmt.format(results[name][key]).rjust(16) for name in names)
+        )
@@ -0,0 +1,102 @@
+from pathlib import Path
+import hashlib
+import json
+
+try:
+    import brotli
+
+    BROTLI_VERSION = getattr(brotli, "__version__", "unknown")
+except ImportError:
+    BROTLI_VERSION = None
+
+try:
+    import PIL
+
+    PIL_VERSION = PIL.__version__
+except ImportError:
+    PIL_VERSION = None
+
+# Bump whenever the way an artifact is produced changes, so stale cache
+# entries from older builds are not reused
+BUILD_TOOL_VERSION = "4"
+
+MANIFEST_NAME = ".build-cache.json"
+
+
+class BuildCache:
+    """Persistent manifest of generated artifacts keyed on their inputs
+
+    Every entry maps an artifact name to the hash of everything that went
+    into producing it (source bytes, options, tool versions) and the list of
+    files it wrote. An artifact is reused when its key is unchanged and all
+    of its files still exist.
+    """
+
+    def __init__(self, root, enabled=True):
+        self.root = Path(root)
+        self.manifest_path = self.root / MANIFEST_NAME
+        self.enabled = enabled
+        self.entries = {}
+        self.reused = []
+        self.rebuilt = []
+
+        if enabled and self.manifest_path.exists():
+            try:
+                self.entries = json.loads(self.manifest_path.read_text())
+            except (OSError, ValueError):
+                print(f"  ⚠ Warning: unreadable build cache, rebuilding everything")
+                self.entries = {}
+
+    def key(self, *parts):
+        """Hash the given inputs together with the tool versions"""
+        digest = hashlib.sha256()
+        for part in (BUILD_TOOL_VERSION, PIL_VERSION, BROTLI_VERSION) + parts:
+            if isinstance(part, Path):
+                with open(part, "rb") as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b""):
+                        digest.update(chunk)
+            elif isinstance(part, bytes):
+                digest.update(part)
+            else:
+                digest.update(json.dumps(part, sort_keys=True).encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def is_fresh(self, name, key):
+        """Check whether an artifact can be reused, and record it if so"""
+        entry = self.entries.get(name)
+        if not self.enabled or entry is None or entry["key"] != key:
+            return False
+        if not all((self.root / output).exists() for output in entry["outputs"]):
+            return False
+        self.reused.append(name)
+        return True
+
+    def record(self, name, key, outputs):
+        """Store the key and written files of a freshly built artifact"""
+        self.entries[name] = {
+            "key": key,
+            "outputs": [Path(output).relative_to(self.root).as_posix() for output in outputs],
+        }
+        self.rebuilt.append(name)
+
+    def name(self, path):
+        """Artifact name of a path inside the cache root"""
+        return Path(path).relative_to(self.root).as_posix()
+
+    def save(self):
+        """Write the manifest back to disk"""
+        if not self.enabled:
+            return
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        self.manifest_path.write_text(json.dumps(self.entries, indent=2, sort_keys=True))
+
+    def report(self):
+        """Print a summary of reused and rebuilt artifacts"""
+        if not self.enabled:
+            return
+        print(
+            f"\nBuild cache: reused {len(self.reused)} artifact(s), rebuilt {len(self.rebuilt)}"
+        )
+        for name in self.reused:
+            print(f"  ↺ {name}")
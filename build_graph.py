@@ -0,0 +1,127 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import io
+import sys
+import threading
+import time
+
+
+class _ThreadOutput:
+    """sys.stdout replacement sending the writes of every thread with a
+    buffer to that buffer, and everything else to the wrapped stream"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text):
+        buffer = getattr(self.local, "buffer", None)
+        return (self.stream if buffer is None else buffer).write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class BuildGraph:
+    """Named build steps and the steps whose outputs they take
+
+    Every step runs once; its output is memoized and passed, in order, as
+    the positional arguments of the steps depending on it. Steps whose
+    dependencies are done run concurrently on a thread pool: the heavy
+    work (image encoding, compression, hashing) releases the GIL, and
+    image processing fans out to processes on its own. What a step prints
+    is buffered and printed in the order the steps were added, so the log
+    reads like that of a sequential build.
+    """
+
+    def __init__(self):
+        self.steps = {}
+        self.results = {}
+        self.timings = {}
+        self.wall_time = 0.0
+
+    def add(self, name, func, *deps):
+        """Add a step; its dependencies must have been added before it"""
+        if name in self.steps:
+            raise ValueError(f"duplicate build step {name!r}")
+        for dep in deps:
+            if dep not in self.steps:
+                raise ValueError(f"unknown dependency {dep!r} of build step {name!r}")
+        self.steps[name] = (func, deps)
+        return name
+
+    def run(self, workers=None):
+        """Run every step that has not run yet and return all outputs"""
+        pending = [name for name in self.steps if name not in self.results]
+        order = list(pending)
+        logs = {}
+        output = _ThreadOutput(sys.stdout)
+        sys.stdout = output
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                running = {}
+                while pending or running:
+                    for name in list(pending):
+                        if all(dep in self.results for dep in self.steps[name][1]):
+                            pending.remove(name)
+                            running[executor.submit(self._run_step, output, name)] = name
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        self.results[name], logs[name] = future.result()
+                    # Print the logs of the finished steps nothing earlier
+                    # is still waiting for
+                    while order and order[0] in logs:
+                        output.stream.write(logs.pop(order.pop(0)))
+        finally:
+            sys.stdout = output.stream
+            for name in order:
+                if name in logs:
+                    print(logs[name], end="")
+        self.wall_time += time.perf_counter() - start
+        return self.results
+
+    def _run_step(self, output, name):
+        func, deps = self.steps[name]
+        buffer = io.StringIO()
+        output.local.buffer = buffer
+        start = time.perf_counter()
+        try:
+            result = func(*(self.results[dep] for dep in deps))
+        except BaseException:
+            output.stream.write(buffer.getvalue())
+            raise
+        finally:
+            output.local.buffer = None
+        self.timings[name] = (start, time.perf_counter())
+        return result, buffer.getvalue()
+
+    def critical_path(self):
+        """The chain of dependent steps that took longest, and its duration"""
+        longest = {}
+        for name, (func, deps) in self.steps.items():
+            if name not in self.timings:
+                continue
+            start, end = self.timings[name]
+            before = max(
+                (longest[dep] for dep in deps if dep in longest),
+                key=lambda path: path[0],
+                default=(0.0, []),
+            )
+            longest[name] = (before[0] + end - start, before[1] + [name])
+        return max(longest.values(), key=lambda path: path[0], default=(0.0, []))
+
+    def report(self):
+        """Print the wall-clock time against the summed and critical-path
+        durations of the steps"""
+        total = sum(end - start for start, end in self.timings.values())
+        duration, path = self.critical_path()
+        print(
+            f"\nBuild graph: {len(self.timings)} steps in {self.wall_time:.2f}s "
+            f"(steps {total:.2f}s summed, critical path {duration:.2f}s)"
+        )
+        if path:
+            print(f"  Critical path: {' → '.join(path)}")
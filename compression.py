@@ -0,0 +1,204 @@
+from pathlib import Path
+import gzip
+import mmap
+import time
+import zlib
+
+try:
+    import brotli
+
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# Formats that are already entropy-coded; gzip/brotli cannot shrink them
+INCOMPRESSIBLE_EXTENSIONS = {
+    ".avif",
+    ".webp",
+    ".jpg",
+    ".jpeg",
+    ".png",
+    ".gif",
+    ".woff2",
+    ".gz",
+    ".br",
+    ".zip",
+}
+
+# Number of leading bytes compressed to estimate the ratio of unknown types
+TRIAL_SIZE = 64 * 1024
+
+# Size of the chunks fed to the compressors
+CHUNK_SIZE = 256 * 1024
+
+
+class CompressionPolicy:
+    """Decide per asset whether precompressed .gz/.br sidecars are worth it
+
+    Assets of known incompressible types are skipped outright, other
+    assets first go through a quick trial compression of their leading
+    bytes. A sidecar is only kept when it is at least min_saving smaller
+    than the original; otherwise it is removed so the server never picks
+    it. Bytes saved and CPU time spent are collected for a final report.
+    """
+
+    def __init__(
+        self, gzip_level=9, brotli_quality=11, trial_ratio=0.9, min_saving=0.05
+    ):
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.trial_ratio = trial_ratio
+        self.min_saving = min_saving
+        self.results = []
+
+    def copy(self):
+        """A policy with the same settings and no results yet"""
+        return CompressionPolicy(
+            self.gzip_level, self.brotli_quality, self.trial_ratio, self.min_saving
+        )
+
+    def settings(self):
+        """Settings that influence the written sidecars, for cache keys"""
+        return [
+            self.gzip_level,
+            self.brotli_quality if BROTLI_AVAILABLE else None,
+            self.trial_ratio,
+            self.min_saving,
+        ]
+
+    def encoders(self, sidecar_path):
+        """Open streaming compressors writing to the sidecars of a file
+
+        Returns (suffix, file, write, finish) tuples; write takes a chunk
+        and finish flushes the remaining compressed bytes.
+        """
+        encoders = []
+
+        gz_file = open(str(sidecar_path) + ".gz", "wb")
+        gz = gzip.GzipFile(
+            fileobj=gz_file, mode="wb", compresslevel=self.gzip_level, mtime=0
+        )
+        encoders.append((".gz", gz_file, gz.write, gz.close))
+
+        if BROTLI_AVAILABLE:
+            br_file = open(str(sidecar_path) + ".br", "wb")
+            br = brotli.Compressor(quality=self.brotli_quality)
+            encoders.append(
+                (
+                    ".br",
+                    br_file,
+                    lambda chunk: br_file.write(br.process(chunk)),
+                    lambda: br_file.write(br.finish()),
+                )
+            )
+        return encoders
+
+    def trial_skip_reason(self, sample):
+        """Reason for not compressing content after a trial run, or None"""
+        if sample:
+            ratio = len(zlib.compress(sample, 1)) / len(sample)
+            if ratio > self.trial_ratio:
+                return f"trial ratio {ratio:.2f} above {self.trial_ratio:.2f}"
+        return None
+
+    def compress(self, path, data=None):
+        """Write the worthwhile sidecars of an asset and drop the others
+
+        The content is compressed in a single streaming pass, either from
+        the rendered bytes passed as data or from an mmap of the written
+        file, so memory use does not grow with the asset size.
+
+        Returns a result dict with the kept sidecar paths and sizes. Results
+        are not collected here because compression may run in a worker
+        process; pass them to record() for the report.
+        """
+        path = Path(path)
+        result = {
+            "path": str(path),
+            "size": len(data) if data is not None else path.stat().st_size,
+            "kept": [],
+            "sizes": {},
+            "cpu_time": 0.0,
+            "skipped": None,
+        }
+
+        if path.suffix.lower() in INCOMPRESSIBLE_EXTENSIONS:
+            result["skipped"] = f"{path.suffix.lstrip('.')} is already compressed"
+        elif data is not None:
+            self._stream(path, memoryview(data), result)
+        elif result["size"]:
+            with open(path, "rb") as f, mmap.mmap(
+                f.fileno(), 0, access=mmap.ACCESS_READ
+            ) as mapped:
+                self._stream(path, memoryview(mapped), result)
+
+        # Remove sidecars that are not worth serving, including stale ones
+        for suffix in [".gz", ".br"]:
+            sidecar = Path(str(path) + suffix)
+            if sidecar not in result["kept"]:
+                sidecar.unlink(missing_ok=True)
+
+        return result
+
+    def _stream(self, path, view, result):
+        """Feed the content chunk by chunk to all compressors at once"""
+        result["skipped"] = self.trial_skip_reason(view[:TRIAL_SIZE])
+        if result["skipped"]:
+            return
+
+        start = time.process_time()
+        encoders = self.encoders(path)
+        try:
+            for offset in range(0, len(view), CHUNK_SIZE):
+                chunk = view[offset : offset + CHUNK_SIZE]
+                for _, _, write, _ in encoders:
+                    write(chunk)
+            for _, _, _, finish in encoders:
+                finish()
+        finally:
+            for _, sidecar_file, _, _ in encoders:
+                sidecar_file.close()
+        result["cpu_time"] = time.process_time() - start
+
+        for suffix, sidecar_file, _, _ in encoders:
+            sidecar = Path(sidecar_file.name)
+            size = sidecar.stat().st_size
+            if size <= result["size"] * (1 - self.min_saving):
+                result["kept"].append(sidecar)
+                result["sizes"][suffix] = size
+
+    def describe(self, result):
+        """One-line log message for a compression result"""
+        name = Path(result["path"]).name
+        if result["skipped"]:
+            return f"    Skipped compressing {name} ({result['skipped']})"
+        if not result["kept"]:
+            return f"    Dropped sidecars for {name} (less than {self.min_saving:.0%} smaller)"
+        sizes = ", ".join(
+            f"{suffix.lstrip('.')} {size}" for suffix, size in result["sizes"].items()
+        )
+        return (
+            f"    Compressed {name}: {result['size']} -> {sizes} bytes "
+            f"in {result['cpu_time'] * 1000:.0f} ms"
+        )
+
+    def record(self, results):
+        """Collect compression results for the report"""
+        self.results.extend(results)
+
+    def report(self):
+        """Print the bytes saved against the CPU time spent"""
+        if not self.results:
+            return
+        compressed = [result for result in self.results if result["kept"]]
+        skipped = [result for result in self.results if result["skipped"]]
+        # Bytes saved for a client that accepts the best kept encoding
+        saved = sum(
+            result["size"] - min(result["sizes"].values()) for result in compressed
+        )
+        cpu_time = sum(result["cpu_time"] for result in self.results)
+        print(
+            f"\nCompression: {len(compressed)} of {len(self.results)} asset(s) got sidecars, "
+            f"{len(skipped)} skipped as incompressible, "
+            f"{saved / 1024:.1f} KB saved in {cpu_time:.2f} s CPU"
+        )
@@ -0,0 +1,374 @@
+from html.parser import HTMLParser
+import math
+import re
+
+from css_optimizer import AtRule, Rule, parse_css, specificity
+from css_purge import empty_usage, purge_css
+
+# Viewport assumed when deciding what is above the fold, in CSS pixels
+DEFAULT_VIEWPORT_WIDTH = 1280
+DEFAULT_VIEWPORT_HEIGHT = 800
+
+ROOT_FONT_SIZE = 16
+DEFAULT_LINE_HEIGHT = 1.2
+# Average glyph width relative to the font size, used for line wrapping
+CHAR_WIDTH = 0.5
+# Size of images that give no width or height attribute
+DEFAULT_IMAGE_WIDTH = 300
+DEFAULT_IMAGE_HEIGHT = 150
+
+# Default font sizes of headings relative to their parent
+HEADING_SIZES = {"h1": 2, "h2": 1.5, "h3": 1.17, "h4": 1, "h5": 0.83, "h6": 0.67}
+
+INLINE_ELEMENTS = {
+    "a", "abbr", "b", "br", "button", "cite", "code", "em", "i", "kbd", "label",
+    "mark", "q", "s", "small", "span", "strong", "sub", "sup", "time", "u",
+}
+VOID_ELEMENTS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+    "source", "track", "wbr",
+}
+# Elements whose content is never laid out
+HIDDEN_ELEMENTS = {"head", "noscript", "script", "style", "template", "title"}
+
+ROW_DISPLAYS = {"flex", "inline-flex", "grid", "inline-grid"}
+
+MEDIA_WIDTH = re.compile(r"\(\s*(min|max)-width\s*:\s*([\d.]+)px\s*\)")
+
+
+def _length(value, font_size, viewport_width, percent_of=0):
+    """A CSS length in pixels, or None if it cannot be resolved statically"""
+    match = re.fullmatch(r"(-?[\d.]+)(px|rem|em|vw|%)?", value.strip())
+    if not match:
+        return None
+    number, unit = float(match.group(1)), match.group(2)
+    if unit == "rem":
+        return number * ROOT_FONT_SIZE
+    if unit == "em":
+        return number * font_size
+    if unit == "vw":
+        return number * viewport_width / 100
+    if unit == "%":
+        return number * percent_of / 100
+    return number
+
+
+def _sides(style, prop, font_size, viewport_width):
+    """(top, right, bottom, left) of a margin or padding in pixels"""
+    values = style.get(prop, "0").split()[:4] or ["0"]
+    values += [values[0]] * (2 - len(values))
+    values += [values[0]] * (3 - len(values))
+    values += [values[1]] * (4 - len(values))
+    for index, side in enumerate(("top", "right", "bottom", "left")):
+        values[index] = style.get(f"{prop}-{side}", values[index])
+    return [_length(value, font_size, viewport_width) or 0 for value in values]
+
+
+def _compile_selector(selector):
+    """Compounds (tag, classes, ids) of a descendant selector
+
+    Returns None for selectors that cannot take part in the first paint
+    layout estimate: pseudo-classes, attribute selectors and sibling
+    combinators.
+    """
+    if re.search(r"[:\[+~]", selector):
+        return None
+    compounds = []
+    for compound in re.split(r"\s*>\s*|\s+", selector.strip()):
+        match = re.fullmatch(r"(\*|[a-zA-Z][\w-]*)?((?:[.#][\w-]+)*)", compound)
+        if not match:
+            return None
+        tag = match.group(1) if match.group(1) != "*" else None
+        compounds.append(
+            (
+                tag and tag.lower(),
+                set(re.findall(r"\.([\w-]+)", match.group(2))),
+                set(re.findall(r"#([\w-]+)", match.group(2))),
+            )
+        )
+    return compounds
+
+
+def _compound_matches(compound, element):
+    tag, classes, ids = compound
+    return (tag is None or tag == element[0]) and classes <= element[1] and ids <= element[2]
+
+
+def _matches(compounds, element, ancestors):
+    if not _compound_matches(compounds[-1], element):
+        return False
+    index = len(ancestors) - 1
+    for compound in reversed(compounds[:-1]):
+        while index >= 0 and not _compound_matches(compound, ancestors[index]):
+            index -= 1
+        if index < 0:
+            return False
+        index -= 1
+    return True
+
+
+def _media_applies(prelude, viewport_width):
+    """Whether a width-only media query matches the viewport; others do not"""
+    rest = MEDIA_WIDTH.sub("", prelude.lower())
+    if re.sub(r"\b(and|only|screen|all)\b|\s", "", rest):
+        return False
+    for kind, width in MEDIA_WIDTH.findall(prelude.lower()):
+        width = float(width)
+        if (kind == "min" and viewport_width < width) or (
+            kind == "max" and viewport_width > width
+        ):
+            return False
+    return True
+
+
+def layout_rules(css, viewport_width=DEFAULT_VIEWPORT_WIDTH):
+    """(specificity, order, compounds, declarations) of the rules that apply
+    at the given viewport width"""
+    rules = []
+
+    def collect(nodes):
+        for node in nodes:
+            if isinstance(node, Rule):
+                for selector in node.selectors:
+                    compounds = _compile_selector(selector)
+                    if compounds:
+                        declarations = {prop: value for prop, value, _ in node.declarations}
+                        rules.append(
+                            (specificity(selector), len(rules), compounds, declarations)
+                        )
+            elif isinstance(node, AtRule) and node.name == "media" and node.rules:
+                if _media_applies(node.prelude, viewport_width):
+                    collect(node.rules)
+
+    collect(parse_css(css))
+    rules.sort(key=lambda rule: rule[:2])
+    return rules
+
+
+class FoldParser(HTMLParser):
+    """Estimate the flow layout of a page to find the elements that start
+    above the fold
+
+    This is a coarse model: text is wrapped at an average glyph width,
+    children of flex and grid containers are placed on a single row and
+    margins do not collapse. Over-estimating what is visible only costs a
+    few inlined rules, so every approximation errs on that side.
+    """
+
+    def __init__(self, rules, viewport_width, viewport_height):
+        super().__init__()
+        self.rules = rules
+        self.viewport_width = viewport_width
+        self.fold = viewport_height
+        self.usage = empty_usage()
+        # (src, top, width, height) of the images starting above the fold
+        self.images = []
+        self.hidden = 0
+        self.stack = [self._frame(None, {}, ROOT_FONT_SIZE, DEFAULT_LINE_HEIGHT, viewport_width, 0)]
+
+    def _frame(self, element, style, font_size, line_height, width, top, inline=False):
+        display = style.get("display", "")
+        return {
+            "element": element,
+            "style": style,
+            "font_size": font_size,
+            "line_height": line_height,
+            "width": width,
+            "top": top,
+            "content": 0,
+            "text": 0,
+            "inline": inline,
+            "row": display in ROW_DISPLAYS and "column" not in style.get("flex-direction", ""),
+        }
+
+    def computed_style(self, element):
+        ancestors = [frame["element"] for frame in self.stack[1:]]
+        style = {}
+        for _, _, compounds, declarations in self.rules:
+            if _matches(compounds, element, ancestors):
+                style.update(declarations)
+        return style
+
+    def block(self):
+        return next(frame for frame in reversed(self.stack) if not frame["inline"])
+
+    def add_height(self, frame, height):
+        if frame["row"]:
+            frame["content"] = max(frame["content"], height)
+        else:
+            frame["content"] += height
+
+    def flush_text(self, frame):
+        if frame["text"]:
+            line_width = max(frame["width"], frame["font_size"])
+            lines = math.ceil(frame["text"] * CHAR_WIDTH * frame["font_size"] / line_width)
+            self.add_height(frame, lines * frame["font_size"] * frame["line_height"])
+            frame["text"] = 0
+
+    def y(self, frame):
+        return frame["top"] + (0 if frame["row"] else frame["content"])
+
+    def record(self, tag, attrs):
+        self.usage["tags"].add(tag)
+        for name, value in attrs.items():
+            self.usage["attributes"].add(name)
+            if name == "class" and value:
+                self.usage["classes"].update(value.split())
+            elif name == "id" and value:
+                self.usage["ids"].add(value)
+
+    def handle_starttag(self, tag, attrs):
+        if self.hidden or tag in HIDDEN_ELEMENTS:
+            if tag not in VOID_ELEMENTS:
+                self.hidden += 1
+            return
+        attrs = dict(attrs)
+        element = (tag, set((attrs.get("class") or "").split()), {attrs.get("id")} - {None})
+        style = self.computed_style(element)
+        if style.get("display") == "none":
+            if tag not in VOID_ELEMENTS:
+                self.hidden += 1
+            return
+
+        parent = self.stack[-1]
+        font_size = parent["font_size"] * HEADING_SIZES.get(tag, 1)
+        if "font-size" in style:
+            font_size = _length(
+                style["font-size"], parent["font_size"], self.viewport_width, parent["font_size"]
+            ) or font_size
+        line_height = parent["line_height"]
+        if "line-height" in style:
+            value = style["line-height"]
+            line_height = _length(value, font_size, self.viewport_width) or line_height
+            if not re.fullmatch(r"[\d.]+", value.strip()):
+                line_height /= font_size
+
+        block = self.block()
+        inline = tag in INLINE_ELEMENTS and "block" not in style.get("display", "")
+        if inline or tag in ("html", "body"):
+            if self.y(block) < self.fold:
+                self.record(tag, attrs)
+            if tag not in VOID_ELEMENTS:
+                self.stack.append(
+                    self._frame(element, style, font_size, line_height, block["width"], self.y(block), inline)
+                )
+            return
+
+        self.flush_text(block)
+        margin = _sides(style, "margin", font_size, self.viewport_width)
+        padding = _sides(style, "padding", font_size, self.viewport_width)
+        top = self.y(block) + margin[0]
+        if top < self.fold:
+            self.record(tag, attrs)
+
+        if tag == "img":
+            width, height = self.image_size(attrs, style, font_size, block["width"])
+            if top < self.fold:
+                self.images.append((attrs.get("src"), top, width, height))
+            self.add_height(block, margin[0] + height + margin[2])
+            return
+        if tag in VOID_ELEMENTS:
+            return
+
+        width = block["width"]
+        max_width = _length(style.get("max-width", ""), font_size, self.viewport_width, width)
+        if max_width is not None:
+            width = min(width, max_width)
+        frame = self._frame(
+            element, style, font_size, line_height, width - padding[1] - padding[3], top + padding[0]
+        )
+        frame["box"] = (margin, padding)
+        self.stack.append(frame)
+
+    def image_size(self, attrs, style, font_size, available):
+        """Displayed (width, height) of an image, keeping the aspect ratio
+        of its width and height attributes when CSS sets only one side"""
+        intrinsic_width = _length(attrs.get("width") or "", font_size, self.viewport_width)
+        intrinsic_height = _length(attrs.get("height") or "", font_size, self.viewport_width)
+        width = _length(style.get("width", ""), font_size, self.viewport_width, available)
+        height = _length(style.get("height", ""), font_size, self.viewport_width)
+        if width is None:
+            width = min(available, intrinsic_width or DEFAULT_IMAGE_WIDTH)
+        if height is None:
+            if intrinsic_width and intrinsic_height:
+                height = width * intrinsic_height / intrinsic_width
+            else:
+                height = intrinsic_height or DEFAULT_IMAGE_HEIGHT
+        return width, height
+
+    def handle_endtag(self, tag):
+        if self.hidden:
+            if tag not in VOID_ELEMENTS:
+                self.hidden -= 1
+            return
+        if tag in VOID_ELEMENTS or not any(
+            frame["element"] and frame["element"][0] == tag for frame in self.stack
+        ):
+            return
+        while True:
+            frame = self.stack.pop()
+            if not frame["inline"] and "box" in frame:
+                self.flush_text(frame)
+                margin, padding = frame["box"]
+                height = _length(
+                    frame["style"].get("height", ""), frame["font_size"], self.viewport_width
+                )
+                if height is None:
+                    height = padding[0] + frame["content"] + padding[2]
+                self.add_height(self.block(), margin[0] + height + margin[2])
+            if frame["element"][0] == tag:
+                return
+
+    def handle_data(self, data):
+        if self.hidden:
+            return
+        text = " ".join(data.split())
+        if text:
+            self.block()["text"] += len(text) + 1
+
+
+def above_the_fold_usage(
+    html, css, viewport_width=DEFAULT_VIEWPORT_WIDTH, viewport_height=DEFAULT_VIEWPORT_HEIGHT
+):
+    """Tags, classes, ids and attributes of the elements that start within
+    the first viewport of a page"""
+    parser = FoldParser(layout_rules(css, viewport_width), viewport_width, viewport_height)
+    parser.feed(html)
+    parser.close()
+    return parser.usage
+
+
+def above_the_fold_images(
+    html, css, viewport_width=DEFAULT_VIEWPORT_WIDTH, viewport_height=DEFAULT_VIEWPORT_HEIGHT
+):
+    """(src, top, width, height) of the images that start within the first
+    viewport of a page, in document order"""
+    parser = FoldParser(layout_rules(css, viewport_width), viewport_width, viewport_height)
+    parser.feed(html)
+    parser.close()
+    return parser.images
+
+
+def lcp_image(
+    html, css, viewport_width=DEFAULT_VIEWPORT_WIDTH, viewport_height=DEFAULT_VIEWPORT_HEIGHT
+):
+    """src of the image likely to be the Largest Contentful Paint of a page
+
+    That is the image with the largest area within the first viewport,
+    the earliest one on ties, or None if no image starts above the fold.
+    """
+    best, best_area = None, 0
+    images = above_the_fold_images(html, css, viewport_width, viewport_height)
+    for src, top, width, height in images:
+        area = width * max(0, min(top + height, viewport_height) - top)
+        if src and area > best_area:
+            best, best_area = src, area
+    return best
+
+
+def critical_css(
+    html, css, viewport_width=DEFAULT_VIEWPORT_WIDTH, viewport_height=DEFAULT_VIEWPORT_HEIGHT
+):
+    """The rules of a stylesheet needed to render the first viewport of a page"""
+    usage = above_the_fold_usage(html, css, viewport_width, viewport_height)
+    return purge_css(css, usage)[0]
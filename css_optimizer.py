@@ -0,0 +1,874 @@
+from functools import lru_cache
+import re
+import zlib
+
+# At-rules whose block holds declarations rather than rules
+DECLARATION_AT_RULES = {
+    "font-face",
+    "page",
+    "property",
+    "counter-style",
+    "font-palette-values",
+    "viewport",
+}
+
+LENGTH_UNITS = {
+    "px",
+    "em",
+    "rem",
+    "ex",
+    "ch",
+    "vw",
+    "vh",
+    "vmin",
+    "vmax",
+    "cm",
+    "mm",
+    "q",
+    "in",
+    "pt",
+    "pc",
+}
+
+# Functions inside which "0px" and "0" are not interchangeable
+MATH_FUNCTIONS = {"calc", "min", "max", "clamp", "var", "env"}
+
+# Properties in which a unitless 0 is a number rather than a length, like
+# the flex-grow and flex-shrink factors of flex
+ZERO_LENGTH_PROPERTIES = {"flex", "-webkit-flex", "-ms-flex"}
+
+# Properties whose values may contain colours
+COLOR_PROPERTIES = re.compile(
+    r"^(color|background(-color)?|border(-(top|right|bottom|left))?(-color)?"
+    r"|outline(-color)?|box-shadow|text-shadow|fill|stroke|caret-color"
+    r"|accent-color|column-rule(-color)?|text-decoration(-color)?)$"
+)
+
+# Colour keywords and the hex colours they can replace, whichever is shorter
+SHORTER_COLORS = {
+    "white": "#fff",
+    "black": "#000",
+    "fuchsia": "#f0f",
+    "yellow": "#ff0",
+    "#f00": "red",
+    "#808080": "gray",
+    "#008000": "green",
+    "#800000": "maroon",
+    "#000080": "navy",
+    "#808000": "olive",
+    "#800080": "purple",
+    "#c0c0c0": "silver",
+    "#008080": "teal",
+    "#ffa500": "orange",
+    "#ff7f50": "coral",
+    "#ffd700": "gold",
+    "#a52a2a": "brown",
+    "#4b0082": "indigo",
+    "#ffc0cb": "pink",
+    "#dda0dd": "plum",
+    "#fa8072": "salmon",
+    "#d2b48c": "tan",
+    "#ff6347": "tomato",
+    "#ee82ee": "violet",
+    "#f5deb3": "wheat",
+    "#f0ffff": "azure",
+    "#f5f5dc": "beige",
+}
+
+FONT_WEIGHTS = {"normal": "400", "bold": "700"}
+
+# Shorthands taking one to four values for top, right, bottom and left
+BOX_SHORTHANDS = {
+    "margin",
+    "padding",
+    "inset",
+    "border-width",
+    "border-style",
+    "border-color",
+    "border-radius",
+    "scroll-margin",
+    "scroll-padding",
+}
+
+# Shorthands that can be rebuilt from their four longhands
+LONGHAND_SHORTHANDS = {
+    "margin": ["margin-top", "margin-right", "margin-bottom", "margin-left"],
+    "padding": ["padding-top", "padding-right", "padding-bottom", "padding-left"],
+}
+
+SIDES = ["top", "right", "bottom", "left"]
+LOGICAL_SIDES = ["block", "inline", "block-start", "block-end", "inline-start", "inline-end"]
+
+
+def _box_shorthand(shorthand, longhand, physical=None):
+    """Table entries of a shorthand setting longhand.format(side) for
+    every side, and of its logical shorthands
+
+    The logical longhands set one of the physical ones, which one depends
+    on the writing mode.
+    """
+    physical = [(physical or longhand).format(side) for side in SIDES]
+    logical = {
+        longhand.format(axis): [longhand.format(f"{axis}-{edge}") for edge in ("start", "end")]
+        for axis in ("block", "inline")
+    }
+    entries = {shorthand: physical + list(logical), **logical}
+    for longhands in logical.values():
+        entries.update({name: physical for name in longhands})
+    return entries
+
+
+# Longhands of every shorthand, the shorthands among them included; two
+# properties interact when their longhands overlap
+SHORTHANDS = {
+    **_box_shorthand("margin", "margin-{}"),
+    **_box_shorthand("padding", "padding-{}"),
+    **_box_shorthand("scroll-margin", "scroll-margin-{}"),
+    **_box_shorthand("scroll-padding", "scroll-padding-{}"),
+    **_box_shorthand("inset", "inset-{}", physical="{}"),
+    **_box_shorthand("border-width", "border-{}-width"),
+    **_box_shorthand("border-style", "border-{}-style"),
+    **_box_shorthand("border-color", "border-{}-color"),
+    **{
+        f"border-{side}": [f"border-{side}-{part}" for part in ("width", "style", "color")]
+        for side in SIDES + LOGICAL_SIDES
+    },
+    "border": [
+        "border-width",
+        "border-style",
+        "border-color",
+        "border-top",
+        "border-right",
+        "border-bottom",
+        "border-left",
+        "border-block",
+        "border-inline",
+        "border-image",
+    ],
+    "border-image": [
+        "border-image-source",
+        "border-image-slice",
+        "border-image-width",
+        "border-image-outset",
+        "border-image-repeat",
+    ],
+    "border-radius": [
+        "border-top-left-radius",
+        "border-top-right-radius",
+        "border-bottom-right-radius",
+        "border-bottom-left-radius",
+        "border-start-start-radius",
+        "border-start-end-radius",
+        "border-end-start-radius",
+        "border-end-end-radius",
+    ],
+    **{
+        f"border-{corner}-radius": [
+            "border-top-left-radius",
+            "border-top-right-radius",
+            "border-bottom-right-radius",
+            "border-bottom-left-radius",
+        ]
+        for corner in ("start-start", "start-end", "end-start", "end-end")
+    },
+    "outline": ["outline-color", "outline-style", "outline-width"],
+    "background": [
+        "background-color",
+        "background-image",
+        "background-repeat",
+        "background-attachment",
+        "background-position",
+        "background-size",
+        "background-origin",
+        "background-clip",
+    ],
+    "background-position": ["background-position-x", "background-position-y"],
+    "font": [
+        "font-style",
+        "font-variant",
+        "font-weight",
+        "font-stretch",
+        "font-size",
+        "line-height",
+        "font-family",
+        "font-size-adjust",
+        "font-kerning",
+        "font-feature-settings",
+        "font-language-override",
+        "font-optical-sizing",
+        "font-variation-settings",
+        "font-palette",
+    ],
+    "font-variant": [
+        "font-variant-caps",
+        "font-variant-ligatures",
+        "font-variant-numeric",
+        "font-variant-east-asian",
+        "font-variant-alternates",
+        "font-variant-position",
+        "font-variant-emoji",
+    ],
+    "list-style": ["list-style-type", "list-style-position", "list-style-image"],
+    "text-decoration": [
+        "text-decoration-line",
+        "text-decoration-style",
+        "text-decoration-color",
+        "text-decoration-thickness",
+    ],
+    "text-emphasis": ["text-emphasis-style", "text-emphasis-color"],
+    "gap": ["row-gap", "column-gap"],
+    "grid-gap": ["row-gap", "column-gap"],
+    "grid-row-gap": ["row-gap"],
+    "grid-column-gap": ["column-gap"],
+    "columns": ["column-width", "column-count"],
+    "column-rule": ["column-rule-width", "column-rule-style", "column-rule-color"],
+    "place-content": ["align-content", "justify-content"],
+    "place-items": ["align-items", "justify-items"],
+    "place-self": ["align-self", "justify-self"],
+    "flex": ["flex-grow", "flex-shrink", "flex-basis"],
+    "flex-flow": ["flex-direction", "flex-wrap"],
+    "grid": [
+        "grid-template",
+        "grid-auto-rows",
+        "grid-auto-columns",
+        "grid-auto-flow",
+        "row-gap",
+        "column-gap",
+    ],
+    "grid-template": ["grid-template-rows", "grid-template-columns", "grid-template-areas"],
+    "grid-area": ["grid-row", "grid-column"],
+    "grid-row": ["grid-row-start", "grid-row-end"],
+    "grid-column": ["grid-column-start", "grid-column-end"],
+    "overflow": ["overflow-x", "overflow-y"],
+    "overscroll-behavior": ["overscroll-behavior-x", "overscroll-behavior-y"],
+    "transition": [
+        "transition-property",
+        "transition-duration",
+        "transition-timing-function",
+        "transition-delay",
+        "transition-behavior",
+    ],
+    "animation": [
+        "animation-name",
+        "animation-duration",
+        "animation-timing-function",
+        "animation-delay",
+        "animation-iteration-count",
+        "animation-direction",
+        "animation-fill-mode",
+        "animation-play-state",
+        "animation-timeline",
+    ],
+    "mask": [
+        "mask-image",
+        "mask-mode",
+        "mask-repeat",
+        "mask-position",
+        "mask-clip",
+        "mask-origin",
+        "mask-size",
+        "mask-composite",
+    ],
+    "container": ["container-name", "container-type"],
+    "contain-intrinsic-size": ["contain-intrinsic-width", "contain-intrinsic-height"],
+    "offset": [
+        "offset-position",
+        "offset-path",
+        "offset-distance",
+        "offset-rotate",
+        "offset-anchor",
+    ],
+}
+
+# Pairs of rules considered for extracting shared declarations
+PAIRWISE_MERGE_LIMIT = 400
+
+NUMBER = re.compile(r"(?<![\w#.-])([+-]?)(\d*\.?\d+(?:e[+-]?\d+)?)([a-zA-Z%]*)")
+HEX_COLOR = re.compile(r"#([0-9a-fA-F]{8}|[0-9a-fA-F]{6}|[0-9a-fA-F]{3,4})\b")
+VALUE_TOKEN = re.compile(
+    r"""("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'|url\([^)]*\))"""
+    r"|([\w-]*\()|(\))|(,)|(/)|(\s+)|([^\s\"'(),/]+)|(.)",
+    re.IGNORECASE,
+)
+VENDOR_SELECTOR = re.compile(r"::?-")
+AT_RULE_NAME = re.compile(r"@([\w-]*)")
+
+
+class Rule:
+    """Selectors and their declarations as (property, value, important)"""
+
+    __slots__ = ("selectors", "declarations")
+
+    def __init__(self, selectors, declarations):
+        self.selectors = selectors
+        self.declarations = declarations
+
+    def properties(self):
+        return {declaration[0] for declaration in self.declarations}
+
+
+class AtRule:
+    """An at-rule with nested rules, declarations or no block at all"""
+
+    __slots__ = ("name", "prelude", "rules", "declarations")
+
+    def __init__(self, name, prelude, rules=None, declarations=None):
+        self.name = name
+        self.prelude = prelude
+        self.rules = rules
+        self.declarations = declarations
+
+    def properties(self):
+        properties = {d[0] for d in self.declarations or ()}
+        for rule in self.rules or ():
+            properties |= rule.properties()
+        return properties
+
+
+def strip_comments(css):
+    """Remove comments, leaving strings alone"""
+    output = []
+    pos = 0
+    length = len(css)
+    while pos < length:
+        char = css[pos]
+        if char in "\"'":
+            end = _string_end(css, pos)
+            output.append(css[pos:end])
+            pos = end
+        elif css.startswith("/*", pos):
+            end = css.find("*/", pos + 2)
+            pos = length if end < 0 else end + 2
+            output.append(" ")
+        else:
+            next_pos = _next_special(css, pos + 1)
+            output.append(css[pos:next_pos])
+            pos = next_pos
+    return "".join(output)
+
+
+def _string_end(css, pos):
+    quote = css[pos]
+    pos += 1
+    while pos < len(css):
+        if css[pos] == "\\":
+            pos += 2
+        elif css[pos] == quote or css[pos] == "\n":
+            return pos + 1
+        else:
+            pos += 1
+    return len(css)
+
+
+_SPECIAL = re.compile(r"[\"']|/\*")
+
+
+def _next_special(css, pos):
+    match = _SPECIAL.search(css, pos)
+    return match.start() if match else len(css)
+
+
+def _split_top_level(text, separators, pos=0, stop=None):
+    """Split text at separators outside strings, parentheses and brackets
+
+    Returns (parts, end) where end is the index of the stop character or
+    the end of the text.
+    """
+    parts = []
+    start = pos
+    depth = 0
+    length = len(text)
+    while pos < length:
+        char = text[pos]
+        if char in "\"'":
+            pos = _string_end(text, pos)
+            continue
+        if char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        elif depth == 0 and stop is not None and char in stop:
+            break
+        elif depth == 0 and char in separators:
+            parts.append(text[start:pos])
+            start = pos + 1
+        pos += 1
+    parts.append(text[start:pos])
+    return parts, pos
+
+
+def _block_end(css, pos):
+    """Index of the "}" closing the block that starts after pos"""
+    depth = 1
+    length = len(css)
+    while pos < length:
+        char = css[pos]
+        if char in "\"'":
+            pos = _string_end(css, pos)
+            continue
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return pos
+        pos += 1
+    return length
+
+
+def _parse_declarations(text):
+    declarations = []
+    parts, _ = _split_top_level(text, ";")
+    for part in parts:
+        name, colon, value = part.partition(":")
+        name = name.strip()
+        if not colon or not name:
+            continue
+        value = value.strip()
+        important = False
+        match = re.search(r"!\s*important\s*$", value, re.IGNORECASE)
+        if match:
+            important = True
+            value = value[: match.start()].strip()
+        if not name.startswith("--"):
+            name = name.lower()
+        declarations.append((name, value, important))
+    return declarations
+
+
+def _parse_rules(css, pos, end):
+    nodes = []
+    while pos < end:
+        while pos < end and (css[pos].isspace() or css[pos] == ";"):
+            pos += 1
+        if pos >= end:
+            break
+
+        if css[pos] == "@":
+            name_match = AT_RULE_NAME.match(css, pos)
+            name = name_match.group(1).lower()
+            _, stop = _split_top_level(css, "", name_match.end(), "{;")
+            prelude = " ".join(css[name_match.end() : stop].split())
+            if stop >= end or css[stop] == ";":
+                nodes.append(AtRule(name, prelude))
+                pos = stop + 1
+                continue
+            block_end = min(_block_end(css, stop + 1), end)
+            body = css[stop + 1 : block_end]
+            if name in DECLARATION_AT_RULES:
+                nodes.append(AtRule(name, prelude, declarations=_parse_declarations(body)))
+            else:
+                nodes.append(AtRule(name, prelude, rules=_parse_rules(body, 0, len(body))))
+            pos = block_end + 1
+            continue
+
+        _, stop = _split_top_level(css, "", pos, "{")
+        if stop >= end:
+            break
+        selectors, _ = _split_top_level(css[pos:stop], ",")
+        selectors = [" ".join(s.split()) for s in selectors if s.strip()]
+        block_end = min(_block_end(css, stop + 1), end)
+        nodes.append(Rule(selectors, _parse_declarations(css[stop + 1 : block_end])))
+        pos = block_end + 1
+    return nodes
+
+
+@lru_cache(maxsize=32)
+def parse_css(css):
+    """Parse a stylesheet into a list of Rule and AtRule nodes
+
+    The result is cached per stylesheet text and must be treated as
+    read-only; the optimizer works on copies.
+    """
+    css = strip_comments(css)
+    return tuple(_parse_rules(css, 0, len(css)))
+
+
+def _minify_number(sign, number, unit, in_math):
+    if "e" in number.lower():
+        return sign + number + unit
+    if "." in number:
+        number = number.rstrip("0").rstrip(".")
+    number = number.lstrip("0") or "0"
+    if number.startswith(".") and len(number) == 1:
+        number = "0"
+    if number == "0":
+        sign = ""
+        if unit.lower() in LENGTH_UNITS and not in_math:
+            unit = ""
+    return sign + number + unit
+
+
+def _shorten_hex(match):
+    digits = match.group(1).lower()
+    if len(digits) in (6, 8) and all(
+        digits[i] == digits[i + 1] for i in range(0, len(digits), 2)
+    ):
+        digits = digits[::2]
+    return "#" + digits
+
+
+def _minify_word(prop, word, in_math):
+    """Shortest form of a number, colour or keyword in a value"""
+    if HEX_COLOR.fullmatch(word):
+        word = HEX_COLOR.sub(_shorten_hex, word)
+        if COLOR_PROPERTIES.match(prop):
+            word = SHORTER_COLORS.get(word, word)
+        return word
+    if COLOR_PROPERTIES.match(prop) and word.lower() in SHORTER_COLORS:
+        return SHORTER_COLORS[word.lower()]
+    return NUMBER.sub(
+        lambda m: _minify_number(m.group(1), m.group(2), m.group(3), in_math), word
+    )
+
+
+def minify_value(prop, value):
+    """Shortest equivalent of a declaration value"""
+    if prop.startswith("--") or prop == "unicode-range":
+        return value.strip()
+
+    tokens = VALUE_TOKEN.findall(value)
+    keep_units = prop in ZERO_LENGTH_PROPERTIES
+    output = []
+    # For each open function, whether it is (inside) calc() and friends
+    functions = []
+    for index, (literal, function, close, comma, slash, space, word, other) in enumerate(tokens):
+        in_math = bool(functions) and functions[-1]
+        if space:
+            following = tokens[index + 1] if index + 1 < len(tokens) else None
+            if not output or output[-1].endswith(("(", ",")):
+                continue
+            if following is None or following[2] or following[3]:
+                continue
+            if not in_math and (output[-1] == "/" or (following and following[4])):
+                continue
+            output.append(" ")
+        elif function:
+            functions.append(in_math or function[:-1].lower() in MATH_FUNCTIONS)
+            output.append(function)
+        elif close:
+            if functions:
+                functions.pop()
+            if output and output[-1] == " ":
+                output.pop()
+            output.append(")")
+        elif comma or slash:
+            if output and output[-1] == " " and (comma or not in_math):
+                output.pop()
+            output.append(comma or slash)
+        elif word:
+            output.append(_minify_word(prop, word, in_math or keep_units))
+        else:
+            output.append(literal or other)
+    value = "".join(output)
+
+    if prop == "font-weight":
+        value = FONT_WEIGHTS.get(value.lower(), value)
+    if prop in ("border", "border-top", "border-right", "border-bottom", "border-left", "outline"):
+        if value.lower() == "none":
+            value = "0"
+    if prop in BOX_SHORTHANDS and "/" not in value:
+        value = " ".join(_collapse_box(value.split()))
+    return value
+
+
+def _collapse_box(values):
+    """Drop values of a box shorthand that repeat their opposite side"""
+    if len(values) == 4 and values[1] == values[3]:
+        values = values[:3]
+    if len(values) == 3 and values[0] == values[2]:
+        values = values[:2]
+    if len(values) == 2 and values[0] == values[1]:
+        values = values[:1]
+    return values
+
+
+def minify_selector(selector):
+    """Remove the whitespace a selector does not need"""
+    parts = re.split(r"(\"(?:[^\"\\]|\\.)*\"|'(?:[^'\\]|\\.)*')", selector)
+    for index in range(0, len(parts), 2):
+        part = " ".join(parts[index].split())
+        parts[index] = re.sub(r"\s*([>+~])\s*", r"\1", part)
+    return "".join(parts)
+
+
+def minify_prelude(prelude):
+    prelude = " ".join(prelude.split())
+    prelude = re.sub(r"\(\s*", "(", prelude)
+    prelude = re.sub(r"\s*\)", ")", prelude)
+    prelude = re.sub(r"\s*:\s*", ":", prelude)
+    prelude = re.sub(r"\s*,\s*", ",", prelude)
+    return NUMBER.sub(lambda m: _minify_number(m.group(1), m.group(2), m.group(3), True), prelude)
+
+
+def _minify_declarations(declarations):
+    """Minify values, merge longhands and drop exact duplicates"""
+    declarations = [(p, minify_value(p, v), i) for p, v, i in declarations]
+
+    for shorthand, longhands in LONGHAND_SHORTHANDS.items():
+        present = [d for d in declarations if d[0] in longhands]
+        names = [d[0] for d in present]
+        if sorted(names) != sorted(longhands) or any(d[0] == shorthand for d in declarations):
+            continue
+        if len({d[2] for d in present}) != 1:
+            continue
+        by_name = {d[0]: d[1] for d in present}
+        values = _collapse_box([by_name[name] for name in longhands])
+        first = declarations.index(present[0])
+        merged = (shorthand, " ".join(values), present[0][2])
+        declarations = [d for d in declarations if d[0] not in longhands]
+        declarations.insert(first, merged)
+
+    # The last of two identical declarations is the one that counts
+    seen = set()
+    unique = []
+    for declaration in reversed(declarations):
+        if declaration not in seen:
+            seen.add(declaration)
+            unique.append(declaration)
+    return unique[::-1]
+
+
+@lru_cache(maxsize=None)
+def _longhands(prop):
+    """A property and every longhand it sets, without vendor prefix"""
+    prop = re.sub(r"^-(webkit|moz|ms|o)-", "", prop)
+    longhands = {prop}
+    for longhand in SHORTHANDS.get(prop, ()):
+        longhands |= _longhands(longhand)
+    return frozenset(longhands)
+
+
+def _interact(properties, others):
+    """Whether declaring properties and others in either order could give
+    a different result"""
+    if "all" in properties or "all" in others:
+        return True
+    longhands = set()
+    for prop in properties:
+        longhands |= _longhands(prop)
+    return any(not longhands.isdisjoint(_longhands(prop)) for prop in others)
+
+
+def specificity(selector):
+    """(ids, classes, types) of a selector, or None if it is not simple
+
+    Selectors with functional pseudo-classes such as :is() or :not() are
+    reported as None and treated as conflicting with everything.
+    """
+    if re.search(r":(is|not|has|where|nth-[\w-]+|matches|-\w+-any)\(", selector):
+        return None
+    selector = re.sub(r"\[[^\]]*\]", ".attribute", selector)
+    selector = re.sub(r"\([^)]*\)", "", selector)
+    ids = len(re.findall(r"#[\w-]+", selector))
+    pseudo_elements = len(
+        re.findall(r"::[\w-]+|:(?:before|after|first-line|first-letter)\b", selector)
+    )
+    selector = re.sub(r"::[\w-]+|:(?:before|after|first-line|first-letter)\b", "", selector)
+    classes = len(re.findall(r"[.:][\w-]+", selector))
+    types = len(re.findall(r"(?:^|[\s>+~])[a-zA-Z][\w-]*", selector))
+    return (ids, classes, types + pseudo_elements)
+
+
+def _rules_within(node):
+    if isinstance(node, Rule):
+        yield node
+    else:
+        for rule in node.rules or ():
+            yield from _rules_within(rule)
+
+
+def _conflicts(nodes, start, end, rule, properties):
+    """Whether moving declarations of rule before the nodes between start
+    and end could change the cascade
+
+    That is the case when one of them declares a property setting one of
+    the same longhands for a selector of the same specificity, or for a
+    selector whose specificity is unknown.
+    """
+    moving = {specificity(s) for s in rule.selectors}
+    for node in nodes[start + 1 : end]:
+        if isinstance(node, AtRule) and node.declarations is not None:
+            continue
+        for other in _rules_within(node):
+            if not _interact(properties, other.properties()):
+                continue
+            other_specificities = {specificity(s) for s in other.selectors}
+            if None in moving or None in other_specificities:
+                return True
+            if moving & other_specificities:
+                return True
+    return False
+
+
+def _mergeable_selectors(rule):
+    """Unknown vendor selectors invalidate a whole list, keep them apart"""
+    return not any(VENDOR_SELECTOR.search(s) for s in rule.selectors)
+
+
+def _merge_rules(nodes):
+    """Merge rules with equal selectors or equal declaration blocks"""
+    merged = True
+    while merged:
+        merged = False
+        for later in range(len(nodes)):
+            rule = nodes[later]
+            if not isinstance(rule, Rule):
+                continue
+            for earlier in range(later):
+                other = nodes[earlier]
+                if not isinstance(other, Rule):
+                    continue
+                if _conflicts(nodes, earlier, later, rule, rule.properties()):
+                    continue
+                if other.selectors == rule.selectors:
+                    other.declarations = _minify_declarations(
+                        other.declarations + rule.declarations
+                    )
+                elif other.declarations == rule.declarations and (
+                    _mergeable_selectors(rule) and _mergeable_selectors(other)
+                ):
+                    other.selectors = other.selectors + [
+                        s for s in rule.selectors if s not in other.selectors
+                    ]
+                else:
+                    continue
+                del nodes[later]
+                merged = True
+                break
+            if merged:
+                break
+    return nodes
+
+
+def _declarations_length(declarations):
+    return sum(len(p) + len(v) + 2 + (10 if i else 0) for p, v, i in declarations)
+
+
+def _extract_shared(nodes):
+    """Move declarations two rules share into a rule for both selectors"""
+    rules = [n for n in nodes if isinstance(n, Rule)]
+    if len(rules) > PAIRWISE_MERGE_LIMIT:
+        return nodes
+    extracted = True
+    while extracted:
+        extracted = False
+        for later in range(len(nodes)):
+            rule = nodes[later]
+            if not isinstance(rule, Rule) or not _mergeable_selectors(rule):
+                continue
+            for earlier in range(later):
+                other = nodes[earlier]
+                if not isinstance(other, Rule) or not _mergeable_selectors(other):
+                    continue
+                shared = [d for d in other.declarations if d in rule.declarations]
+                if not shared:
+                    continue
+                rest = [d for d in other.declarations if d not in shared]
+                rest += [d for d in rule.declarations if d not in shared]
+                if _interact({d[0] for d in shared}, {d[0] for d in rest}):
+                    continue
+                if _conflicts(nodes, earlier, later, rule, {d[0] for d in shared}):
+                    continue
+                selectors = other.selectors + [
+                    s for s in rule.selectors if s not in other.selectors
+                ]
+                cost = len(",".join(selectors)) + 2
+                saving = _declarations_length(shared)
+                if saving <= cost:
+                    continue
+                other.declarations = [d for d in other.declarations if d not in shared]
+                rule.declarations = [d for d in rule.declarations if d not in shared]
+                nodes.insert(earlier, Rule(selectors, shared))
+                extracted = True
+                break
+            if extracted:
+                break
+    return [n for n in nodes if not isinstance(n, Rule) or n.declarations]
+
+
+def optimize(nodes, extract_shared=True):
+    """Optimized copy of a parsed stylesheet"""
+    optimized = []
+    for node in nodes:
+        if isinstance(node, Rule):
+            declarations = _minify_declarations(node.declarations)
+            if declarations and node.selectors:
+                selectors = list(dict.fromkeys(minify_selector(s) for s in node.selectors))
+                optimized.append(Rule(selectors, declarations))
+        elif node.rules is not None:
+            rules = optimize(node.rules, extract_shared)
+            if rules:
+                prelude = minify_prelude(node.prelude)
+                previous = optimized[-1] if optimized else None
+                if (
+                    isinstance(previous, AtRule)
+                    and previous.rules is not None
+                    and (previous.name, previous.prelude) == (node.name, prelude)
+                ):
+                    previous.rules = optimize(previous.rules + rules, extract_shared)
+                else:
+                    optimized.append(AtRule(node.name, prelude, rules=rules))
+        elif node.declarations is not None:
+            declarations = _minify_declarations(node.declarations)
+            if declarations:
+                optimized.append(
+                    AtRule(node.name, minify_prelude(node.prelude), declarations=declarations)
+                )
+        else:
+            optimized.append(AtRule(node.name, minify_prelude(node.prelude)))
+    optimized = _merge_rules(optimized)
+    return _extract_shared(optimized) if extract_shared else optimized
+
+
+def _serialize_declarations(declarations):
+    return ";".join(
+        f"{p}:{v}{'!important' if i else ''}" for p, v, i in declarations
+    )
+
+
+def serialize(nodes):
+    """Minified CSS text of a list of nodes"""
+    output = []
+    for node in nodes:
+        if isinstance(node, Rule):
+            output.append(
+                ",".join(node.selectors)
+                + "{"
+                + _serialize_declarations(node.declarations)
+                + "}"
+            )
+            continue
+        head = f"@{node.name}" + (f" {node.prelude}" if node.prelude else "")
+        if node.rules is not None:
+            output.append(head + "{" + serialize(node.rules) + "}")
+        elif node.declarations is not None:
+            output.append(head + "{" + _serialize_declarations(node.declarations) + "}")
+        else:
+            output.append(head + ";")
+    return "".join(output)
+
+
+def smallest_on_the_wire(candidates):
+    """The candidate stylesheet that compresses best
+
+    Pulling shared declarations into combined rules shortens the text but
+    removes repetition that gzip and brotli would have encoded almost for
+    free, so the variants are compared after compression.
+    """
+    return min(
+        candidates, key=lambda css: (len(zlib.compress(css.encode(), 9)), len(css))
+    )
+
+
+@lru_cache(maxsize=32)
+def optimize_css(css):
+    """Parse, optimize and serialize a stylesheet
+
+    Results are cached, so a stylesheet that is both inlined and written
+    as styles.css is only optimized once.
+    """
+    nodes = parse_css(css)
+    return smallest_on_the_wire(
+        [serialize(optimize(nodes, extract)) for extract in (False, True)]
+    )
@@ -0,0 +1,156 @@
+from html.parser import HTMLParser
+import re
+
+from css_optimizer import AtRule, Rule, parse_css, serialize
+
+# Elements the parser creates even when their tags are omitted
+IMPLIED_TAGS = {"html", "head", "body"}
+
+# Pseudo-classes whose arguments are selectors; matching them is left to
+# the browser, so rules using them are always kept
+FUNCTIONAL_PSEUDO = re.compile(r":(is|not|has|where|matches|-\w+-any)\(")
+
+PSEUDO = re.compile(r"::?[\w-]+(\((?:[^()]|\([^()]*\))*\))?")
+COMBINATOR = re.compile(r"\s*[\s>+~]\s*")
+
+# Class names a script adds at runtime through classList or className
+SCRIPT_CLASS_CALL = re.compile(
+    r"classList\.(?:add|toggle|replace)\(([^)]*)\)|className\s*\+?=\s*([^;\n]*)"
+)
+STRING_LITERAL = re.compile(r"'([^'\\]*)'|\"([^\"\\]*)\"|`([^`\\$]*)`")
+
+
+class UsageParser(HTMLParser):
+    """Collect the tags, classes, ids and attributes present in a page"""
+
+    def __init__(self):
+        super().__init__()
+        self.usage = empty_usage()
+
+    def handle_starttag(self, tag, attrs):
+        self.usage["tags"].add(tag)
+        for name, value in attrs:
+            self.usage["attributes"].add(name)
+            if name == "class" and value:
+                self.usage["classes"].update(value.split())
+            elif name == "id" and value:
+                self.usage["ids"].add(value)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+
+
+def empty_usage():
+    return {"tags": set(IMPLIED_TAGS), "classes": set(), "ids": set(), "attributes": set()}
+
+
+def collect_usage(html):
+    """Selectors-relevant names present in one HTML page"""
+    parser = UsageParser()
+    parser.feed(html)
+    parser.close()
+    return parser.usage
+
+
+def script_classes(js):
+    """Class names a script toggles, found in classList/className calls"""
+    classes = set()
+    for match in SCRIPT_CLASS_CALL.finditer(js):
+        arguments = match.group(1) or match.group(2)
+        for literal in STRING_LITERAL.finditer(arguments):
+            text = next(group for group in literal.groups() if group is not None)
+            classes.update(text.split())
+    return classes
+
+
+def merge_usage(*usages, safelist=()):
+    """Union of the usage of several pages plus safelisted classes"""
+    merged = empty_usage()
+    for usage in usages:
+        for key in merged:
+            merged[key] |= usage[key]
+    merged["classes"].update(name.lstrip(".") for name in safelist)
+    return merged
+
+
+def selector_used(selector, usage):
+    """Whether every part of a selector is present somewhere in the page
+
+    Combinators are not evaluated, so this only errs on the side of
+    keeping a rule.
+    """
+    if FUNCTIONAL_PSEUDO.search(selector):
+        return True
+    selector = PSEUDO.sub("", selector)
+    for compound in COMBINATOR.split(selector.strip()):
+        if not compound or compound == "*":
+            continue
+        tag = re.match(r"[a-zA-Z][\w-]*", compound)
+        if tag and tag.group().lower() not in usage["tags"]:
+            return False
+        if any(c not in usage["classes"] for c in re.findall(r"\.([\w-]+)", compound)):
+            return False
+        if any(i not in usage["ids"] for i in re.findall(r"#([\w-]+)", compound)):
+            return False
+        attributes = re.findall(r"\[\s*([\w-]+)", compound)
+        if any(a.lower() not in usage["attributes"] for a in attributes):
+            return False
+    return True
+
+
+def _animation_names(nodes):
+    names = set()
+    for node in nodes:
+        declarations = node.declarations or []
+        for prop, value, _ in declarations:
+            if prop in ("animation", "animation-name") or prop.endswith(
+                ("-animation", "-animation-name")
+            ):
+                names.update(re.findall(r"[\w-]+", value))
+        if isinstance(node, AtRule) and node.rules:
+            names |= _animation_names(node.rules)
+    return names
+
+
+def purge(nodes, usage):
+    """Copy of a parsed stylesheet without the rules no page element matches
+
+    Selectors that match nothing are removed from their selector lists,
+    rules without selectors and at-rules without rules are dropped, and
+    @keyframes are only kept while an animation still refers to them.
+    Returns the nodes and the list of removed selectors.
+    """
+    kept = []
+    removed = []
+    for node in nodes:
+        if isinstance(node, Rule):
+            selectors = [s for s in node.selectors if selector_used(s, usage)]
+            removed += [s for s in node.selectors if s not in selectors]
+            if selectors:
+                kept.append(Rule(selectors, node.declarations))
+        elif node.rules is not None and not node.name.endswith("keyframes"):
+            rules, nested = purge(node.rules, usage)
+            removed += nested
+            if rules:
+                kept.append(AtRule(node.name, node.prelude, rules=rules))
+        else:
+            kept.append(node)
+
+    animations = _animation_names(kept)
+    purged = []
+    for node in kept:
+        if isinstance(node, AtRule) and node.name.endswith("keyframes"):
+            if node.prelude.strip("'\"") not in animations:
+                removed.append(f"@{node.name} {node.prelude}")
+                continue
+        purged.append(node)
+    return purged, removed
+
+
+def purge_css(css, usage):
+    """Stylesheet text with only the rules used by the given usage
+
+    Returns the purged CSS and the removed selectors.
+    """
+    nodes, removed = purge(parse_css(css), usage)
+    return serialize(nodes), removed
@@ -0,0 +1,146 @@
+from pathlib import Path
+import hashlib
+import json
+import os
+import re
+import shutil
+
+# Hex digits of the content hash put into file names
+HASH_LENGTH = 10
+
+FINGERPRINTED_NAME = re.compile(rf"\.[0-9a-f]{{{HASH_LENGTH}}}(\.[^./]+)$")
+
+# Cache headers manifest written next to the pages and read by server.py
+HEADERS_MANIFEST = ".headers.json"
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Files that refer to assets and therefore keep their names
+DOCUMENT_SUFFIXES = {".html", ".css", ".js"}
+
+# Sidecars that follow the file they belong to
+SIDECAR_SUFFIXES = [".gz", ".br"]
+
+ATTRIBUTE_URLS = re.compile(r"""(\s(?:src|href|srcset|poster)=)(["'])(.*?)\2""", re.DOTALL)
+CSS_URLS = re.compile(r"""(url\(\s*)(["']?)([^"')\s]+)\2(\s*\))""")
+
+
+def fingerprinted_name(name, data):
+    """name.<hash>.ext for the given file content"""
+    stem, suffix = os.path.splitext(name)
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    return f"{stem}.{digest}{suffix}"
+
+
+def _link(source, target):
+    """Hard-link source to target, copying if links are not supported"""
+    target.unlink(missing_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def link_fingerprinted(site_dir):
+    """Give every static asset of a site a content-hashed name
+
+    The hashed names are hard links (with their sidecars), so files from
+    the build cache keep their plain names. Pages, stylesheets and scripts
+    are left to the caller, since their content depends on the names.
+    Returns a dict of plain name -> hashed name.
+    """
+    site_dir = Path(site_dir)
+    mapping = {}
+    for path in sorted(site_dir.iterdir()):
+        if (
+            not path.is_file()
+            or path.name.startswith(".")
+            or path.suffix in SIDECAR_SUFFIXES
+            or path.suffix.lower() in DOCUMENT_SUFFIXES
+            or FINGERPRINTED_NAME.search(path.name)
+        ):
+            continue
+        hashed = fingerprinted_name(path.name, path.read_bytes())
+        for suffix in [""] + SIDECAR_SUFFIXES:
+            source = site_dir / (path.name + suffix)
+            target = site_dir / (hashed + suffix)
+            if source.is_file() and not (target.is_file() and os.path.samefile(source, target)):
+                _link(source, target)
+        mapping[path.name] = hashed
+    return mapping
+
+
+def _rewrite_url(url, mapping):
+    return mapping.get(url, url)
+
+
+def rewrite_css_references(css, mapping):
+    """Replace the url() references of a stylesheet with hashed names"""
+    return CSS_URLS.sub(
+        lambda m: m.group(1) + m.group(2) + _rewrite_url(m.group(3), mapping) + m.group(2) + m.group(4),
+        css,
+    )
+
+
+def rewrite_html_references(html, mapping):
+    """Replace src, href, srcset and url() references of a page with hashed
+    names; the page must still have its attribute quotes"""
+
+    def attribute(match):
+        prefix, quote, value = match.groups()
+        if prefix.strip().startswith("srcset"):
+            candidates = []
+            for candidate in value.split(","):
+                parts = candidate.split()
+                if parts:
+                    parts[0] = _rewrite_url(parts[0], mapping)
+                candidates.append(" ".join(parts))
+            value = ", ".join(candidates)
+        else:
+            value = _rewrite_url(value, mapping)
+        return f"{prefix}{quote}{value}{quote}"
+
+    return rewrite_css_references(ATTRIBUTE_URLS.sub(attribute, html), mapping)
+
+
+def remove_stale(site_dir, current):
+    """Delete hashed files (and sidecars) of earlier builds
+
+    Returns the number of files removed.
+    """
+    current = set(current)
+    removed = 0
+    for path in Path(site_dir).iterdir():
+        name = path.name
+        for suffix in SIDECAR_SUFFIXES:
+            if name.endswith(suffix):
+                name = name[: -len(suffix)]
+        if FINGERPRINTED_NAME.search(name) and name not in current:
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def write_headers_manifest(site_dir, hashed_names, pages):
+    """Store the Cache-Control of the hashed files and the pages
+
+    Hashed files never change under their name and are cached for a year
+    without revalidation; pages are revalidated on every visit.
+    """
+    headers = {f"/{page}": {"Cache-Control": REVALIDATE_CACHE_CONTROL} for page in pages}
+    headers["/"] = {"Cache-Control": REVALIDATE_CACHE_CONTROL}
+    for name in sorted(hashed_names):
+        headers[f"/{name}"] = {"Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    path = Path(site_dir) / HEADERS_MANIFEST
+    path.write_text(json.dumps(headers, indent=2))
+    return path
+
+
+def load_headers_manifest(site_dir):
+    """The headers manifest of a site, or an empty one"""
+    path = Path(site_dir) / HEADERS_MANIFEST
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
@@ -1,19 +1,64 @@
 import argparse
 from pathlib import Path
-import re
+import contextlib
+import csv
+import io
+import itertools
+import json
+import os
 import shutil
-import gzip
+import time
 from webpage import *
 from resources import *
-
-try:
-    import brotli
-
-    BROTLI_AVAILABLE = True
-except ImportError:
-    BROTLI_AVAILABLE = False
-    print("Warning: brotli module not installed. Brotli compression will be skipped.")
-    print("Install with: pip install brotli")
+from build_cache import BuildCache
+from build_graph import BuildGraph
+from css_optimizer import optimize_css
+from critical_css import DEFAULT_VIEWPORT_HEIGHT, critical_css, lcp_image
+from css_purge import UsageParser, collect_usage, merge_usage, purge_css, script_classes
+from fingerprint import (
+    fingerprinted_name,
+    link_fingerprinted,
+    remove_stale,
+    rewrite_css_references,
+    rewrite_html_references,
+    write_headers_manifest,
+)
+from html_minifier import minify_html
+from image_quality import DEFAULT_TARGET_SSIM
+from js_minifier import minify_js
+from js_tree_shaker import handler_names, shake_js
+from compression import CompressionPolicy
+from server import serve
+from watch import watch
+from synthetic import (
+    DEFAULT_CSS_RULES,
+    DEFAULT_DOM_DEPTH,
+    DEFAULT_IMAGES_PER_PAGE,
+    DEFAULT_LINKS_PER_PAGE,
+    DEFAULT_PAGES,
+    MAX_PAGES,
+    MIN_PAGES,
+    page_body,
+    page_name,
+    synthetic_css,
+)
+from service_worker import (
+    PRECACHE_IMAGE_BUDGET,
+    SERVICE_WORKER,
+    precache_entries,
+    service_worker_js,
+    write_precache_manifest,
+)
+from bench import BROWSER_ACCEPT_ENCODING, bench
+from analyzer import (
+    DEFAULT_IMAGE_WIDTH,
+    PAGES,
+    analyze,
+    image_issues,
+    print_report,
+    summarize_site,
+    write_report,
+)
 
 try:
     from PIL import Image
@@ -24,12 +69,43 @@ except ImportError:
     print("Warning: Pillow not installed. Image scaling will be skipped.")
     print("Install with: pip install Pillow")
 
+# Names of the optimization options, in the order of the command line flags
+OPTION_NAMES = [
+    "minify",
+    "inline_css",
+    "inline_js",
+    "defer_js",
+    "lazy_loading",
+    "fetch_priority",
+    "preconnect",
+    "prefetch",
+    "remove_unused_css",
+    "remove_unused_js",
+    "critical_css",
+    "fingerprint",
+    "placeholders",
+    "service_worker",
+]
+
 
 class WebsiteGenerator:
     """Generate optimized and unoptimized versions of a website"""
 
-    def __init__(self, output_dir="output"):
+    def __init__(
+        self,
+        output_dir="output",
+        jobs=1,
+        use_cache=True,
+        max_image_memory=MAX_IMAGE_MEMORY,
+        compression=None,
+        target_ssim=None,
+    ):
         self.output_dir = Path(output_dir)
+        self.jobs = jobs
+        self.max_image_memory = max_image_memory
+        self.target_ssim = target_ssim
+        self.compression = compression or CompressionPolicy()
+        self.cache = BuildCache(self.output_dir, enabled=use_cache)
         self.optimized_dir = self.output_dir / "optimized"
         self.unoptimized_dir = self.output_dir / "unoptimized"
 
@@ -39,46 +115,46 @@ class WebsiteGenerator:
             dir_path.mkdir(parents=True, exist_ok=True)
 
     def minify_html(self, html):
-        """Remove unnecessary whitespace and comments from HTML"""
-        # Remove HTML comments
-        html = re.sub(r"<!--.*?-->", "", html, flags=re.DOTALL)
-        # Remove extra whitespace
-        html = re.sub(r"\s+", " ", html)
-        html = re.sub(r">\s+<", "><", html)
-        return html.strip()
+        """Minify HTML, including its inline CSS and JavaScript"""
+        return minify_html(html, minify_css=self.minify_css, minify_js=self.minify_js)
 
     def minify_css(self, css):
-        """Remove unnecessary whitespace and comments from CSS"""
-        # Remove CSS comments
-        css = re.sub(r"/\*.*?\*/", "", css, flags=re.DOTALL)
-        # Remove extra whitespace
-        css = re.sub(r"\s+", " ", css)
-        css = re.sub(r"\s*([{}:;,])\s*", r"\1", css)
-        return css.strip()
+        """Minify CSS by rewriting its rule tree"""
+        return optimize_css(css)
 
     def minify_js(self, js):
-        """Basic JavaScript minification"""
-        # Remove single-line comments
-        js = re.sub(r"//.*?$", "", js, flags=re.MULTILINE)
-        # Remove multi-line comments
-        js = re.sub(r"/\*.*?\*/", "", js, flags=re.DOTALL)
-        # Remove extra whitespace
-        js = re.sub(r"\s+", " ", js)
-        return js.strip()
-
-    def get_base_html(self, optimized=False, options=None):
-        """Generate base HTML structure"""
+        """Minify JavaScript and shorten the names of local variables"""
+        try:
+            return minify_js(js)
+        except ValueError as e:
+            print(f"  ⚠ Could not minify JavaScript ({e}), keeping it as is")
+            return js.strip()
+
+    def get_base_html(
+        self,
+        optimized=False,
+        options=None,
+        css_content=None,
+        js_content=None,
+        images=None,
+        lcp_image=None,
+    ):
+        """Generate base HTML structure
+
+        images is the image manifest of the site, with the size and the
+        breakpoints of the responsive variants. lcp_image is the src of the
+        image expected to be the Largest Contentful Paint.
+        """
         if options is None:
             options = {}
 
-        css_content = get_css(optimized, options)
-        js_content = get_javascript(optimized, options)
+        if css_content is None:
+            css_content = get_css(optimized, options)
+        if js_content is None:
+            js_content = get_javascript(optimized, options)
 
         # Decide on CSS inclusion method
-        if optimized and options.get("inline_css", False):
-            css_include = f"<style>{css_content}</style>"
-        else:
-            css_include = '<link rel="stylesheet" href="styles.css">'
+        css_include = get_css_include(optimized, options, css_content)
 
         # Decide on JS inclusion method
         if optimized and options.get("inline_js", False):
@@ -87,15 +163,7 @@ class WebsiteGenerator:
             defer_attr = " defer" if optimized and options.get("defer_js", True) else ""
             js_include = f'<script src="script.js"{defer_attr}></script>'
 
-        # Image handling
-        if optimized and options.get("lazy_loading", True):
-            img_attrs = ' loading="lazy"'
-        else:
-            img_attrs = ""
-
-        # Fetch priority for images (optimized only)
-        if optimized and options.get("fetch_priority", True):
-            img_attrs += ' fetchpriority="high"'
+        img_attrs, lcp_attrs, placeholders = self.image_attrs(optimized, options)
 
         # Preconnect hints for optimized version
         preconnect = ""
@@ -110,104 +178,646 @@ class WebsiteGenerator:
             resource_hints = '<link rel="prefetch" href="page2.html">'
 
         return get_html_page(
-            optimized, css_include, js_include, resource_hints, preconnect, img_attrs
+            optimized,
+            css_include,
+            js_include,
+            resource_hints,
+            preconnect,
+            img_attrs,
+            images,
+            lcp_image,
+            lcp_attrs,
+            placeholders,
+        )
+
+    def image_attrs(self, optimized, options):
+        """Attributes of the lazy-loaded images and of the LCP image, and
+        whether the lazy-loaded ones get placeholders"""
+        # Image handling; the LCP image is never lazy-loaded
+        img_attrs, lcp_attrs = "", ""
+        if optimized and options.get("lazy_loading", True):
+            img_attrs = ' loading="lazy" decoding="async"'
+
+        # Fetch priority for the LCP image (optimized only)
+        if optimized and options.get("fetch_priority", True):
+            lcp_attrs = ' fetchpriority="high"'
+
+        # Blurred previews in the space of the lazy-loaded images
+        placeholders = bool(
+            optimized and options.get("lazy_loading", True) and options.get("placeholders", False)
         )
+        return img_attrs, lcp_attrs, placeholders
 
     def generate(self, options):
         """Generate both optimized and unoptimized versions"""
         print("Setting up directories...")
-        self.setup_directories()
-
-        print("\nGenerating OPTIMIZED version...")
-        self.generate_version(self.optimized_dir, optimized=True, options=options)
-
-        print("\nGenerating UNOPTIMIZED version...")
-        self.generate_version(self.unoptimized_dir, optimized=False, options=options)
+        graph = self.build(options)
+        graph.report()
+        self.cache.report()
+        self.compression.report()
 
         print(f"\nGeneration complete!")
         print(f" Optimized version: {self.optimized_dir}")
         print(f" Unoptimized version: {self.unoptimized_dir}")
 
-    def generate_version(self, output_dir, optimized=False, options=None):
-        """Generate a single version of the website"""
+        self.analyze(viewport_height=options.get("viewport_height") or DEFAULT_VIEWPORT_HEIGHT)
+
+    def build(self, options):
+        """Build both versions and save the build cache
+
+        Both versions go into one build graph, so they are built
+        concurrently; each prints its steps under its own heading. Returns
+        the graph, with the timings of its steps.
+        """
+        self.setup_directories()
+        graph = BuildGraph()
+        for version_dir, optimized in ((self.optimized_dir, True), (self.unoptimized_dir, False)):
+            heading = f"\nGenerating {version_dir.name.upper()} version..."
+            graph.add(f"{version_dir.name}: start", lambda heading=heading: print(heading))
+            self.add_version_steps(graph, version_dir, optimized, options)
+        graph.run()
+        self.cache.save()
+        return graph
+
+    def analyze(self, image_width=DEFAULT_IMAGE_WIDTH, viewport_height=DEFAULT_VIEWPORT_HEIGHT):
+        """Quantify page weight and render-blocking bytes of both versions
+
+        The image checks look for the LCP image in a viewport_height
+        viewport, which should be the one the pages were built for.
+        """
+        print("\nPage analysis (optimized vs unoptimized):")
+        report = analyze(self.output_dir, image_width, viewport_height)
+        print_report(report)
+        report_path = self.output_dir / "analysis.json"
+        write_report(report, report_path)
+        print(f"\n Full analysis: {report_path}")
+        return report
+
+    def write_asset(self, path, content, compress=False):
+        """Write a generated text file unless the cached copy is unchanged
+
+        Returns True when the file (and its compressed versions) was written.
+        """
+        name = self.cache.name(path)
+        key = self.cache.key(
+            content, self.compression.settings() if compress else None
+        )
+        if self.cache.is_fresh(name, key):
+            return False
+
+        # Compress the rendered bytes directly instead of re-reading the file
+        data = content.encode("utf-8")
+        path.write_bytes(data)
+        outputs = [path]
+        if compress:
+            outputs += self.compress_asset(path, data)
+        self.cache.record(name, key, outputs)
+        return True
+
+    def compress_asset(self, path, data=None):
+        """Write the sidecars the compression policy keeps for a file"""
+        result = self.compression.compress(path, data)
+        self.compression.record([result])
+        print(self.compression.describe(result))
+        return result["kept"]
+
+    def purge_unused_css(self, css, pages, options, js=None):
+        """Stylesheets with only the rules the given HTML pages use
+
+        Classes added by the page script (js, rendered from the options if
+        not given) and those in the css_safelist option count as used.
+        Returns one stylesheet per page and one shared by all pages.
+        """
+        if js is None:
+            js = get_javascript(True, options)
+        safelist = set(options.get("css_safelist") or [])
+        safelist |= script_classes(js)
+        usages = [collect_usage(page) for page in pages]
+
+        page_css = [purge_css(css, merge_usage(usage, safelist=safelist))[0] for usage in usages]
+        shared_css, removed = purge_css(css, merge_usage(*usages, safelist=safelist))
+        print(
+            f"  ✓ Purged {len(removed)} unused CSS selectors "
+            f"({len(css)} → {len(shared_css)} bytes)"
+        )
+        return page_css, shared_css
+
+    def remove_unused_js(self, js, pages):
+        """The script without the declarations nothing reachable references
+
+        Names used by the inline event handlers of the pages count as
+        references.
+        """
+        keep = set()
+        for page in pages:
+            keep |= handler_names(page)
+        try:
+            js, removed = shake_js(js, keep)
+        except ValueError as e:
+            print(f"  ⚠ Could not analyze JavaScript for unused code: {e}")
+            return js
+        if removed:
+            symbols = ", ".join(f"{name} ({size} bytes)" for name, size in removed.items())
+            print(f"  ✓ Removed {sum(removed.values())} bytes of unused JavaScript: {symbols}")
+        return js
+
+    def extract_critical_css(self, page_css, pages, options):
+        """The rules of each page's stylesheet needed above the fold"""
+        viewport_height = options.get("viewport_height") or DEFAULT_VIEWPORT_HEIGHT
+        critical = [
+            critical_css(page, css, viewport_height=viewport_height)
+            for css, page in zip(page_css, pages)
+        ]
+        sizes = ", ".join(
+            f"{len(css)} → {len(rules)}" for css, rules in zip(page_css, critical)
+        )
+        print(f"  ✓ Extracted critical CSS for a {viewport_height}px viewport ({sizes} bytes)")
+        return critical
+
+    def find_lcp_image(self, html, css, options):
+        """The src of the image with the largest area above the fold"""
+        viewport_height = options.get("viewport_height") or DEFAULT_VIEWPORT_HEIGHT
+        lcp = lcp_image(html, css, viewport_height=viewport_height)
+        if lcp:
+            print(f"  ✓ LCP candidate for a {viewport_height}px viewport: {lcp}")
+        else:
+            print(f"  ⚠ No image above the fold of a {viewport_height}px viewport")
+        return lcp
+
+    def generate_version(self, output_dir, optimized=False, options=None, images=True):
+        """Generate a single version of the website
+
+        With images=False only the files that depend on the options are
+        generated; images and favicon are left to generate_images.
+        """
+        graph = BuildGraph()
+        self.add_version_steps(graph, output_dir, optimized, options, images)
+        graph.run()
+        return graph
+
+    def add_version_steps(self, graph, output_dir, optimized=False, options=None, images=True):
+        """Add the steps building one version of the website to a graph
+
+        Steps are named after the output directory, so several versions
+        can share a graph and be built concurrently. The stylesheet and
+        script are rendered once and every later step works on the
+        outputs of the steps before it.
+        """
         if options is None:
             options = {}
+        label = output_dir.name
 
-        # Generate HTML
-        html_content = self.get_base_html(optimized, options)
-        page2_content = get_second_page_html(optimized, options)
+        def step(name, func, *deps):
+            graph.add(f"{label}: {name}", func, *(f"{label}: {dep}" for dep in deps))
+            return name
 
-        # Apply minification if enabled
-        if optimized and options.get("minify", False):
-            html_content = self.minify_html(html_content)
-            page2_content = self.minify_html(page2_content)
+        critical = optimized and options.get("critical_css", False)
+        external_css = critical or not (optimized and options.get("inline_css", False))
+        external_js = not (optimized and options.get("inline_js", False))
+        minify = optimized and options.get("minify", False)
+        fingerprint = optimized and options.get("fingerprint", False)
+        service_worker = optimized and options.get("service_worker", False)
 
-        # Write HTML files
-        (output_dir / "index.html").write_text(html_content)
-        (output_dir / "page2.html").write_text(page2_content)
-        print(f"  ✓ Generated HTML files")
+        # Images first, fingerprinted pages refer to them by content hash
+        image_steps = []
+        if images:
+            image_steps = ["images"]
+            step("images", lambda: self.generate_images(output_dir, optimized))
+        step("image manifest", lambda *_: load_image_manifest(output_dir), *image_steps)
+        step("css", lambda: get_css(optimized, options))
+        step("js", lambda: get_javascript(optimized, options))
 
-        # Compress HTML files for optimized version
-        if optimized:
-            for html_file in ["index.html", "page2.html"]:
-                html_path = output_dir / html_file
-                with open(html_path, "rb") as f_in:
-                    # Create gzip compressed version
-                    with gzip.open(
-                        str(html_path) + ".gz", "wb", compresslevel=9
-                    ) as f_out:
-                        shutil.copyfileobj(f_in, f_out)
-
-                    # Create brotli compressed version
-                    f_in.seek(0)
-                    compressed_data = brotli.compress(f_in.read(), quality=11)
-                    with open(str(html_path) + ".br", "wb") as f_out:
-                        f_out.write(compressed_data)
-            print(f"  ✓ Compressed HTML files (gzip + brotli)")
-
-        # Generate CSS (if not inlined)
-        if not (optimized and options.get("inline_css", False)):
-            css_content = get_css(optimized, options)
-            if optimized and options.get("minify", False):
-                css_content = self.minify_css(css_content)
-            (output_dir / "styles.css").write_text(css_content)
-            print(f"  ✓ Generated CSS file")
+        def render(css, js, manifest):
+            # HTML with the srcset of every image listing the variants
+            # planned for it, and the image likely to be the LCP element
+            # above the fold loaded eagerly
+            html = self.get_base_html(optimized, options, css, js, manifest)
+            page2 = get_second_page_html(optimized, options, css, js)
+            lcp = None
+            if optimized:
+                lcp = self.find_lcp_image(html, css, options)
+                html = self.get_base_html(optimized, options, css, js, manifest, lcp)
+            return [html, page2], lcp
 
-        # Generate JavaScript (if not inlined)
-        if not (optimized and options.get("inline_js", False)):
-            js_content = get_javascript(optimized, options)
-            if optimized and options.get("minify", False):
-                js_content = self.minify_js(js_content)
-            js_path = output_dir / "script.js"
-            js_path.write_text(js_content)
-            print(f"  ✓ Generated JavaScript file")
+        step("pages", render, "css", "js", "image manifest")
 
-            # Compress JavaScript file for optimized version
-            if optimized:
-                with open(js_path, "rb") as f_in:
-                    # Create gzip compressed version
-                    with gzip.open(
-                        str(js_path) + ".gz", "wb", compresslevel=9
-                    ) as f_out:
-                        shutil.copyfileobj(f_in, f_out)
-
-                    # Create brotli compressed version
-                    f_in.seek(0)
-                    compressed_data = brotli.compress(f_in.read(), quality=11)
-                    with open(str(js_path) + ".br", "wb") as f_out:
-                        f_out.write(compressed_data)
-                print(f"  ✓ Compressed JavaScript file (gzip + brotli)")
+        def shake(js, rendered):
+            # Drop the JavaScript declarations nothing reachable uses
+            if optimized and options.get("remove_unused_js", True):
+                return self.remove_unused_js(js, rendered[0])
+            return js
+
+        step("unused js", shake, "js", "pages")
+
+        def purge(css, js, rendered):
+            # Drop the CSS rules no page uses; inlined stylesheets are
+            # purged per page, styles.css keeps what any page uses
+            pages = rendered[0]
+            if optimized and options.get("remove_unused_css", True):
+                return self.purge_unused_css(css, pages, options, js)
+            return [css] * len(pages), css
+
+        step("unused css", purge, "css", "js", "pages")
+
+        def extract(purged, rendered):
+            # Keep only the rules needed above the fold in the pages
+            if critical:
+                return self.extract_critical_css(purged[0], rendered[0], options)
+            return purged[0]
+
+        step("critical css", extract, "unused css", "pages")
+
+        def inline(rendered, page_css, js, manifest):
+            if not optimized:
+                return rendered[0]
+            pages, lcp = rendered
+            return [
+                self.get_base_html(optimized, options, page_css[0], js, manifest, lcp),
+                get_second_page_html(optimized, options, page_css[1], js),
+            ]
 
+        step("inlined pages", inline, "pages", "critical css", "unused js", "image manifest")
+
+        def minify_css(purged):
+            css = purged[1]
+            return self.minify_css(css) if minify and external_css else css
+
+        def minify_js(js):
+            return self.minify_js(js) if minify and external_js else js
+
+        step("minified css", minify_css, "unused css")
+        step("minified js", minify_js, "unused js")
+
+        def rename(css, js, pages, *_):
+            # Give assets content-hashed names and point the pages at them
+            css_name, js_name = "styles.css", "script.js"
+            mapping = {}
+            if fingerprint:
+                mapping = link_fingerprinted(output_dir)
+                css = rewrite_css_references(css, mapping)
+                mapping[css_name] = fingerprinted_name(css_name, css.encode())
+                mapping[js_name] = fingerprinted_name(js_name, js.encode())
+                css_name, js_name = mapping[css_name], mapping[js_name]
+                pages = [rewrite_html_references(page, mapping) for page in pages]
+            return {"css": (css_name, css), "js": (js_name, js), "pages": pages, "mapping": mapping}
+
+        step(
+            "fingerprint", rename, "minified css", "minified js", "inlined pages", *image_steps
+        )
+
+        def write_pages(assets):
+            # Write HTML files (and compress them for optimized version)
+            written = [
+                self.write_asset(
+                    output_dir / name, self.minify_html(page) if minify else page, optimized
+                )
+                for name, page in zip(PAGES, assets["pages"])
+            ]
+            if any(written):
+                print(f"  ✓ Generated HTML files")
+            else:
+                print(f"  ↺ Reused HTML files (unchanged)")
+
+        def write_file(kind, description):
+            def write(assets):
+                name, content = assets[kind]
+                if self.write_asset(output_dir / name, content, optimized):
+                    print(f"  ✓ Generated {description}")
+                else:
+                    print(f"  ↺ Reused {description} (unchanged)")
+
+            return write
+
+        writes = [step("write html", write_pages, "fingerprint")]
+        # CSS if not inlined, or loaded after the critical CSS, and
+        # JavaScript if not inlined
+        if external_css:
+            writes.append(step("write css", write_file("css", "CSS file"), "fingerprint"))
+        if external_js:
+            writes.append(step("write js", write_file("js", "JavaScript file"), "fingerprint"))
+
+        # Precache everything the pages need once the files are final
+        if service_worker:
+            writes.append(
+                step(
+                    "service worker",
+                    lambda *_: self.generate_service_worker(output_dir, options),
+                    *writes,
+                )
+            )
+
+        def headers(assets, *_):
+            mapping = assets["mapping"]
+            hashed = [mapping[name] for name in mapping if name not in ("styles.css", "script.js")]
+            hashed += [assets["css"][0]] if external_css else []
+            hashed += [assets["js"][0]] if external_js else []
+            removed = remove_stale(output_dir, hashed)
+            # The service worker is revalidated like the pages, browsers
+            # check it for updates on every navigation anyway
+            revalidated = PAGES + ([SERVICE_WORKER] if service_worker else [])
+            manifest = write_headers_manifest(output_dir, hashed, revalidated)
+            print(
+                f"  ✓ Fingerprinted {len(hashed)} assets, removed {removed} stale file(s), "
+                f"cache headers in {manifest.name}"
+            )
+
+        if fingerprint:
+            step("cache headers", headers, "fingerprint", *writes)
+
+    def generate_service_worker(self, output_dir, options):
+        """Write sw.js precaching the pages and their assets, and the
+        precache manifest"""
+        entries = precache_entries(output_dir, PAGES)
+        js = service_worker_js(entries)
+        if options.get("minify", False):
+            js = self.minify_js(js)
+        self.write_asset(output_dir / SERVICE_WORKER, js, True)
+        manifest = write_precache_manifest(output_dir, entries)
+        images = [e for e in entries if Path(e["url"]).suffix.lower() in RASTER_EXTENSIONS]
+        total = sum(e["size"] for e in entries)
+        print(
+            f"  ✓ Generated {SERVICE_WORKER} precaching {len(entries)} files ({total / 1024:.0f} KB, "
+            f"{len(images)} image variants within {PRECACHE_IMAGE_BUDGET // 1024} KB), "
+            f"manifest in {manifest.name}"
+        )
+
+    def generate_images(self, output_dir, optimized=False):
+        """Copy and scale the images and generate the favicon"""
         # Copy images from images folder
-        copy_images(output_dir, optimized)
-        if optimized:
-            print(f"  ✓ Copied and compressed images (gzip + brotli)")
-        else:
-            print(f"  ✓ Copied images")
+        copy_images(
+            output_dir,
+            optimized,
+            jobs=self.jobs,
+            cache=self.cache,
+            max_memory=self.max_image_memory,
+            compression=self.compression if optimized else None,
+            target_ssim=self.target_ssim,
+        )
+        print(f"  ✓ Copied images")
 
         # Generate favicon
         generate_favicon(output_dir, optimized)
         print(f"  ✓ Generated favicon")
+        if optimized:
+            self.compress_asset(output_dir / "favicon.svg")
+
+    def sweep(self, axes, base_options, image_width=DEFAULT_IMAGE_WIDTH):
+        """Build every combination of the given option axes and compare them
+
+        Each combination gets its own optimized build in output/sweep/.
+        Images and favicon do not depend on any option, so they are built
+        once into output/sweep/_shared and hard-linked into every
+        combination, and the combinations are built on the process pool.
+        """
+        sweep_dir = self.output_dir / "sweep"
+        shared_dir = sweep_dir / "_shared"
+        shared_dir.mkdir(parents=True, exist_ok=True)
+
+        combinations = []
+        for values in itertools.product([False, True], repeat=len(axes)):
+            options = dict(base_options)
+            options.update(zip(axes, values))
+            name = "+".join(axis for axis, value in zip(axes, values) if value)
+            combinations.append((name or "none", options))
+
+        print(f"Sweeping {len(combinations)} combination(s) of: {', '.join(axes)}")
+        print("\nBuilding shared images (independent of all options)...")
+        self.generate_images(shared_dir, optimized=True)
+        self.cache.save()
+
+        print(f"\nBuilding combinations on {self.jobs} worker(s)...")
+        tasks = [
+            (
+                _build_combination,
+                (sweep_dir / "unoptimized", base_options, False, None, self.compression, image_width),
+            )
+        ]
+        for name, options in combinations:
+            tasks.append(
+                (
+                    _build_combination,
+                    (sweep_dir / name, options, True, shared_dir, self.compression, image_width),
+                )
+            )
+
+        rows = []
+        names = ["unoptimized"] + [name for name, _ in combinations]
+        for name, (metrics, compressed, elapsed) in zip(names, run_tasks(tasks, self.jobs)):
+            print(f"  ✓ {name} ({elapsed:.2f}s)")
+            rows.append(dict({"combination": name}, **metrics))
+            self.compression.record(compressed)
+
+        print_sweep_table(rows)
+        self.compression.report()
+        (sweep_dir / "sweep.json").write_text(json.dumps(rows, indent=2))
+        with open(sweep_dir / "sweep.csv", "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"\n Results: {sweep_dir / 'sweep.json'}, {sweep_dir / 'sweep.csv'}")
+        return rows
+
+    def synth(self, params, options):
+        """Generate a synthetic site of params["pages"] pages in both
+        versions and report how long each took and how big it got
+
+        The sites go to output/synthetic/<version>; the results are also
+        written to output/synthetic/synthetic.json.
+        """
+        synth_dir = self.output_dir / "synthetic"
+        print(
+            f"Synthetic site: {params['pages']:,} pages, {params['images_per_page']} images "
+            f"per page, DOM depth {params['dom_depth']}, {params['css_rules']:,} CSS rules, "
+            f"{params['links_per_page']} links per page"
+        )
+        rows = []
+        for variant, optimized in (("optimized", True), ("unoptimized", False)):
+            print(f"\nGenerating {variant.upper()} synthetic site...")
+            row = self.generate_synthetic(synth_dir / variant, optimized, options, params)
+            rows.append(dict({"version": variant}, **row))
+        self.cache.save()
+        self.compression.report()
+
+        print(
+            "\n"
+            + "version".ljust(14)
+            + "seconds".rjust(10)
+            + "pages/s".rjust(10)
+            + "HTML bytes".rjust(16)
+            + "CSS bytes".rjust(12)
+            + "peak RSS MB".rjust(13)
+        )
+        for row in rows:
+            rss = f"{row['peak_rss_mb']:.0f}" if row["peak_rss_mb"] is not None else "-"
+            print(
+                row["version"].ljust(14)
+                + f"{row['seconds']:.2f}".rjust(10)
+                + f"{row['pages_per_second']:,.0f}".rjust(10)
+                + f"{row['html_bytes']:,}".rjust(16)
+                + f"{row['css_bytes']:,}".rjust(12)
+                + rss.rjust(13)
+            )
+        path = synth_dir / "synthetic.json"
+        path.write_text(json.dumps({"params": params, "versions": rows}, indent=2))
+        print(f"\n Results: {path}")
+        return rows
+
+    def generate_synthetic(self, site_dir, optimized, options, params):
+        """Build one version of a synthetic site, streaming every page to
+        disk as it is rendered
+
+        Only one page is held in memory at a time (when minifying, the
+        whole page; otherwise a single chunk). The stylesheet is always
+        external since it is only final once every page has been seen:
+        the classes the pages use are collected while they are written.
+        Returns timings and sizes.
+        """
+        site_dir.mkdir(parents=True, exist_ok=True)
+        start = time.perf_counter()
+        self.generate_images(site_dir, optimized)
+        images_done = time.perf_counter()
+
+        # Header, navigation and footer come from the regular page, with
+        # the synthetic content streamed in place of its <main>
+        page_options = dict(options, inline_css=False, critical_css=False, inline_js=False)
+        images = load_image_manifest(site_dir)
+        template = self.get_base_html(optimized, page_options, "", "", images)
+        head = template[: template.index("<main>") + len("<main>")]
+        tail = template[template.index("</main>") :]
+        image_attrs = self.image_attrs(optimized, options)
+
+        # Pages of an earlier, larger synthetic site
+        for path in site_dir.glob("page*.html*"):
+            path.unlink()
+
+        minify = optimized and options.get("minify", False)
+        purge = optimized and options.get("remove_unused_css", True)
+        usage = UsageParser()
+        html_bytes = 0
+        pages = params["pages"]
+        for index in range(pages):
+            chunks = itertools.chain(
+                [head], page_body(index, params, optimized, images, image_attrs), [tail]
+            )
+            if minify:
+                chunks = [self.minify_html("".join(chunks))]
+            path = site_dir / page_name(index)
+            with open(path, "w", encoding="utf-8") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    if purge:
+                        usage.feed(chunk)
+            html_bytes += path.stat().st_size
+            if optimized:
+                # Recorded for the report, but not described page by page
+                self.compression.record([self.compression.compress(path)])
+            if (index + 1) % max(1, pages // 10) == 0 or index + 1 == pages:
+                print(f"    {index + 1:,}/{pages:,} pages")
+        usage.close()
+        pages_done = time.perf_counter()
+
+        css = get_css(optimized, options) + "".join(synthetic_css(params["css_rules"]))
+        css_rules_removed = 0
+        if purge:
+            safelist = set(options.get("css_safelist") or [])
+            safelist |= script_classes(get_javascript(True, options))
+            css, removed = purge_css(css, merge_usage(usage.usage, safelist=safelist))
+            css_rules_removed = len(removed)
+            print(f"  ✓ Purged {css_rules_removed:,} unused CSS selectors")
+        js = get_javascript(optimized, options)
+        if minify:
+            css, js = self.minify_css(css), self.minify_js(js)
+        self.write_asset(site_dir / "styles.css", css, optimized)
+        self.write_asset(site_dir / "script.js", js, optimized)
+        done = time.perf_counter()
+
+        rss = peak_rss_mb()
+        print(
+            f"  ✓ Wrote {pages:,} pages in {pages_done - images_done:.2f}s "
+            f"({pages / (pages_done - images_done):,.0f} pages/s), {html_bytes:,} bytes of HTML"
+        )
+        return {
+            "pages": pages,
+            "seconds": round(done - start, 3),
+            "image_seconds": round(images_done - start, 3),
+            "page_seconds": round(pages_done - images_done, 3),
+            "asset_seconds": round(done - pages_done, 3),
+            "pages_per_second": round(pages / (pages_done - images_done), 1),
+            "html_bytes": html_bytes,
+            "css_bytes": len(css.encode()),
+            "css_rules_removed": css_rules_removed,
+            "peak_rss_mb": round(rss, 1) if rss is not None else None,
+        }
+
+
+def link_shared_files(shared_dir, site_dir):
+    """Hard-link every shared file into a site, copying if links fail"""
+    for shared_file in shared_dir.iterdir():
+        # Of the hidden files, only the manifests of the images are shared
+        if not shared_file.is_file() or (
+            shared_file.name.startswith(".")
+            and shared_file.name not in (IMAGE_MANIFEST, QUALITY_MANIFEST)
+        ):
+            continue
+        target = site_dir / shared_file.name
+        target.unlink(missing_ok=True)
+        try:
+            os.link(shared_file, target)
+        except OSError:
+            shutil.copy2(shared_file, target)
+
+
+def _build_combination(
+    site_dir, options, optimized, shared_dir, compression, image_width
+):
+    """Build one sweep combination and measure it (runs in a worker)
+
+    Returns the metrics, the results of the compression policy and the
+    build time; the policy is a copy, so the results are not recorded
+    twice when this runs in the parent process.
+    """
+    start = time.perf_counter()
+    site_dir.mkdir(parents=True, exist_ok=True)
+    compression = compression.copy()
+    generator = WebsiteGenerator(output_dir=site_dir, compression=compression)
+    if shared_dir is not None:
+        link_shared_files(shared_dir, site_dir)
+    with contextlib.redirect_stdout(io.StringIO()):
+        generator.generate_version(
+            site_dir, optimized, options, images=shared_dir is None
+        )
+        generator.cache.save()
+    viewport_height = options.get("viewport_height") or DEFAULT_VIEWPORT_HEIGHT
+    metrics = summarize_site(site_dir, image_width, viewport_height)
+    return metrics, compression.results, time.perf_counter() - start
+
+
+def _watch_build(output_dir, options, generator_options):
+    """Build both versions for watch mode and return the build log (runs in
+    a freshly spawned worker, so it uses the current generator modules)"""
+    generator = WebsiteGenerator(output_dir=output_dir, **generator_options)
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        generator.build(options)
+    return log.getvalue()
+
+
+def print_sweep_table(rows):
+    """Print the size metrics of all combinations, smallest first"""
+    columns = [
+        ("requests", "requests"),
+        ("blocking (br)", "render_blocking_bytes.brotli"),
+        ("transfer", "transfer_bytes.identity"),
+        ("transfer (gz)", "transfer_bytes.gzip"),
+        ("transfer (br)", "transfer_bytes.brotli"),
+    ]
+    width = max(len(row["combination"]) for row in rows) + 2
+    print("\n" + "combination".ljust(width) + "".join(c[0].rjust(15) for c in columns))
+    print("-" * (width + 15 * len(columns)))
+    for row in sorted(rows, key=lambda row: row["transfer_bytes.brotli"]):
+        print(
+            row["combination"].ljust(width)
+            + "".join(f"{row[key]:,}".rjust(15) for _, key in columns)
+        )
 
 
 def main():
@@ -220,6 +830,12 @@ Examples:
   %(prog)s --minify --inline-css          Enable minification and CSS inlining
   %(prog)s --lazy-loading --defer-js      Enable lazy loading and deferred JS
   %(prog)s                                Generate with default settings
+  %(prog)s serve                          Serve the generated websites
+  %(prog)s watch                          Serve from memory, rebuild and reload on changes
+  %(prog)s bench --clients 100            Load-test both generated websites
+  %(prog)s analyze                        Report page weight of both websites
+  %(prog)s sweep minify inline-css        Compare all combinations of two options
+  %(prog)s synth --pages 10000            Measure generation of a 10,000-page site
         """,
     )
 
@@ -268,19 +884,291 @@ Examples:
     parser.add_argument(
         "--remove-unused-css", action="store_true", help="Remove unused CSS rules"
     )
+    parser.add_argument(
+        "--css-safelist",
+        nargs="+",
+        default=[],
+        metavar="CLASS",
+        help="Classes to keep when removing unused CSS, e.g. ones added by scripts",
+    )
+
+    parser.add_argument(
+        "--critical-css",
+        action="store_true",
+        help="Inline only the CSS needed above the fold and load the rest without "
+        "blocking rendering (takes precedence over --inline-css)",
+    )
+    parser.add_argument(
+        "--viewport-height",
+        type=int,
+        default=DEFAULT_VIEWPORT_HEIGHT,
+        metavar="PX",
+        help=f"Viewport height used to find above-the-fold content (default: {DEFAULT_VIEWPORT_HEIGHT})",
+    )
+
+    parser.add_argument(
+        "--fingerprint",
+        action="store_true",
+        help="Put content hashes into asset file names and write a cache headers "
+        "manifest marking them immutable",
+    )
 
     parser.add_argument(
         "--remove-unused-js", action="store_true", help="Remove unused JavaScript code"
     )
 
+    parser.add_argument(
+        "--service-worker",
+        action="store_true",
+        help="Generate sw.js precaching the pages, assets and image variants within a "
+        "size budget, registered by the page script",
+    )
+
+    parser.add_argument(
+        "--placeholders",
+        action="store_true",
+        help="Show a tiny inline blurred preview in place of lazy-loaded images "
+        "until they load",
+    )
+
     parser.add_argument(
         "--output-dir",
         default="output",
         help="Output directory for generated websites (default: output)",
     )
 
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Number of worker processes for image processing (default: 1)",
+    )
+
+    parser.add_argument(
+        "--max-image-memory",
+        type=int,
+        default=MAX_IMAGE_MEMORY,
+        metavar="MB",
+        help=f"Memory cap for decoding a single image (default: {MAX_IMAGE_MEMORY})",
+    )
+
+    parser.add_argument(
+        "--target-ssim",
+        type=float,
+        nargs="?",
+        const=DEFAULT_TARGET_SSIM,
+        metavar="SSIM",
+        help=(
+            "Search the lowest encoder quality of every image variant that reaches this SSIM "
+            f"(default when given without a value: {DEFAULT_TARGET_SSIM}; requires numpy)"
+        ),
+    )
+
+    parser.add_argument(
+        "--min-compression-saving",
+        type=float,
+        default=5,
+        metavar="PERCENT",
+        help="Keep a .gz/.br file only if it is at least this much smaller (default: 5)",
+    )
+
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Rebuild every file instead of reusing unchanged ones from the build cache",
+    )
+
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    serve_parser = subparsers.add_parser(
+        "serve",
+        help="Serve the optimized and unoptimized versions over HTTP",
+        description="Serve output/optimized and output/unoptimized with a built-in "
+        "asyncio HTTP/1.1 server (replaces serve.sh)",
+    )
+    serve_parser.add_argument(
+        "--host", default="127.0.0.1", help="Address to bind (default: 127.0.0.1)"
+    )
+    serve_parser.add_argument(
+        "--port",
+        type=int,
+        default=8080,
+        help="Port of the optimized version (default: 8080)",
+    )
+    serve_parser.add_argument(
+        "--unoptimized-port",
+        type=int,
+        default=8081,
+        help="Port of the unoptimized version (default: 8081)",
+    )
+    serve_parser.add_argument(
+        "--access-log",
+        metavar="FILE",
+        help="Append per-request timings as JSON lines to FILE",
+    )
+    serve_parser.add_argument(
+        "--quiet", action="store_true", help="Do not print every request"
+    )
+
+    watch_parser = subparsers.add_parser(
+        "watch",
+        help="Serve both versions from memory and rebuild them on source changes",
+        description="Build both versions, serve them from memory and poll the "
+        "generator modules and images/ for changes; every change rebuilds only "
+        "what the build cache finds changed and reloads the open pages",
+    )
+    watch_parser.add_argument(
+        "--host", default="127.0.0.1", help="Address to bind (default: 127.0.0.1)"
+    )
+    watch_parser.add_argument(
+        "--port",
+        type=int,
+        default=8080,
+        help="Port of the optimized version (default: 8080)",
+    )
+    watch_parser.add_argument(
+        "--unoptimized-port",
+        type=int,
+        default=8081,
+        help="Port of the unoptimized version (default: 8081)",
+    )
+    watch_parser.add_argument(
+        "--quiet", action="store_true", help="Do not print every request"
+    )
+
+    bench_parser = subparsers.add_parser(
+        "bench",
+        help="Load-test the optimized and unoptimized versions",
+        description="Replay the resources of index.html and page2.html with many "
+        "concurrent clients against both versions and compare throughput, "
+        "latency percentiles and bytes on the wire",
+    )
+    bench_parser.add_argument(
+        "--clients",
+        type=int,
+        default=50,
+        help="Number of concurrent simulated clients (default: 50)",
+    )
+    bench_parser.add_argument(
+        "--iterations",
+        type=int,
+        default=10,
+        help="Visits of all pages per client (default: 10)",
+    )
+    bench_parser.add_argument(
+        "--accept-encoding",
+        default=BROWSER_ACCEPT_ENCODING,
+        help=f'Accept-Encoding header to send (default: "{BROWSER_ACCEPT_ENCODING}")',
+    )
+    bench_parser.add_argument(
+        "--image-width",
+        type=int,
+        default=DEFAULT_IMAGE_WIDTH,
+        help=f"Layout width used to pick srcset candidates (default: {DEFAULT_IMAGE_WIDTH})",
+    )
+    bench_parser.add_argument(
+        "--optimized-url",
+        help="Benchmark an already running server instead of the built-in one",
+    )
+    bench_parser.add_argument(
+        "--unoptimized-url",
+        help="Benchmark an already running server instead of the built-in one",
+    )
+    bench_parser.add_argument(
+        "--json", metavar="FILE", help="Also write the results as JSON to FILE"
+    )
+
+    analyze_parser = subparsers.add_parser(
+        "analyze",
+        help="Report page weight and critical path of both versions",
+        description="Resolve every resource referenced by the generated pages and "
+        "report requests, render-blocking bytes, transfer sizes and the critical "
+        "request chain as JSON (this also runs after every generation)",
+    )
+    analyze_parser.add_argument(
+        "--image-width",
+        type=int,
+        default=DEFAULT_IMAGE_WIDTH,
+        help=f"Layout width used to pick srcset candidates (default: {DEFAULT_IMAGE_WIDTH})",
+    )
+
+    sweep_parser = subparsers.add_parser(
+        "sweep",
+        help="Build and compare every combination of some options",
+        description="Build each on/off combination of the given options (the other "
+        "options come from the top-level flags) into output/sweep/<combination> "
+        "and print the size metrics of all of them, plus an unoptimized baseline, "
+        "as a table and as output/sweep/sweep.json and sweep.csv. Images are built "
+        "once and shared; combinations are built on --jobs worker processes",
+    )
+    sweep_parser.add_argument(
+        "axes",
+        nargs="+",
+        metavar="OPTION",
+        type=lambda name: name.replace("-", "_"),
+        choices=OPTION_NAMES,
+        help=f"Options to vary, from: {', '.join(OPTION_NAMES)}",
+    )
+    sweep_parser.add_argument(
+        "--image-width",
+        type=int,
+        default=DEFAULT_IMAGE_WIDTH,
+        help=f"Layout width used to pick srcset candidates (default: {DEFAULT_IMAGE_WIDTH})",
+    )
+
+    synth_parser = subparsers.add_parser(
+        "synth",
+        help="Generate a large synthetic site to measure how generation scales",
+        description="Generate a site of many synthetic pages into output/synthetic/<version>, "
+        "built from the regular page, stylesheet and script with generated content, "
+        "links and CSS rules. Pages are streamed to disk one at a time, so memory "
+        "stays flat; timings and sizes are printed and written to "
+        "output/synthetic/synthetic.json",
+    )
+    synth_parser.add_argument(
+        "--pages",
+        type=int,
+        default=DEFAULT_PAGES,
+        help=f"Number of pages, {MIN_PAGES} to {MAX_PAGES:,} (default: {DEFAULT_PAGES})",
+    )
+    synth_parser.add_argument(
+        "--images-per-page",
+        type=int,
+        default=DEFAULT_IMAGES_PER_PAGE,
+        help=f"Images on every page (default: {DEFAULT_IMAGES_PER_PAGE})",
+    )
+    synth_parser.add_argument(
+        "--dom-depth",
+        type=int,
+        default=DEFAULT_DOM_DEPTH,
+        help=f"Nesting depth of the content blocks (default: {DEFAULT_DOM_DEPTH})",
+    )
+    synth_parser.add_argument(
+        "--css-rules",
+        type=int,
+        default=DEFAULT_CSS_RULES,
+        help=f"Generated CSS rules, half of them unused (default: {DEFAULT_CSS_RULES})",
+    )
+    synth_parser.add_argument(
+        "--links-per-page",
+        type=int,
+        default=DEFAULT_LINKS_PER_PAGE,
+        help=f"Links from every page to other pages (default: {DEFAULT_LINKS_PER_PAGE})",
+    )
+    synth_parser.add_argument(
+        "--seed", type=int, default=0, help="Seed of the generated content (default: 0)"
+    )
+
     args = parser.parse_args()
 
+    if args.command == "synth":
+        if not MIN_PAGES <= args.pages <= MAX_PAGES:
+            synth_parser.error(f"--pages must be between {MIN_PAGES} and {MAX_PAGES:,}")
+        for name in ("images_per_page", "dom_depth", "css_rules", "links_per_page"):
+            if getattr(args, name) < 0:
+                synth_parser.error(f"--{name.replace('_', '-')} must not be negative")
+
     # Build options dictionary
     if args.all:
         options = {
@@ -294,6 +1182,12 @@ Examples:
             "prefetch": True,
             "remove_unused_css": True,
             "remove_unused_js": True,
+            "critical_css": True,
+            "fingerprint": True,
+            "placeholders": True,
+            "service_worker": True,
+            "css_safelist": args.css_safelist,
+            "viewport_height": args.viewport_height,
         }
     else:
         options = {
@@ -307,20 +1201,103 @@ Examples:
             "prefetch": args.prefetch,
             "remove_unused_css": args.remove_unused_css,
             "remove_unused_js": args.remove_unused_js,
+            "critical_css": args.critical_css,
+            "fingerprint": args.fingerprint,
+            "placeholders": args.placeholders,
+            "service_worker": args.service_worker,
+            "css_safelist": args.css_safelist,
+            "viewport_height": args.viewport_height,
         }
 
+    if args.command == "analyze":
+        report = WebsiteGenerator(output_dir=args.output_dir, use_cache=False).analyze(
+            args.image_width, args.viewport_height
+        )
+        # Fail on layout shift and LCP regressions of the optimized pages
+        issues = image_issues(report)
+        if issues:
+            raise SystemExit(f"\n⚠ {len(issues)} image check(s) failed")
+        return
+
+    if args.command == "bench":
+        bench(
+            args.output_dir,
+            clients=args.clients,
+            iterations=args.iterations,
+            accept_encoding=args.accept_encoding,
+            image_width=args.image_width,
+            urls={
+                name: url
+                for name, url in [
+                    ("optimized", args.optimized_url),
+                    ("unoptimized", args.unoptimized_url),
+                ]
+                if url
+            },
+            json_path=args.json,
+        )
+        return
+
+    if args.command == "serve":
+        serve(
+            args.output_dir,
+            host=args.host,
+            port=args.port,
+            unoptimized_port=args.unoptimized_port,
+            access_log=args.access_log,
+            quiet=args.quiet,
+        )
+        return
+
+    generator_options = {
+        "jobs": args.jobs,
+        "use_cache": not args.no_cache,
+        "max_image_memory": args.max_image_memory,
+        "compression": CompressionPolicy(min_saving=args.min_compression_saving / 100),
+        "target_ssim": args.target_ssim,
+    }
+
+    if args.command == "watch":
+        watch(
+            args.output_dir,
+            _watch_build,
+            (args.output_dir, options, generator_options),
+            host=args.host,
+            port=args.port,
+            unoptimized_port=args.unoptimized_port,
+            quiet=args.quiet,
+        )
+        return
+
+    # Generate websites
+    generator = WebsiteGenerator(output_dir=args.output_dir, **generator_options)
+
+    if args.command == "sweep":
+        generator.sweep(list(dict.fromkeys(args.axes)), options, args.image_width)
+        return
+
+    if args.command == "synth":
+        params = {
+            "pages": args.pages,
+            "images_per_page": args.images_per_page,
+            "dom_depth": args.dom_depth,
+            "css_rules": args.css_rules,
+            "links_per_page": args.links_per_page,
+            "seed": args.seed,
+        }
+        generator.synth(params, options)
+        return
+
     print("Web Performance Comparison Generator")
     print("=" * 50)
     print("\nEnabled optimizations:")
-    for key, value in options.items():
-        if value:
+    for key in OPTION_NAMES:
+        if options[key]:
             print(f"  ✓ {key.replace('_', ' ').title()}")
 
-    if not any(options.values()):
+    if not any(options[key] for key in OPTION_NAMES):
         print("  (None - using default unoptimized settings)")
 
-    # Generate websites
-    generator = WebsiteGenerator(output_dir=args.output_dir)
     generator.generate(options)
 
 
@@ -0,0 +1,461 @@
+import re
+
+# Elements whose content is passed through untouched (or to a callback)
+RAW_TEXT_ELEMENTS = {"script", "style", "textarea"}
+
+# Elements inside which whitespace is significant
+PREFORMATTED_ELEMENTS = {"pre", "textarea"}
+
+VOID_ELEMENTS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "source",
+    "track",
+    "wbr",
+}
+
+# Elements laid out inline; whitespace next to any other tag is not rendered
+INLINE_ELEMENTS = {
+    "a",
+    "abbr",
+    "b",
+    "bdi",
+    "bdo",
+    "br",
+    "button",
+    "cite",
+    "code",
+    "data",
+    "del",
+    "dfn",
+    "em",
+    "i",
+    "img",
+    "input",
+    "ins",
+    "kbd",
+    "label",
+    "mark",
+    "picture",
+    "q",
+    "s",
+    "samp",
+    "select",
+    "small",
+    "span",
+    "strong",
+    "sub",
+    "sup",
+    "svg",
+    "textarea",
+    "time",
+    "u",
+    "var",
+    "wbr",
+}
+
+# Inline elements that render no content of their own, so a space before
+# them and a space after them collapse into one
+TRANSPARENT_INLINE_ELEMENTS = INLINE_ELEMENTS - {
+    "br",
+    "button",
+    "img",
+    "input",
+    "picture",
+    "select",
+    "svg",
+    "textarea",
+    "wbr",
+}
+
+BOOLEAN_ATTRIBUTES = {
+    "allowfullscreen",
+    "async",
+    "autofocus",
+    "autoplay",
+    "checked",
+    "controls",
+    "default",
+    "defer",
+    "disabled",
+    "formnovalidate",
+    "hidden",
+    "inert",
+    "ismap",
+    "itemscope",
+    "loop",
+    "multiple",
+    "muted",
+    "nomodule",
+    "novalidate",
+    "open",
+    "playsinline",
+    "readonly",
+    "required",
+    "reversed",
+    "selected",
+}
+
+# Attribute values that only restate the default, per (element, attribute)
+REDUNDANT_ATTRIBUTES = {
+    ("script", "type"): {"text/javascript", "application/javascript"},
+    ("script", "language"): {"javascript"},
+    ("style", "type"): {"text/css"},
+    ("link", "type"): {"text/css"},
+    ("form", "method"): {"get"},
+    ("input", "type"): {"text"},
+    ("button", "type"): {"submit"},
+    ("area", "shape"): {"rect"},
+}
+
+JAVASCRIPT_TYPES = {
+    "",
+    "module",
+    "text/javascript",
+    "application/javascript",
+}
+
+# Start tags that implicitly close an open <p>
+P_CLOSING_TAGS = {
+    "address",
+    "article",
+    "aside",
+    "blockquote",
+    "details",
+    "div",
+    "dl",
+    "fieldset",
+    "figcaption",
+    "figure",
+    "footer",
+    "form",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "header",
+    "hgroup",
+    "hr",
+    "main",
+    "menu",
+    "nav",
+    "ol",
+    "p",
+    "pre",
+    "section",
+    "table",
+    "ul",
+}
+
+# Parents whose end tag does not allow omitting a final </p>
+P_KEEPING_PARENTS = {"a", "audio", "del", "ins", "map", "noscript", "video"}
+
+# Start tags that may not directly follow an omitted <body> start tag
+BODY_KEEPING_TAGS = {"meta", "link", "script", "style", "template"}
+
+TAG_NAME = re.compile(r"<(/?)([a-zA-Z][^\s/>]*)")
+ATTRIBUTE = re.compile(
+    r"""([^\s"'>/=]+)(?:\s*=\s*("[^"]*"|'[^']*'|[^\s>]+))?"""
+)
+WHITESPACE = re.compile(r"[ \t\n\r\f]+")
+UNQUOTED_VALUE = re.compile(r"[^\s\"'=<>`]+")
+
+_raw_text_ends = {}
+
+
+def _raw_text_end(name):
+    if name not in _raw_text_ends:
+        _raw_text_ends[name] = re.compile(rf"</{name}\s*>", re.IGNORECASE)
+    return _raw_text_ends[name]
+
+
+def tokenize(html):
+    """Split HTML into tokens in a single left-to-right scan
+
+    Yields ("start", name, attributes, self_closing), ("end", name),
+    ("text", text), ("raw", text), ("comment", text) and ("doctype", text)
+    tuples, where attributes is a list of (name, value or None). The
+    content of script, style and textarea elements is yielded as one raw
+    token.
+    """
+    pos = 0
+    length = len(html)
+    while pos < length:
+        if html.startswith("<!--", pos):
+            end = html.find("-->", pos + 4)
+            end = length if end < 0 else end + 3
+            yield ("comment", html[pos:end])
+            pos = end
+            continue
+
+        if html.startswith("<!", pos) or html.startswith("<?", pos):
+            end = html.find(">", pos)
+            end = length if end < 0 else end + 1
+            yield ("doctype", html[pos:end])
+            pos = end
+            continue
+
+        tag = TAG_NAME.match(html, pos) if html.startswith("<", pos) else None
+        if tag is not None:
+            parsed = _parse_tag(html, tag)
+            if parsed is not None:
+                token, pos = parsed
+                yield token
+                if token[0] == "start" and token[1] in RAW_TEXT_ELEMENTS:
+                    end = _raw_text_end(token[1]).search(html, pos)
+                    content_end = end.start() if end else length
+                    if content_end > pos:
+                        yield ("raw", html[pos:content_end])
+                    if end:
+                        yield ("end", token[1])
+                    pos = end.end() if end else length
+                continue
+
+        # Plain text up to the next tag
+        end = html.find("<", pos + 1)
+        end = length if end < 0 else end
+        yield ("text", html[pos:end])
+        pos = end
+
+
+def _parse_tag(html, tag):
+    """Parse the tag starting at a TAG_NAME match, or None if unterminated"""
+    closing, name = tag.group(1), tag.group(2).lower()
+    pos = tag.end()
+    attributes = []
+    while pos < len(html):
+        char = html[pos]
+        if char == ">":
+            if closing:
+                return ("end", name), pos + 1
+            self_closing = html[pos - 1] == "/"
+            return ("start", name, attributes, self_closing), pos + 1
+        if char.isspace() or char == "/":
+            pos += 1
+            continue
+        attribute = ATTRIBUTE.match(html, pos)
+        if attribute is None:
+            pos += 1
+            continue
+        value = attribute.group(2)
+        if value is not None and value[:1] in ("'", '"'):
+            value = value[1:-1]
+        attributes.append((attribute.group(1).lower(), value))
+        pos = attribute.end()
+    return None
+
+
+def _drop_comments(tokens):
+    """Remove comments except conditional comments"""
+    for token in tokens:
+        if token[0] == "comment" and not token[1].startswith("<!--[if"):
+            continue
+        yield token
+
+
+def _merge_text(tokens):
+    """Join adjacent text tokens, e.g. around a removed comment"""
+    pending = None
+    for token in tokens:
+        if token[0] == "text":
+            pending = token[1] if pending is None else pending + token[1]
+            continue
+        if pending is not None:
+            yield ("text", pending)
+            pending = None
+        yield token
+    if pending is not None:
+        yield ("text", pending)
+
+
+def _with_neighbours(tokens):
+    """Yield (previous, token, next) for every token"""
+    previous = current = None
+    for token in tokens:
+        if current is not None:
+            yield previous, current, token
+        previous, current = current, token
+    if current is not None:
+        yield previous, current, None
+
+
+def _is_block_boundary(token):
+    """Whether whitespace next to this token is not rendered"""
+    if token is None or token[0] == "doctype":
+        return True
+    return token[0] in ("start", "end") and token[1] not in INLINE_ELEMENTS
+
+
+def _collapse_whitespace(tokens):
+    """Collapse whitespace in text, keeping it only where it is rendered"""
+    preformatted = 0
+    after_space = False
+    for previous, token, following in _with_neighbours(tokens):
+        kind = token[0]
+        if kind in ("start", "end") and token[1] in PREFORMATTED_ELEMENTS:
+            preformatted += 1 if kind == "start" else -1
+            preformatted = max(preformatted, 0)
+        if kind != "text":
+            if kind in ("start", "end"):
+                if token[1] not in TRANSPARENT_INLINE_ELEMENTS:
+                    after_space = False
+            yield token
+            continue
+        if preformatted:
+            after_space = False
+            yield token
+            continue
+
+        text = WHITESPACE.sub(" ", token[1])
+        if _is_block_boundary(previous) or after_space:
+            text = text.lstrip(" ")
+        if _is_block_boundary(following):
+            text = text.rstrip(" ")
+        if text:
+            after_space = text.endswith(" ")
+            yield ("text", text)
+
+
+def _can_omit_end_tag(name, following):
+    """Optional end tag rules of the HTML standard"""
+    kind = following[0] if following else None
+    next_name = following[1] if kind in ("start", "end") else None
+    if name in ("html", "body"):
+        return following is None or (kind == "end" and next_name == "html")
+    if name == "head":
+        return kind != "text" or not following[1][:1].isspace()
+    if name == "li":
+        return (kind == "start" and next_name == "li") or (
+            kind == "end" and next_name in ("ul", "ol", "menu")
+        )
+    if name == "p":
+        if kind == "start":
+            return next_name in P_CLOSING_TAGS
+        return following is None or (
+            kind == "end" and next_name not in P_KEEPING_PARENTS
+        )
+    if name in ("dt", "dd"):
+        return (kind == "start" and next_name in ("dt", "dd")) or (
+            name == "dd" and kind == "end"
+        )
+    if name == "option":
+        return (kind == "start" and next_name in ("option", "optgroup")) or kind == "end"
+    if name in ("td", "th"):
+        return (kind == "start" and next_name in ("td", "th")) or kind == "end"
+    if name == "tr":
+        return (kind == "start" and next_name == "tr") or kind == "end"
+    if name in ("thead", "tbody"):
+        return (kind == "start" and next_name in ("tbody", "tfoot")) or (
+            name == "tbody" and kind == "end"
+        )
+    return False
+
+
+def _can_omit_start_tag(name, attributes, following):
+    """Optional start tag rules of the HTML standard (elements without attributes)"""
+    if attributes or following is None:
+        return False
+    kind = following[0]
+    if name == "html":
+        return kind != "comment"
+    if name == "head":
+        return kind in ("start", "end")
+    if name == "body":
+        if kind == "text":
+            return not following[1][:1].isspace()
+        return kind != "comment" and not (
+            kind == "start" and following[1] in BODY_KEEPING_TAGS
+        )
+    return False
+
+
+def _omit_optional_tags(tokens):
+    """Drop start and end tags that the parser implies"""
+    for _, token, following in _with_neighbours(tokens):
+        if token[0] == "end" and _can_omit_end_tag(token[1], following):
+            continue
+        if token[0] == "start" and _can_omit_start_tag(token[1], token[2], following):
+            continue
+        yield token
+
+
+def _attribute(element, name, value):
+    """Serialized attribute, or None if it only restates the default"""
+    if value is None:
+        return name
+    if name in BOOLEAN_ATTRIBUTES and value.lower() in ("", name):
+        return name
+    if value.lower() in REDUNDANT_ATTRIBUTES.get((element, name), ()):
+        return None
+    if name == "class":
+        value = " ".join(value.split())
+    if UNQUOTED_VALUE.fullmatch(value) and not value.endswith("/"):
+        return f"{name}={value}"
+    if '"' in value and "'" not in value:
+        return f"{name}='{value}'"
+    return f'{name}="{value.replace(chr(34), "&quot;")}"'
+
+
+def _start_tag(name, attributes, self_closing):
+    parts = [name]
+    for attribute, value in attributes:
+        serialized = _attribute(name, attribute, value)
+        if serialized is not None:
+            parts.append(serialized)
+    tag = "<" + " ".join(parts)
+    # The slash only matters on foreign (SVG/MathML) elements
+    if self_closing and name not in VOID_ELEMENTS:
+        tag += " /" if "=" in parts[-1] and parts[-1][-1] not in "'\"" else "/"
+    return tag + ">"
+
+
+def minify_html(html, minify_css=None, minify_js=None):
+    """Minify HTML in one streaming pass over its tokens
+
+    Whitespace is collapsed only where it is not rendered, and left alone
+    in <pre> and <textarea>; comments, optional start and end tags,
+    default attribute values and unnecessary attribute quotes are
+    removed and boolean attributes are collapsed. The content of inline
+    <style> and JavaScript <script> elements is passed to minify_css and
+    minify_js when given.
+    """
+    tokens = _omit_optional_tags(
+        _collapse_whitespace(_merge_text(_drop_comments(tokenize(html))))
+    )
+    output = []
+    element = None
+    script_type = ""
+    for token in tokens:
+        kind = token[0]
+        if kind == "start":
+            element = token[1]
+            if element == "script":
+                script_type = (dict(token[2]).get("type") or "").strip().lower()
+            output.append(_start_tag(element, token[2], token[3]))
+        elif kind == "end":
+            element = None
+            output.append(f"</{token[1]}>")
+        elif kind == "raw":
+            content = token[1]
+            if element == "style" and minify_css:
+                content = minify_css(content)
+            elif (
+                element == "script" and script_type in JAVASCRIPT_TYPES and minify_js
+            ):
+                content = minify_js(content)
+            output.append(content)
+        elif kind == "doctype":
+            output.append(WHITESPACE.sub(" ", token[1]))
+        else:
+            output.append(token[1])
+    return "".join(output)
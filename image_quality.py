@@ -0,0 +1,145 @@
+from io import BytesIO
+
+try:
+    import numpy as np
+
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Structural similarity the encoder quality search aims for, about what the
+# fixed AVIF and WebP qualities reach on photos
+DEFAULT_TARGET_SSIM = 0.95
+
+# Encoder quality range searched per Pillow format
+QUALITY_RANGES = {"AVIF": (10, 95), "WEBP": (10, 95), "JPEG": (10, 95)}
+
+# Uniform window and constants of SSIM for 8-bit images (Wang et al. 2004)
+SSIM_WINDOW = 7
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+
+# Image info keys of the metadata dropped from every encoded image
+METADATA_KEYS = ["exif", "xmp", "XML:com.adobe.xmp", "comment", "photoshop", "iptc"]
+
+# Window rows scored at once, which bounds the float buffers of big images
+SSIM_BAND_ROWS = 256
+
+
+def _window_sums(values, size):
+    """Sum of every size x size window of a 2D array, via a summed-area table"""
+    table = np.pad(values, ((1, 0), (1, 0))).cumsum(0).cumsum(1)
+    return (
+        table[size:, size:]
+        - table[:-size, size:]
+        - table[size:, :-size]
+        + table[:-size, :-size]
+    )
+
+
+def ssim(reference, candidate):
+    """Mean structural similarity of the luma of two equally sized images
+
+    Uses 7x7 uniform windows with sample covariances, like the default of
+    scikit-image, evaluated in bands of rows to keep memory bounded.
+    """
+    x_all = np.asarray(reference.convert("L"), dtype=np.float32)
+    y_all = np.asarray(candidate.convert("L"), dtype=np.float32)
+    size = min(SSIM_WINDOW, *x_all.shape)
+    count = size * size
+    covariance_norm = count / (count - 1) if count > 1 else 1.0
+
+    total = 0.0
+    windows = 0
+    height = x_all.shape[0]
+    for top in range(0, height - size + 1, SSIM_BAND_ROWS):
+        rows = slice(top, min(top + SSIM_BAND_ROWS + size - 1, height))
+        x = x_all[rows].astype(np.float64)
+        y = y_all[rows].astype(np.float64)
+
+        mean_x = _window_sums(x, size) / count
+        mean_y = _window_sums(y, size) / count
+        var_x = (_window_sums(x * x, size) / count - mean_x**2) * covariance_norm
+        var_y = (_window_sums(y * y, size) / count - mean_y**2) * covariance_norm
+        cov_xy = (_window_sums(x * y, size) / count - mean_x * mean_y) * covariance_norm
+
+        scores = ((2 * mean_x * mean_y + SSIM_C1) * (2 * cov_xy + SSIM_C2)) / (
+            (mean_x**2 + mean_y**2 + SSIM_C1) * (var_x + var_y + SSIM_C2)
+        )
+        total += float(scores.sum())
+        windows += scores.size
+    return total / windows
+
+
+def strip_metadata(img):
+    """Drop EXIF, XMP and other metadata from an image in place
+
+    An ICC profile is only kept when it is not sRGB, which browsers assume
+    for untagged images anyway.
+    """
+    icc_profile = img.info.get("icc_profile")
+    transparency = img.info.get("transparency")
+    img.info = {}
+    if icc_profile and b"sRGB" not in icc_profile:
+        img.info["icc_profile"] = icc_profile
+    if transparency is not None:
+        img.info["transparency"] = transparency
+    return img
+
+
+def has_metadata(info):
+    """Whether image info holds metadata strip_metadata would drop"""
+    icc_profile = info.get("icc_profile")
+    return bool(
+        any(info.get(key) for key in METADATA_KEYS)
+        or (icc_profile and b"sRGB" in icc_profile)
+    )
+
+
+def encode(img, pil_format, options, quality=None):
+    """Encoded bytes of an image, carrying over only a kept ICC profile"""
+    options = dict(options)
+    if quality is not None:
+        options["quality"] = quality
+    if img.info.get("icc_profile"):
+        options["icc_profile"] = img.info["icc_profile"]
+    buffer = BytesIO()
+    img.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def search_quality(img, pil_format, options, target=DEFAULT_TARGET_SSIM):
+    """Binary-search the lowest encoder quality whose decoded output reaches
+    the target SSIM against img
+
+    Returns (data, quality, score). Lossless formats are encoded once with
+    a score of 1; if even the highest quality misses the target, that is
+    what is returned.
+    """
+    if pil_format not in QUALITY_RANGES:
+        return encode(img, pil_format, options), None, 1.0
+
+    low, high = QUALITY_RANGES[pil_format]
+    best = None
+    while low <= high:
+        quality = (low + high) // 2
+        data = encode(img, pil_format, options, quality)
+        with Image.open(BytesIO(data)) as decoded:
+            score = ssim(img, decoded)
+        if score >= target:
+            best = data, quality, score
+            high = quality - 1
+        else:
+            low = quality + 1
+
+    if best is None:
+        quality = QUALITY_RANGES[pil_format][1]
+        data = encode(img, pil_format, options, quality)
+        with Image.open(BytesIO(data)) as decoded:
+            best = data, quality, ssim(img, decoded)
+    return best
@@ -0,0 +1,810 @@
+from bisect import bisect_right
+from collections import Counter
+import re
+
+KEYWORDS = {
+    "async",
+    "await",
+    "break",
+    "case",
+    "catch",
+    "class",
+    "const",
+    "continue",
+    "debugger",
+    "default",
+    "delete",
+    "do",
+    "else",
+    "enum",
+    "export",
+    "extends",
+    "false",
+    "finally",
+    "for",
+    "function",
+    "get",
+    "if",
+    "import",
+    "in",
+    "instanceof",
+    "let",
+    "new",
+    "null",
+    "of",
+    "return",
+    "set",
+    "static",
+    "super",
+    "switch",
+    "this",
+    "throw",
+    "true",
+    "try",
+    "typeof",
+    "var",
+    "void",
+    "while",
+    "with",
+    "yield",
+}
+
+# Keywords after which a slash starts a regex literal, not a division
+REGEX_KEYWORDS = {
+    "await",
+    "case",
+    "delete",
+    "do",
+    "else",
+    "in",
+    "instanceof",
+    "new",
+    "of",
+    "return",
+    "throw",
+    "typeof",
+    "void",
+    "yield",
+}
+
+# Keywords that end a statement when followed by a line break
+RESTRICTED_KEYWORDS = {"return", "break", "continue", "throw", "yield", "async"}
+
+# Keywords after which a statement cannot end
+CONTINUING_KEYWORDS = {
+    "case",
+    "catch",
+    "const",
+    "delete",
+    "do",
+    "else",
+    "extends",
+    "finally",
+    "for",
+    "function",
+    "if",
+    "in",
+    "instanceof",
+    "new",
+    "switch",
+    "try",
+    "typeof",
+    "var",
+    "void",
+    "while",
+    "with",
+}
+
+# Constructs that make renaming local variables unsafe
+MANGLE_BLOCKERS = {"eval", "with", "class", "import", "export"}
+
+PUNCTUATORS = sorted(
+    """>>>= ... === !== **= <<= >>= >>> &&= ||= ??= => == != <= >= && || ??
+    ?. ++ -- += -= *= /= %= &= |= ^= ** << >> { } ( ) [ ] ; , < > + - * / % & |
+    ^ ! ~ ? : = . @ #""".split(),
+    key=len,
+    reverse=True,
+)
+
+TOKEN = re.compile(
+    r"""(?P<space>[ \t\f\v\u00a0\ufeff]+)
+    |(?P<newline>[\r\n\u2028\u2029]+)
+    |(?P<comment>//[^\r\n\u2028\u2029]*|/\*.*?\*/)
+    |(?P<name>[A-Za-z_$\u0080-\uffff][\w$\u0080-\uffff]*)
+    |(?P<number>0[xX][\da-fA-F_]+n?|0[bB][01_]+n?|0[oO][0-7_]+n?
+        |(?:\d[\d_]*(?:\.[\d_]*)?|\.\d[\d_]*)(?:[eE][+-]?\d[\d_]*)?n?)
+    |(?P<string>"(?:[^"\\\r\n]|\\.|\\\r?\n)*"|'(?:[^'\\\r\n]|\\.|\\\r?\n)*')
+    |(?P<punct>"""
+    + "|".join(re.escape(p) for p in PUNCTUATORS)
+    + ")",
+    re.VERBOSE | re.DOTALL,
+)
+
+# Body of a template literal up to its end or the next substitution
+TEMPLATE_CHUNK = re.compile(r"(?:[^`\\$]|\\.|\$(?!\{))*(?:`|\$\{)", re.DOTALL)
+
+# Body of a regex literal including its flags
+REGEX_LITERAL = re.compile(r"/(?:[^/\\\[\r\n]|\\.|\[(?:[^\]\\\r\n]|\\.)*\])+/[A-Za-z]*")
+
+LINE_TERMINATOR = re.compile(r"[\r\n\u2028\u2029]")
+
+IDENTIFIER_CHAR = re.compile(r"[\w$\u0080-\uffff]")
+
+
+class Token:
+    """A significant token, whether a line break preceded it and its
+    start and end offsets in the source"""
+
+    __slots__ = ("kind", "value", "newline_before", "start", "end")
+
+    def __init__(self, kind, value, newline_before, start, end):
+        self.kind = kind
+        self.value = value
+        self.newline_before = newline_before
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return f"Token({self.kind!r}, {self.value!r})"
+
+
+def _regex_allowed(previous):
+    """Whether a slash after this token starts a regex literal"""
+    if previous is None:
+        return True
+    if previous.kind == "name":
+        return previous.value in REGEX_KEYWORDS
+    if previous.kind == "punct":
+        return previous.value not in (")", "]", "}")
+    if previous.kind == "template":
+        return previous.value.endswith("${")
+    return False
+
+
+def tokenize(js):
+    """Split JavaScript into significant tokens, dropping comments
+
+    String, template and regex literals are kept verbatim. A template
+    literal with substitutions is split into chunks that end in "${" or
+    start with "}", with the tokens of the substitutions in between.
+    """
+    tokens = []
+    pos = 0
+    length = len(js)
+    newline = False
+    previous = None
+    # Brace depth at each open template substitution
+    templates = []
+    depth = 0
+
+    while pos < length:
+        char = js[pos]
+
+        if char == "`" or (char == "}" and templates and templates[-1] == depth):
+            if char == "}":
+                templates.pop()
+            chunk = TEMPLATE_CHUNK.match(js, pos + 1)
+            if chunk is None:
+                raise ValueError(f"Unterminated template literal at {pos}")
+            value = js[pos : chunk.end()]
+            if value.endswith("${"):
+                templates.append(depth)
+            previous = Token("template", value, newline, pos, chunk.end())
+            tokens.append(previous)
+            newline = False
+            pos = chunk.end()
+            continue
+
+        if char == "/" and not js.startswith(("//", "/*"), pos) and _regex_allowed(previous):
+            literal = REGEX_LITERAL.match(js, pos)
+            if literal is None:
+                raise ValueError(f"Unterminated regex literal at {pos}")
+            previous = Token("regex", literal.group(), newline, pos, literal.end())
+            tokens.append(previous)
+            newline = False
+            pos = literal.end()
+            continue
+
+        match = TOKEN.match(js, pos)
+        if match is None:
+            raise ValueError(f"Unexpected character {char!r} at {pos}")
+        kind = match.lastgroup
+        value = match.group()
+        pos = match.end()
+
+        if kind == "space":
+            continue
+        if kind == "newline" or (
+            kind == "comment" and LINE_TERMINATOR.search(value)
+        ):
+            newline = True
+            continue
+        if kind == "comment":
+            continue
+        if kind == "punct" and value == "?." and pos < length and js[pos].isdigit():
+            # "a?.5:b" is a conditional, not optional chaining
+            value = "?"
+            pos -= 1
+        if kind == "punct":
+            if value == "{":
+                depth += 1
+            elif value == "}":
+                depth -= 1
+
+        previous = Token(kind, value, newline, match.start(), match.start() + len(value))
+        tokens.append(previous)
+        newline = False
+
+    return tokens
+
+
+def _bracket_roles(token):
+    """Whether a token closes and whether it opens a bracketed group
+
+    The middle chunk of a template literal does both.
+    """
+    value = token.value
+    if token.kind == "punct":
+        return value in (")", "]", "}"), value in ("(", "[", "{")
+    if token.kind == "template":
+        return value.startswith("}"), value.endswith("${")
+    return False, False
+
+
+def _match_brackets(tokens):
+    """Index of the matching bracket for every bracket token"""
+    matches = {}
+    stack = []
+    for index, token in enumerate(tokens):
+        closes, opens = _bracket_roles(token)
+        if closes and stack:
+            start = stack.pop()
+            matches[start] = index
+            matches[index] = start
+        if opens:
+            stack.append(index)
+    return matches
+
+
+def _continues_expression(token):
+    """Whether a statement cannot end right after this token"""
+    if token.kind == "punct":
+        return token.value not in (")", "]", "}", "++", "--")
+    return token.kind == "name" and token.value in CONTINUING_KEYWORDS
+
+
+def _keeps_line_break(previous, token):
+    """Whether dropping the line break before token could change the parse
+
+    A line break ends a statement through automatic semicolon insertion
+    only after a restricted keyword, before "++"/"--", or where the next
+    token could not continue the statement.
+    """
+    if previous.kind == "name" and previous.value in RESTRICTED_KEYWORDS:
+        return True
+    if _continues_expression(previous):
+        return False
+    if token.kind == "punct":
+        return token.value in ("{", "++", "--")
+    return True
+
+
+class Scope:
+    """A function or block scope: its token range, parent and declared
+    names
+
+    Block scopes only hold let and const declarations and catch
+    parameters; var and function declarations belong to the nearest
+    function scope.
+    """
+
+    def __init__(self, start, end, parent, block=False):
+        self.start = start
+        self.end = end
+        self.parent = parent
+        self.block = block
+        self.children = []
+        self.starts = []
+        self.declared = set()
+        self.renames = {}
+
+    def contains(self, index):
+        return self.start <= index <= self.end
+
+    def innermost(self, index):
+        """The most deeply nested scope around a token"""
+        scope = self
+        while scope.children:
+            # Children are disjoint and sorted by start
+            position = bisect_right(scope.starts, index) - 1
+            if position < 0 or not scope.children[position].contains(index):
+                break
+            scope = scope.children[position]
+        return scope
+
+    def function_scope(self, index):
+        """The innermost function scope (or the program) around a token"""
+        scope = self.innermost(index)
+        while scope.block:
+            scope = scope.parent
+        return scope
+
+    def add_child(self, child):
+        self.children.append(child)
+        self.starts.append(child.start)
+
+
+class Mangler:
+    """Rename the variables declared inside functions and blocks to short
+    names
+
+    Top-level names stay untouched since other scripts may use them. The whole script is left alone when it
+    uses a construct the analysis does not model (eval, with, classes,
+    modules or destructuring declarations).
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.matches = _match_brackets(tokens)
+        self.program = Scope(0, len(tokens), None)
+        self.object_braces = set()
+        self.function_bodies = set()
+        # Innermost open bracket around every token
+        self.enclosing = []
+        stack = []
+        for token in tokens:
+            closes, opens = _bracket_roles(token)
+            if closes and stack:
+                stack.pop()
+            self.enclosing.append(stack[-1] if stack else None)
+            if opens:
+                stack.append(len(self.enclosing) - 1)
+
+    def is_keyword_at(self, index, *values):
+        if 0 <= index < len(self.tokens):
+            token = self.tokens[index]
+            return token.kind == "name" and token.value in values
+        return False
+
+    def is_punct_at(self, index, *values):
+        if 0 <= index < len(self.tokens):
+            token = self.tokens[index]
+            return token.kind == "punct" and token.value in values
+        return False
+
+    def analyze(self):
+        """Build the scope tree; returns False when mangling is unsafe"""
+        for token in self.tokens:
+            if token.kind == "name" and token.value in MANGLE_BLOCKERS:
+                return False
+        self.find_object_braces()
+        for index, token in enumerate(self.tokens):
+            # Methods and accessors in object literals are not modelled
+            if token.kind != "name":
+                continue
+            if self.is_object_key(index) and self.is_punct_at(index + 1, "("):
+                return False
+            if token.value in ("get", "set", "async") and self.in_object(index):
+                if self.is_punct_at(index + 2, "(") or self.is_punct_at(index + 1, "["):
+                    return False
+        functions = self.find_functions()
+        if functions is None:
+            return False
+        blocks = self.find_blocks()
+        if blocks is None:
+            return False
+        # Outer scopes first, so every scope finds its parent already added
+        scopes = [(start, end, params, own_name, False) for start, end, params, own_name in functions]
+        for start, end, params, own_name, block in sorted(
+            scopes + blocks, key=lambda scope: (scope[0], -scope[1])
+        ):
+            parent = self.program.innermost(start)
+            scope = Scope(start, end, parent, block)
+            parent.add_child(scope)
+            scope.declared.update(params)
+            if own_name:
+                scope.declared.add(own_name)
+        return self.find_declarations()
+
+    def find_object_braces(self):
+        """Mark the braces that open object literals rather than blocks"""
+        for index, token in enumerate(self.tokens):
+            if token.kind != "punct" or token.value != "{" or index == 0:
+                continue
+            previous = self.tokens[index - 1]
+            if previous.kind == "punct":
+                is_object = previous.value not in (")", "]", "}", ";", "=>")
+            elif previous.kind == "template":
+                is_object = previous.value.endswith("${")
+            else:
+                is_object = previous.kind == "name" and previous.value in (
+                    REGEX_KEYWORDS - {"do", "else"}
+                )
+            if is_object:
+                self.object_braces.add(index)
+
+    def find_functions(self):
+        """(start, end, params, own name) of every function and arrow"""
+        functions = []
+        tokens = self.tokens
+        for index, token in enumerate(tokens):
+            if token.kind == "name" and token.value == "function":
+                name_index = index + 1
+                if self.is_punct_at(name_index, "*"):
+                    name_index += 1
+                own_name = None
+                paren = name_index
+                if tokens[name_index].kind == "name":
+                    paren = name_index + 1
+                    if not self.is_declaration(index):
+                        own_name = tokens[name_index].value
+                if not self.is_punct_at(paren, "(") or paren not in self.matches:
+                    return None
+                close = self.matches[paren]
+                if not self.is_punct_at(close + 1, "{"):
+                    return None
+                params = self.parameters(paren + 1, close)
+                if params is None:
+                    return None
+                self.function_bodies.add(close + 1)
+                functions.append((index, self.matches[close + 1], params, own_name))
+            elif token.kind == "punct" and token.value == "=>":
+                previous = tokens[index - 1]
+                if previous.kind == "name":
+                    start, params = index - 1, [previous.value]
+                elif previous.value == ")" and index - 1 in self.matches:
+                    start = self.matches[index - 1]
+                    params = self.parameters(start + 1, index - 1)
+                    if params is None:
+                        return None
+                else:
+                    return None
+                if self.is_punct_at(index + 1, "{"):
+                    self.function_bodies.add(index + 1)
+                functions.append((start, self.arrow_body_end(index + 1), params, None))
+        return functions
+
+    def find_blocks(self):
+        """(start, end, params, None, True) of every block scope
+
+        Blocks are the braces that are neither object literals nor function
+        bodies, for statements (whose head may declare the loop variables)
+        and catch clauses (whose parameters are the params). Returns None
+        for destructured catch parameters.
+        """
+        blocks = []
+        tokens = self.tokens
+        for index, token in enumerate(tokens):
+            if self.is_punct_at(index, "{"):
+                if (
+                    index in self.matches
+                    and index not in self.object_braces
+                    and index not in self.function_bodies
+                ):
+                    blocks.append((index, self.matches[index], [], None, True))
+                continue
+            if token.kind != "name" or token.value not in ("for", "catch"):
+                continue
+            if self.is_punct_at(index - 1, ".", "?."):
+                continue
+            paren = index + 2 if self.is_keyword_at(index + 1, "await") else index + 1
+            if not self.is_punct_at(paren, "(") or paren not in self.matches:
+                continue
+            close = self.matches[paren]
+            params = []
+            if token.value == "catch":
+                params = self.parameters(paren + 1, close)
+                if params is None:
+                    return None
+            if self.is_punct_at(close + 1, "{") and close + 1 in self.matches:
+                end = self.matches[close + 1]
+            else:
+                end = self.arrow_body_end(close + 1)
+            blocks.append((index, end, params, None, True))
+        return blocks
+
+    def is_declaration(self, index):
+        """Whether the function keyword at index starts a declaration"""
+        if index == 0:
+            return True
+        previous = self.tokens[index - 1]
+        if (
+            previous.kind == "name"
+            and previous.value == "async"
+            and not self.tokens[index].newline_before
+        ):
+            return self.is_declaration(index - 1)
+        if self.tokens[index].newline_before and _keeps_line_break(
+            previous, self.tokens[index]
+        ):
+            return True
+        if previous.kind == "punct":
+            return previous.value in (";", "}") or (
+                previous.value == "{" and index - 1 not in self.object_braces
+            )
+        return previous.kind == "name" and previous.value in ("else", "do")
+
+    def parameters(self, start, end):
+        """Names in a parameter list, or None for destructuring patterns"""
+        params = []
+        expect_name = True
+        index = start
+        while index < end:
+            token = self.tokens[index]
+            if expect_name:
+                if self.is_punct_at(index, "..."):
+                    index += 1
+                    continue
+                if token.kind != "name" or token.value in KEYWORDS:
+                    return None
+                params.append(token.value)
+                expect_name = False
+            elif self.is_punct_at(index, ","):
+                expect_name = True
+            elif index in self.matches and self.matches[index] > index:
+                # Skip over bracketed default values
+                index = self.matches[index]
+            index += 1
+        return params
+
+    def arrow_body_end(self, index):
+        """Index of the last token of an arrow function body"""
+        if self.is_punct_at(index, "{") and index in self.matches:
+            return self.matches[index]
+        tokens = self.tokens
+        last = index
+        while index < len(tokens):
+            token = tokens[index]
+            if token.kind == "punct" and token.value in (",", ";", ")", "]", "}"):
+                break
+            if token.kind == "template" and token.value.startswith("}"):
+                break
+            if (
+                token.newline_before
+                and index > last
+                and _keeps_line_break(tokens[index - 1], token)
+            ):
+                break
+            last = index
+            if index in self.matches and self.matches[index] > index:
+                last = index = self.matches[index]
+            index += 1
+        return last
+
+    def find_declarations(self):
+        """Add var/let/const and function names to their scopes
+
+        let and const belong to the innermost block, var and function
+        declarations to the innermost function. Catch parameters were
+        added with the catch blocks.
+        """
+        tokens = self.tokens
+        for index, token in enumerate(tokens):
+            if token.kind != "name":
+                continue
+            if token.value in ("var", "let", "const"):
+                if self.is_punct_at(index - 1, "."):
+                    continue
+                names = self.declarators(index + 1)
+                if names is None:
+                    return False
+                if token.value == "var":
+                    self.program.function_scope(index).declared.update(names)
+                else:
+                    self.program.innermost(index).declared.update(names)
+            elif token.value == "function" and self.is_declaration(index):
+                name_index = index + 2 if self.is_punct_at(index + 1, "*") else index + 1
+                if tokens[name_index].kind == "name":
+                    # The innermost scope is the function itself
+                    scope = self.program.innermost(index).parent
+                    while scope.block:
+                        scope = scope.parent
+                    scope.declared.add(tokens[name_index].value)
+        return True
+
+    def declarators(self, index):
+        """Names declared by the declaration list starting at index"""
+        names = []
+        tokens = self.tokens
+        while index < len(tokens):
+            token = tokens[index]
+            if token.kind != "name" or token.value in KEYWORDS:
+                return None
+            names.append(token.value)
+            index += 1
+            # Skip the initializer up to the next declarator
+            while index < len(tokens):
+                token = tokens[index]
+                if token.kind == "punct" and token.value in (";", ")", "]", "}"):
+                    return names
+                if token.kind == "name" and token.value in ("in", "of"):
+                    return names
+                if token.newline_before and _keeps_line_break(
+                    tokens[index - 1], token
+                ):
+                    return names
+                if self.is_punct_at(index, ","):
+                    index += 1
+                    break
+                if index in self.matches and self.matches[index] > index:
+                    index = self.matches[index]
+                index += 1
+            else:
+                return names
+        return names
+
+    def references(self):
+        """Indexes of the name tokens that refer to variables"""
+        tokens = self.tokens
+        for index, token in enumerate(tokens):
+            if token.kind != "name" or token.value in KEYWORDS:
+                continue
+            if self.is_punct_at(index - 1, ".", "?."):
+                continue
+            if self.is_keyword_at(index - 1, "break", "continue"):
+                continue
+            if self.is_object_key(index) and not self.is_shorthand(index):
+                continue
+            if self.is_punct_at(index + 1, ":") and self.is_label(index):
+                continue
+            yield index
+
+    def in_object(self, index):
+        """Whether the token at index is directly inside an object literal"""
+        return self.enclosing[index] in self.object_braces
+
+    def is_object_key(self, index):
+        if not self.is_punct_at(index - 1, "{", ","):
+            return False
+        if not self.is_punct_at(index + 1, ":", "(", ",", "}"):
+            return False
+        return self.in_object(index)
+
+    def is_shorthand(self, index):
+        return self.is_punct_at(index + 1, ",", "}")
+
+    def is_label(self, index):
+        return index == 0 or self.is_punct_at(index - 1, ";", "{", "}")
+
+    def rename(self):
+        """Assign short names scope by scope, outermost first
+
+        Each scope records how often its own variables are referenced and
+        which outer variables and globals are referenced from inside it,
+        since those names may not be reused for its variables.
+        """
+        references = list(self.references())
+        resolved = {}
+        counts = {}
+        visible = {}
+        for index in references:
+            name = self.tokens[index].value
+            inner = scope = self.program.innermost(index)
+            while scope is not None and name not in scope.declared:
+                scope = scope.parent
+            resolved[index] = scope
+            if scope is not None:
+                counts.setdefault(scope, Counter())[name] += 1
+            # Every scope between the reference and its owner sees the name
+            while inner is not scope and inner is not self.program:
+                visible.setdefault(inner, set()).add((scope, name))
+                inner = inner.parent
+
+        pending = list(self.program.children)
+        while pending:
+            scope = pending.pop()
+            pending.extend(scope.children)
+            avoid = set()
+            for owner, name in visible.get(scope, ()):
+                avoid.add(owner.renames.get(name, name) if owner else name)
+            count = counts.get(scope, Counter())
+            generator = _short_names()
+            for name in sorted(scope.declared, key=lambda n: (-count[n], n)):
+                new_name = next(generator)
+                while new_name in avoid:
+                    new_name = next(generator)
+                scope.renames[name] = new_name
+        return resolved, references
+
+    def apply(self):
+        """Rewrite the tokens in place"""
+        resolved, references = self.rename()
+        for index in references:
+            scope = resolved[index]
+            if scope is None or scope is self.program:
+                continue
+            token = self.tokens[index]
+            new_name = scope.renames[token.value]
+            if self.is_object_key(index) and self.is_shorthand(index):
+                new_name = f"{token.value}:{new_name}"
+            token.value = new_name
+
+
+def _short_names():
+    """a, b, ..., Z, aa, ab, ... skipping keywords"""
+    first = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_$"
+    rest = first + "0123456789"
+    length = 1
+    while True:
+        for index in range(len(first) * len(rest) ** (length - 1)):
+            name = first[index % len(first)]
+            index //= len(first)
+            for _ in range(length - 1):
+                name += rest[index % len(rest)]
+                index //= len(rest)
+            if name not in KEYWORDS:
+                yield name
+        length += 1
+
+
+def _needs_space(left, right):
+    """Whether two tokens would merge if written without a separator"""
+    if IDENTIFIER_CHAR.match(left[-1]) and IDENTIFIER_CHAR.match(right[0]):
+        return True
+    if left[-1] in "+-" and right[0] == left[-1]:
+        return True
+    if left[-1] == "/" and right[0] in "/*":
+        return True
+    if right[0] == "." and left[0].isdigit() and not re.search(r"[.eExXn]", left):
+        return True
+    return (left.endswith("--") and right[0] == ">") or (left[-1] == "<" and right[0] == "!")
+
+
+def _shorten_number(value):
+    if value.startswith("0.") and len(value) > 2:
+        return value[1:]
+    return value
+
+
+def minify_js(js, mangle=True):
+    """Minify JavaScript from its tokens
+
+    Comments and whitespace are dropped except where a line break could
+    end a statement through automatic semicolon insertion, semicolons
+    before "}" are removed and, with mangle, variables local to functions
+    are renamed to the shortest free names.
+    """
+    tokens = tokenize(js)
+    if mangle:
+        mangler = Mangler(tokens)
+        if mangler.analyze():
+            mangler.apply()
+    matches = _match_brackets(tokens)
+
+    output = []
+    previous = None
+    for index, token in enumerate(tokens):
+        value = token.value
+        if token.kind == "number":
+            value = _shorten_number(value)
+        following = tokens[index + 1] if index + 1 < len(tokens) else None
+
+        if (
+            token.kind == "punct"
+            and value == ";"
+            and (following is None or following.value == "}")
+            and not _ends_empty_statement(tokens, matches, index)
+        ):
+            continue
+
+        if previous is not None:
+            if token.newline_before and _keeps_line_break(previous, token):
+                output.append("\n")
+            elif _needs_space(output[-1], value):
+                output.append(" ")
+        output.append(value)
+        previous = token
+    return "".join(output)
+
+
+def _ends_empty_statement(tokens, matches, index):
+    """Whether the semicolon at index is an empty statement like "if (a);" """
+    previous = tokens[index - 1] if index else None
+    if previous is None:
+        return False
+    if previous.kind == "name" and previous.value in ("else", "do"):
+        return True
+    if previous.kind == "punct" and previous.value == ")" and index - 1 in matches:
+        keyword = matches[index - 1] - 1
+        return keyword >= 0 and tokens[keyword].value in ("if", "for", "while")
+    return False
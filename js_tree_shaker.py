@@ -0,0 +1,326 @@
+from html.parser import HTMLParser
+import re
+
+from js_minifier import KEYWORDS, _keeps_line_break, _match_brackets, tokenize
+
+# Constructs that can reach declarations without naming them
+SHAKE_BLOCKERS = {"eval", "with"}
+
+# Keywords that make an initializer observable when it is evaluated
+IMPURE_KEYWORDS = {"new", "delete", "await", "yield", "import", "super", "class"}
+
+COMPARISONS = {"==", "===", "!=", "!==", "<=", ">="}
+
+IDENTIFIER = re.compile(r"[A-Za-z_$][\w$]*")
+
+# Indentation of a line and the line comments directly above it
+LEADING_LINES = re.compile(r"(?:^[ \t]*//[^\r\n]*\r?\n)*^[ \t]*\Z", re.MULTILINE)
+
+
+class HandlerParser(HTMLParser):
+    """Collect the identifiers used by inline event handler attributes"""
+
+    def __init__(self):
+        super().__init__()
+        self.names = set()
+
+    def handle_starttag(self, tag, attrs):
+        for name, value in attrs:
+            if name.startswith("on") and value:
+                self.names.update(IDENTIFIER.findall(value))
+
+
+def handler_names(html):
+    """Names a page's inline event handlers may look up in the global scope"""
+    parser = HandlerParser()
+    parser.feed(html)
+    parser.close()
+    return parser.names
+
+
+class Shaker:
+    """Find the declarations of a script that nothing reachable references
+
+    Declarations are analyzed in the bodies of immediately invoked
+    functions only; top-level declarations are globals other scripts may
+    use. References are matched by name without scope resolution, and
+    identifiers inside string and template literals count as references,
+    so a declaration is only removed when its name appears nowhere else.
+    Variables are only removed when evaluating their initializers cannot
+    have side effects.
+    """
+
+    def __init__(self, js, keep=()):
+        self.js = js
+        self.tokens = tokenize(js)
+        self.matches = _match_brackets(self.tokens)
+        self.keep = set(keep)
+
+    def is_punct_at(self, index, *values):
+        if 0 <= index < len(self.tokens):
+            token = self.tokens[index]
+            return token.kind == "punct" and token.value in values
+        return False
+
+    def is_name_at(self, index, *values):
+        if 0 <= index < len(self.tokens):
+            token = self.tokens[index]
+            return token.kind == "name" and token.value in values
+        return False
+
+    def function_body(self, index):
+        """(open, close) brace indexes of the function keyword at index"""
+        paren = index + 1
+        while paren < len(self.tokens) and not self.is_punct_at(paren, "("):
+            paren += 1
+        close = self.matches.get(paren)
+        if close is None or not self.is_punct_at(close + 1, "{"):
+            return None
+        return close + 1, self.matches.get(close + 1)
+
+    def iife_bodies(self):
+        """(open, close) brace indexes of every immediately invoked function"""
+        for index, token in enumerate(self.tokens):
+            if token.kind == "name" and token.value == "function":
+                if not (self.is_punct_at(index - 1, "(", "!") or self.is_name_at(index - 1, "void")):
+                    continue
+                body = self.function_body(index)
+            elif token.kind == "punct" and token.value == "=>" and self.is_punct_at(index + 1, "{"):
+                body = index + 1, self.matches.get(index + 1)
+            else:
+                continue
+            if body is None or body[1] is None:
+                continue
+            after = body[1] + 1
+            if self.is_punct_at(after, "(") or (
+                self.is_punct_at(after, ")")
+                and (
+                    self.is_punct_at(after + 1, "(")
+                    or (self.is_punct_at(after + 1, ".") and self.is_name_at(after + 2, "call", "apply"))
+                )
+            ):
+                yield body
+
+    def statements(self, start, end):
+        """(first, last) token indexes of the statements between start and end"""
+        tokens = self.tokens
+        index = start
+        while index < end:
+            first = index
+            declaration = self.is_name_at(index, "function") or (
+                self.is_name_at(index, "async") and self.is_name_at(index + 1, "function")
+            )
+            body = self.function_body(index) if declaration else None
+            if body and body[1] is not None and body[1] < end:
+                last = body[1]
+            else:
+                while index < end:
+                    token = tokens[index]
+                    if (
+                        index > first
+                        and token.newline_before
+                        and _keeps_line_break(tokens[index - 1], token)
+                    ):
+                        index -= 1
+                        break
+                    if token.kind == "punct" and token.value == ";":
+                        break
+                    if index in self.matches and self.matches[index] > index:
+                        index = self.matches[index]
+                    index += 1
+                last = min(index, end - 1)
+            yield first, last
+            index = last + 1
+
+    def declaration(self, first, last):
+        """Names declared by a removable statement and the indexes of their
+        declaring tokens, or None if removing it could change behaviour"""
+        tokens = self.tokens
+        index = first + 1 if self.is_name_at(first, "async") else first
+        if self.is_name_at(index, "function"):
+            index += 2 if self.is_punct_at(index + 1, "*") else 1
+            if tokens[index].kind == "name":
+                return [tokens[index].value], [index]
+            return None
+        if not self.is_name_at(first, "var", "let", "const"):
+            return None
+
+        names, indexes = [], []
+        index = first + 1
+        while index <= last:
+            token = tokens[index]
+            if token.kind != "name" or token.value in KEYWORDS:
+                return None
+            names.append(token.value)
+            indexes.append(index)
+            index += 1
+            if self.is_punct_at(index, "="):
+                start = index + 1
+                while index <= last and not self.is_punct_at(index, ",", ";"):
+                    if index in self.matches and self.matches[index] > index:
+                        index = self.matches[index]
+                    index += 1
+                if not self.is_pure(start, index - 1):
+                    return None
+            if not self.is_punct_at(index, ","):
+                break
+            index += 1
+        return names, indexes
+
+    def is_pure(self, first, last):
+        """Whether evaluating the expression between first and last cannot
+        have side effects; function bodies are not evaluated
+
+        Property reads may run getters, so they are impure unless the
+        object is a literal written in the expression; spreads may run
+        iterators and are always impure.
+        """
+        tokens = self.tokens
+        index = first
+        while index <= last:
+            token = tokens[index]
+            previous = tokens[index - 1] if index > first else None
+            callee = previous is not None and (
+                (previous.kind == "name" and previous.value not in KEYWORDS)
+                or (previous.kind == "punct" and previous.value in (")", "]", "?."))
+            )
+            if token.kind == "name":
+                if token.value in IMPURE_KEYWORDS:
+                    return False
+                if token.value == "function":
+                    body = self.function_body(index)
+                    if body is None or body[1] is None:
+                        return False
+                    index = body[1] + 1
+                    continue
+            elif token.kind == "punct":
+                if token.value == "=>" and self.is_punct_at(index + 1, "{"):
+                    index = self.matches.get(index + 1, last) + 1
+                    continue
+                if token.value in ("++", "--", "..."):
+                    return False
+                if token.value in (".", "?.") or (token.value == "[" and callee):
+                    if not self.is_literal_before(index, first):
+                        return False
+                if token.value.endswith("=") and token.value not in COMPARISONS:
+                    return False
+                if token.value == "(" and callee:
+                    return False
+            elif token.kind == "template" and callee:
+                return False
+            index += 1
+        return True
+
+    def is_literal_before(self, index, first):
+        """Whether the tokens right before index, from first on, are an
+        object or array literal, possibly parenthesized"""
+        close = index - 1
+        if self.is_punct_at(close, ")") and self.matches.get(close, -1) >= first:
+            # ({...}).x
+            inner = self.matches[close] + 1
+            if self.matches.get(inner) != close - 1:
+                return False
+            close -= 1
+        if not self.is_punct_at(close, "}", "]"):
+            return False
+        open = self.matches.get(close, -1)
+        if open < first:
+            return False
+        previous = self.tokens[open - 1] if open > first else None
+        # A "]" preceded by a name or a closing bracket ends a member access
+        return self.tokens[open].value == "{" or not (
+            previous is not None
+            and (
+                (previous.kind == "name" and previous.value not in KEYWORDS)
+                or (previous.kind == "punct" and previous.value in (")", "]", "}"))
+            )
+        )
+
+    def candidates(self):
+        """(names, first, last, references) of the removable declarations"""
+        ranges = [(open + 1, close) for open, close in self.iife_bodies()]
+        found = []
+        for start, end in ranges:
+            for first, last in self.statements(start, end):
+                declared = self.declaration(first, last)
+                if declared is not None:
+                    found.append((declared, first, last))
+
+        # Declarations nested in another one go with it
+        found.sort(key=lambda candidate: (candidate[1], -candidate[2]))
+        outermost = []
+        for declared, first, last in found:
+            if outermost and first <= outermost[-1][2]:
+                continue
+            names, indexes = declared
+            outermost.append((names, first, last, self.referenced(first, last, set(indexes))))
+        return outermost
+
+    def referenced(self, first, last, skip=()):
+        """Names used by the tokens between first and last"""
+        names = set()
+        for index in range(first, last + 1):
+            token = self.tokens[index]
+            if index in skip:
+                continue
+            if token.kind == "name":
+                names.add(token.value)
+            elif token.kind in ("string", "template", "regex"):
+                names.update(IDENTIFIER.findall(token.value))
+        return names
+
+    def unused(self):
+        """The removable declarations nothing reachable refers to"""
+        if any(t.kind == "name" and t.value in SHAKE_BLOCKERS for t in self.tokens):
+            return []
+        candidates = self.candidates()
+        live = set(self.keep)
+        position = 0
+        for _, first, last, _ in candidates:
+            live |= self.referenced(position, first - 1)
+            position = last + 1
+        live |= self.referenced(position, len(self.tokens) - 1)
+
+        pending = list(candidates)
+        changed = True
+        while changed:
+            changed = False
+            for candidate in list(pending):
+                if live.intersection(candidate[0]):
+                    live |= candidate[3]
+                    pending.remove(candidate)
+                    changed = True
+        return pending
+
+    def shake(self):
+        """The script without its unused declarations and the bytes removed
+        for each of them"""
+        output = []
+        removed = {}
+        position = 0
+        for names, first, last, _ in self.unused():
+            start = self.tokens[first].start
+            end = self.tokens[last].end
+            # Take whole lines along when nothing else is on them, together
+            # with the line comments right above the declaration
+            rest = re.match(r"[ \t]*(?:\r\n|[\r\n]|$)", self.js[end:])
+            line = LEADING_LINES.search(self.js, position, start)
+            if rest and line:
+                start = line.start()
+                end += rest.end()
+            output.append(self.js[position:start])
+            removed[", ".join(names)] = end - start
+            position = end
+        output.append(self.js[position:])
+        return "".join(output), removed
+
+
+def shake_js(js, keep=()):
+    """Remove the declarations of a script that are never referenced
+
+    Only declarations local to immediately invoked functions are removed.
+    Names in keep are treated as used, e.g. names referenced by inline
+    event handlers. Returns the script and a dict of the bytes removed
+    per declaration.
+    """
+    return Shaker(js, keep).shake()
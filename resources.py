@@ -1,18 +1,34 @@
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
 from pathlib import Path
+import base64
+import json
+import re
 import shutil
-import gzip
 
 try:
-    import brotli
-
-    BROTLI_AVAILABLE = True
+    import resource
 except ImportError:
-    BROTLI_AVAILABLE = False
+    # Not available on Windows, peak RSS is not reported there
+    resource = None
+
+from compression import BROTLI_AVAILABLE
+from image_quality import (
+    NUMPY_AVAILABLE,
+    QUALITY_RANGES,
+    encode,
+    has_metadata,
+    search_quality,
+    ssim,
+    strip_metadata,
+)
+
+if not BROTLI_AVAILABLE:
     print("Warning: brotli module not installed. Brotli compression will be skipped.")
     print("Install with: pip install brotli")
 
 try:
-    from PIL import Image
+    from PIL import Image, ImageFilter, features
 
     PIL_AVAILABLE = True
 except ImportError:
@@ -20,6 +36,71 @@ except ImportError:
     print("Warning: Pillow not installed. Image scaling will be skipped.")
     print("Install with: pip install Pillow")
 
+# Formats Pillow can rescale and generate responsive variants for
+RASTER_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".avif"}
+
+# Widths of the responsive image variants referenced by srcset when the
+# breakpoints of an image are not known
+RESPONSIVE_WIDTHS = [200, 400, 800, 1600]
+
+# Range of the planned variant widths; sources narrower than the minimum
+# get a single variant at their own width
+MIN_VARIANT_WIDTH = min(RESPONSIVE_WIDTHS)
+MAX_VARIANT_WIDTH = max(RESPONSIVE_WIDTHS)
+
+# Bytes of the first variant format between consecutive breakpoints
+BREAKPOINT_BYTE_STEP = 20 * 1024
+
+# Modern formats every responsive variant is encoded to, smallest first:
+# (extension, MIME type, Pillow format, save options)
+MODERN_FORMATS = [
+    (".avif", "image/avif", "AVIF", {"quality": 50}),
+    (".webp", "image/webp", "WEBP", {"quality": 75, "method": 6}),
+]
+if PIL_AVAILABLE:
+    MODERN_FORMATS = [f for f in MODERN_FORMATS if features.check(f[2].lower())]
+
+# Fallbacks for browsers without AVIF/WebP support; PNG sources may have
+# transparency, everything else falls back to JPEG
+PNG_FALLBACK = (".png", "image/png", "PNG", {"optimize": True})
+JPEG_FALLBACK = (".jpg", "image/jpeg", "JPEG", {"quality": 85, "optimize": True, "progressive": True})
+
+
+def master_format(source_suffix):
+    """Pillow format and save options the optimized master of a source
+    image is re-encoded with, in the format of the source, or None if
+    Pillow cannot write that format"""
+    suffix = source_suffix.lower().replace(".jpeg", ".jpg")
+    for extension, _, pil_format, options in MODERN_FORMATS + [PNG_FALLBACK, JPEG_FALLBACK]:
+        if extension == suffix:
+            return pil_format, options
+    return None
+
+
+def variant_formats(source_suffix):
+    """Formats of the responsive variants of a source image, the legacy
+    fallback last"""
+    fallback = PNG_FALLBACK if source_suffix.lower() in (".png", ".gif") else JPEG_FALLBACK
+    return MODERN_FORMATS + [fallback]
+
+
+# Maximum decoded pixel memory per image in MB
+MAX_IMAGE_MEMORY = 512
+
+# Let Pillow reduce() by integer factors before the final LANCZOS pass
+REDUCING_GAP = 3.0
+
+# Encoder quality and SSIM of every variant, written next to the pages
+QUALITY_MANIFEST = ".image-quality.json"
+
+# Size and variant breakpoints of every image, read when rendering pages
+IMAGE_MANIFEST = ".images.json"
+
+# Width, blur radius and WebP quality of the inline image placeholders
+PLACEHOLDER_WIDTH = 16
+PLACEHOLDER_BLUR = 1
+PLACEHOLDER_QUALITY = 40
+
 
 def generate_favicon(output_dir, optimized=False):
     """Generate an SVG favicon"""
@@ -63,8 +144,426 @@ def generate_favicon(output_dir, optimized=False):
     filepath.write_text(svg)
 
 
-def copy_images(output_dir, optimized=False):
-    """Copy images from images folder and optionally compress them"""
+def _image_bytes(img):
+    """Size of the decoded pixel buffer of an image in bytes"""
+    if img is None:
+        return 0
+    return img.width * img.height * len(img.getbands())
+
+
+def _fit_within(width, height, target_width, target_height):
+    """Largest size with the same aspect ratio that fits the target box"""
+    img_ratio = width / height
+    target_ratio = target_width / target_height
+
+    if img_ratio > target_ratio:
+        # Image is wider - scale by width
+        return target_width, int(target_width / img_ratio)
+    # Image is taller - scale by height
+    return int(target_height * img_ratio), target_height
+
+
+def _prepare(img, pil_format):
+    """Convert an image to a mode the format can store
+
+    Transparent images are flattened onto white for JPEG.
+    """
+    alpha = "A" in img.getbands() or "transparency" in img.info
+    if pil_format == "JPEG" and img.mode not in ("RGB", "L"):
+        if alpha:
+            rgba = img.convert("RGBA")
+            flat = Image.new("RGB", img.size, "white")
+            flat.paste(rgba, mask=rgba.getchannel("A"))
+            return flat
+        return img.convert("RGB")
+    if img.mode not in ("RGB", "RGBA", "L", "LA"):
+        return img.convert("RGBA" if alpha else "RGB")
+    return img
+
+
+def _encode(img, path, pil_format, options, target_ssim=None):
+    """Write an image without unneeded metadata and return its quality
+    manifest entry
+
+    With target_ssim (and NumPy), the lowest quality whose output reaches
+    that SSIM is searched; otherwise the quality in options is used.
+    """
+    img = strip_metadata(_prepare(img, pil_format))
+    if target_ssim and NUMPY_AVAILABLE:
+        options = {key: value for key, value in options.items() if key != "quality"}
+        data, quality, score = search_quality(img, pil_format, options, target_ssim)
+    else:
+        data = encode(img, pil_format, options)
+        quality = options.get("quality")
+        score = None
+        if NUMPY_AVAILABLE and pil_format in QUALITY_RANGES:
+            with Image.open(BytesIO(data)) as decoded:
+                score = ssim(img, decoded)
+    path.write_bytes(data)
+    return {
+        "format": pil_format,
+        "quality": quality,
+        "ssim": round(score, 5) if score is not None else None,
+        "bytes": len(data),
+    }
+
+
+def next_breakpoint(width, size, step=BREAKPOINT_BYTE_STEP, min_width=MIN_VARIANT_WIDTH):
+    """Width of the next smaller variant, about step bytes below one of
+    the given width and encoded size
+
+    Encoded size is assumed to scale with the pixel area. Returns
+    min_width once that is predicted to be less than a step away, or None
+    if width is already the smallest.
+    """
+    if width <= min_width:
+        return None
+    remaining = size - step
+    if remaining <= size * (min_width / width) ** 2:
+        return min_width
+    return max(min_width, int(width * (remaining / size) ** 0.5))
+
+
+def make_placeholder(img):
+    """A tiny blurred preview of an image as a WebP data URI (None if
+    Pillow cannot encode WebP) and its average colour as #rrggbb"""
+    rgb = img.convert("RGB")
+    color = "#{:02x}{:02x}{:02x}".format(*rgb.resize((1, 1), Image.Resampling.BOX).getpixel((0, 0)))
+    if not features.check("webp"):
+        return None, color
+    height = max(1, round(PLACEHOLDER_WIDTH * img.height / img.width))
+    preview = rgb.resize((PLACEHOLDER_WIDTH, height), Image.Resampling.BOX)
+    preview = preview.filter(ImageFilter.GaussianBlur(PLACEHOLDER_BLUR))
+    buffer = BytesIO()
+    preview.save(buffer, "WEBP", quality=PLACEHOLDER_QUALITY)
+    return f"data:image/webp;base64,{base64.b64encode(buffer.getvalue()).decode()}", color
+
+
+def _variant_pattern(img_file):
+    """Regex matching the file names of all variants of a source image"""
+    extensions = "|".join(re.escape(f[0]) for f in variant_formats(img_file.suffix))
+    return re.compile(rf"{re.escape(img_file.stem)}-\d+w(?:{extensions})")
+
+
+def _remove_variants(output_dir, img_file):
+    """Delete the variants of an image left by an earlier build, whose
+    breakpoints may differ"""
+    pattern = _variant_pattern(img_file)
+    for path in output_dir.glob(f"{img_file.stem}-*w.*"):
+        if pattern.fullmatch(path.name):
+            path.unlink()
+
+
+def peak_rss_mb():
+    """High-water mark of the resident set size of this process in MB"""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _resize_cascade(
+    img_file,
+    output_dir,
+    optimized,
+    max_memory,
+    compression,
+    outputs,
+    results,
+    quality,
+    image,
+    target_ssim=None,
+    in_worker=False,
+):
+    """Decode a source image once and derive the master and all variants
+
+    The master is resampled from the decoded source, every responsive
+    variant from the next larger one, so the full-size buffer is released
+    as soon as possible. Variants start at the master width (capped at
+    MAX_VARIANT_WIDTH, never upscaled) and each following width is
+    planned from the encoded size of the previous one. The optimized
+    master is re-encoded like the variants, without metadata and with the
+    quality of its format (or the one reaching target_ssim); a source
+    within bounds is kept as is when it has no metadata and re-encoding
+    would not make it smaller. The quality
+    manifest entries of the master and the variants are added to quality,
+    the master size, the variant sizes and the placeholder to image.
+    Returns the progress messages; in_worker adds the peak RSS of the
+    worker process to them.
+    """
+    messages = []
+    dest_path = output_dir / img_file.name
+    master = master_format(img_file.suffix) if optimized else None
+
+    with Image.open(img_file) as img:
+        source_info = dict(img.info)
+        source_width, source_height = img.size
+        img_ratio = source_width / source_height
+
+        # Scale images to 1920x1080 (preserving aspect ratio)
+        target_width = 1920 * 2
+        target_height = 1080 * 2
+        master_size = None
+        if source_width > target_width or source_height > target_height:
+            master_size = _fit_within(
+                source_width, source_height, target_width, target_height
+            )
+            # Let the decoder downscale while decoding where the format
+            # supports it (JPEG DCT scaling); this is a no-op otherwise
+            img.draft(img.mode, master_size)
+
+        # Refuse to decode images that would exceed the memory cap
+        estimate = img.width * img.height * len(img.getbands())
+        if master_size:
+            estimate += master_size[0] * master_size[1] * len(img.getbands())
+        if estimate > max_memory * 1024 * 1024:
+            raise MemoryError(
+                f"decoding needs ~{estimate / 1024 / 1024:.0f} MB, above the {max_memory} MB cap"
+            )
+
+        img.load()
+        live = {"source": img}
+        peak = _image_bytes(img)
+
+        if master_size:
+            base = img.resize(master_size, Image.Resampling.LANCZOS, reducing_gap=REDUCING_GAP)
+            live["base"] = base
+            peak = max(peak, sum(map(_image_bytes, live.values())))
+            if master is None:
+                base.save(dest_path, quality=100, optimize=optimized)
+            messages.append(
+                f"  ✓ Scaled {img_file.name} from {source_width}x{source_height} to {master_size[0]}x{master_size[1]}"
+            )
+            # The full-size source is no longer needed
+            img.close()
+            del live["source"]
+        else:
+            # Image is already smaller, just copy
+            base = img
+            if master is None:
+                shutil.copy2(img_file, dest_path)
+            messages.append(
+                f"  ✓ Copied {img_file.name} (already within bounds: {source_width}x{source_height})"
+            )
+
+        if master is not None:
+            entry = _encode(base, dest_path, *master, target_ssim)
+            source_size = img_file.stat().st_size
+            if not master_size and entry["bytes"] >= source_size and not has_metadata(source_info):
+                shutil.copy2(img_file, dest_path)
+                entry = dict(entry, quality=None, ssim=None, bytes=source_size)
+                messages.append(
+                    f"    Kept {img_file.name} as is (no metadata, re-encoding saves nothing)"
+                )
+            else:
+                note = f"q{entry['quality']}, " if entry["quality"] is not None else ""
+                messages.append(
+                    f"    Re-encoded {img_file.name} without metadata ({note}"
+                    f"{source_size:,} → {entry['bytes']:,} B)"
+                )
+            quality[dest_path.name] = entry
+
+        image["width"], image["height"] = base.size
+        image["variants"] = []
+
+        # For optimized version, create multiple responsive image sizes,
+        # each resampled from the previous (larger) one
+        if optimized:
+            previous = base
+            width = min(base.width, MAX_VARIANT_WIDTH)
+            while width is not None:
+                new_width = width
+                new_height = max(1, int(width / img_ratio))
+                resized_img = previous.resize(
+                    (new_width, new_height),
+                    Image.Resampling.LANCZOS,
+                    reducing_gap=REDUCING_GAP,
+                )
+                live["variant"] = resized_img
+                peak = max(peak, sum(map(_image_bytes, live.values())))
+
+                # Encode the variant once per format, the page lets the
+                # browser pick the first one it supports
+                sizes = []
+                compressed = []
+                for extension, _, pil_format, options in variant_formats(img_file.suffix):
+                    resized_path = output_dir / f"{img_file.stem}-{width}w{extension}"
+                    entry = _encode(
+                        resized_img, resized_path, pil_format, options, target_ssim
+                    )
+                    quality[resized_path.name] = entry
+                    size = f"{extension[1:]} {entry['bytes']:,} B"
+                    if target_ssim and entry["quality"] is not None:
+                        size += f" (q{entry['quality']}, SSIM {entry['ssim']:.3f})"
+                    sizes.append(size)
+
+                    # Compress resized image if it is worth it
+                    outputs.append(resized_path)
+                    if compression is not None:
+                        result = compression.compress(resized_path)
+                        compressed.append(compression.describe(result))
+                        outputs += result["kept"]
+                        results.append(result)
+                messages.append(
+                    f"  ✓ Created {img_file.stem}-{width}w ({new_width}x{new_height}): {', '.join(sizes)}"
+                )
+                messages += compressed
+                image["variants"].insert(0, [new_width, new_height])
+
+                # The smallest format is the one most browsers download
+                reference = quality[f"{img_file.stem}-{width}w{variant_formats(img_file.suffix)[0][0]}"]
+                width = next_breakpoint(width, reference["bytes"])
+
+                # Only the base and the latest variant stay in memory
+                if previous is not base:
+                    previous.close()
+                previous = resized_img
+                live["previous"] = live.pop("variant")
+
+            # The smallest variant is plenty for a 16px preview
+            image["placeholder"], image["color"] = make_placeholder(previous)
+
+    # Outside a worker this would be the peak of the whole build
+    rss = peak_rss_mb() if in_worker else None
+    rss_note = f", worker peak RSS {rss:.0f} MB" if rss is not None else ""
+    messages.append(
+        f"    Peak decoded buffers for {img_file.name}: {peak / 1024 / 1024:.1f} MB{rss_note}"
+    )
+    return messages
+
+
+def _process_image(
+    img_file,
+    output_dir,
+    optimized=False,
+    max_memory=MAX_IMAGE_MEMORY,
+    compression=None,
+    target_ssim=None,
+    in_worker=False,
+):
+    """Scale a source image and create its responsive variants
+
+    Runs in a worker process when in_worker is set, so progress messages
+    are returned instead of printed to keep the output in order. The written files are returned
+    as well, or None if the image could not be processed completely,
+    followed by the results of the compression policy, the quality
+    manifest entries of the variants and the image manifest entry (None
+    if the image was not decoded).
+    """
+    dest_path = output_dir / img_file.name
+    outputs = [dest_path]
+    results = []
+    quality = {}
+    image = {}
+
+    if PIL_AVAILABLE and img_file.suffix.lower() in RASTER_EXTENSIONS:
+        if optimized:
+            _remove_variants(output_dir, img_file)
+        try:
+            messages = _resize_cascade(
+                img_file,
+                output_dir,
+                optimized,
+                max_memory,
+                compression,
+                outputs,
+                results,
+                quality,
+                image,
+                target_ssim,
+                in_worker,
+            )
+        except Exception as e:
+            messages = [f"  ⚠ Error scaling {img_file.name}: {e}, copying original"]
+            shutil.copy2(img_file, dest_path)
+            outputs = None
+            image = {}
+    else:
+        # SVG or Pillow not available - just copy
+        messages = []
+        shutil.copy2(img_file, dest_path)
+
+    # Create gzip and brotli compressed versions if they are worth it
+    if compression is not None:
+        result = compression.compress(dest_path)
+        messages.append(compression.describe(result))
+        results.append(result)
+        if outputs is not None:
+            outputs += result["kept"]
+
+    return messages, outputs, results, quality, image or None
+
+
+def _write_quality_manifest(output_dir, quality, target_ssim, rebuilt):
+    """Merge the chosen encoder qualities into the manifest of a site
+
+    Entries of images that were not rebuilt are kept.
+    """
+    path = output_dir / QUALITY_MANIFEST
+    try:
+        variants = json.loads(path.read_text()).get("variants", {})
+    except (OSError, ValueError):
+        variants = {}
+    patterns = [_variant_pattern(img_file) for img_file in rebuilt]
+    variants = {
+        name: entry
+        for name, entry in variants.items()
+        if not any(pattern.fullmatch(name) for pattern in patterns)
+    }
+    variants.update(quality)
+    manifest = {"target_ssim": target_ssim, "variants": dict(sorted(variants.items()))}
+    path.write_text(json.dumps(manifest, indent=2))
+    return path
+
+
+def load_image_manifest(output_dir):
+    """The size and variant breakpoints of the images of a site, by name"""
+    try:
+        return json.loads((Path(output_dir) / IMAGE_MANIFEST).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def uses_pool(jobs, count):
+    """Whether run_tasks runs count tasks on a process pool"""
+    return jobs > 1 and count > 1
+
+
+def run_tasks(tasks, jobs=1):
+    """Run (function, args) tasks, in a process pool when jobs > 1
+
+    Results are yielded in submission order.
+    """
+    if not uses_pool(jobs, len(tasks)):
+        for func, args in tasks:
+            yield func(*args)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(func, *args) for func, args in tasks]
+        for future in futures:
+            yield future.result()
+
+
+def copy_images(
+    output_dir,
+    optimized=False,
+    jobs=1,
+    cache=None,
+    max_memory=MAX_IMAGE_MEMORY,
+    compression=None,
+    target_ssim=None,
+):
+    """Copy images from images folder and optionally compress them
+
+    Every source image is decoded once and processed as a separate task,
+    on a process pool when jobs > 1. Images whose decoded buffers would
+    exceed max_memory (in MB) are copied unscaled. Sidecars are written as
+    decided by the given CompressionPolicy. With target_ssim, the encoder
+    quality of every lossy variant is searched to reach that SSIM. The
+    chosen qualities and scores are written to .image-quality.json. When a
+    BuildCache is given, images whose inputs are unchanged are not
+    processed again.
+    """
     images_source = Path("images")
 
     if not images_source.exists():
@@ -82,108 +581,76 @@ def copy_images(output_dir, optimized=False):
         print(f"  ⚠ Warning: no images found in images folder")
         return
 
+    if target_ssim and optimized and not NUMPY_AVAILABLE:
+        print("  ⚠ Warning: numpy not installed, encoding variants at fixed qualities")
+        print("    Install with: pip install numpy")
+        target_ssim = None
+
+    # The pages are rendered from the breakpoints in the image manifest, so
+    # images without an entry there are never reused
+    images = load_image_manifest(output_dir)
+    tasks = []
     for img_file in image_files:
-        dest_path = output_dir / img_file.name
+        # Skip images whose source bytes and settings are unchanged
+        if cache is not None:
+            name = cache.name(output_dir / img_file.name)
+            key = cache.key(
+                img_file,
+                optimized,
+                [MIN_VARIANT_WIDTH, MAX_VARIANT_WIDTH, BREAKPOINT_BYTE_STEP],
+                [PLACEHOLDER_WIDTH, PLACEHOLDER_BLUR, PLACEHOLDER_QUALITY],
+                variant_formats(img_file.suffix),
+                master_format(img_file.suffix) if optimized else None,
+                compression.settings() if compression else None,
+                target_ssim,
+            )
+            raster = PIL_AVAILABLE and img_file.suffix.lower() in RASTER_EXTENSIONS
+            if cache.is_fresh(name, key) and (img_file.name in images or not raster):
+                print(f"  ↺ Reused {img_file.name} (unchanged)")
+                continue
+            tasks.append((img_file, name, key))
+        else:
+            tasks.append((img_file, None, None))
 
-        # Scale images to 1920x1080 (preserving aspect ratio)
-        if PIL_AVAILABLE and img_file.suffix.lower() in {
-            ".png",
-            ".jpg",
-            ".jpeg",
-            ".webp",
-            ".avif",
-        }:
-            try:
-                with Image.open(img_file) as img:
-                    # Target size
-                    target_width = 1920 * 2
-                    target_height = 1080 * 2
-
-                    # Calculate aspect ratios
-                    img_ratio = img.width / img.height
-                    target_ratio = target_width / target_height
-
-                    # Determine scaling to fit within 1920x1080 while preserving aspect ratio
-                    if img_ratio > target_ratio:
-                        # Image is wider - scale by width
-                        new_width = target_width
-                        new_height = int(target_width / img_ratio)
-                    else:
-                        # Image is taller - scale by height
-                        new_height = target_height
-                        new_width = int(target_height * img_ratio)
-
-                    # Only resize if image is larger than target
-                    if img.width > target_width or img.height > target_height:
-                        scaled_img = img.resize(
-                            (new_width, new_height), Image.Resampling.LANCZOS
-                        )
-                        scaled_img.save(dest_path, quality=100, optimize=optimized)
-                        print(
-                            f"  ✓ Scaled {img_file.name} from {img.width}x{img.height} to {new_width}x{new_height}"
-                        )
-                    else:
-                        # Image is already smaller, just copy
-                        shutil.copy2(img_file, dest_path)
-                        print(
-                            f"  ✓ Copied {img_file.name} (already within bounds: {img.width}x{img.height})"
-                        )
-
-                    # For optimized version, create multiple responsive image sizes
-                    if optimized:
-                        # Generate 200w, 400w, 800w, 1600w versions
-                        widths = [200, 400, 800, 1600]
-
-                        for width in widths:
-                            # Calculate height preserving aspect ratio
-                            new_width = width
-                            new_height = int(width / img_ratio)
-
-                            # Resize and save
-                            resized_img = img.resize(
-                                (new_width, new_height), Image.Resampling.LANCZOS
-                            )
-                            resized_path = (
-                                output_dir
-                                / f"{img_file.stem}-{width}w{img_file.suffix}"
-                            )
-                            resized_img.save(resized_path, quality=85, optimize=True)
-                            print(
-                                f"  ✓ Created {img_file.stem}-{width}w{img_file.suffix} ({new_width}x{new_height})"
-                            )
-
-                            # Compress resized image
-                            with open(resized_path, "rb") as f_in:
-                                with gzip.open(
-                                    str(resized_path) + ".gz", "wb", compresslevel=9
-                                ) as f_out:
-                                    shutil.copyfileobj(f_in, f_out)
-                            if BROTLI_AVAILABLE:
-                                with open(resized_path, "rb") as f_in:
-                                    compressed_data = brotli.compress(
-                                        f_in.read(), quality=11
-                                    )
-                                    with open(str(resized_path) + ".br", "wb") as f_out:
-                                        f_out.write(compressed_data)
-
-            except Exception as e:
-                print(f"  ⚠ Error scaling {img_file.name}: {e}, copying original")
-                shutil.copy2(img_file, dest_path)
+    in_worker = uses_pool(jobs, len(tasks))
+    results = run_tasks(
+        [
+            (
+                _process_image,
+                (img_file, output_dir, optimized, max_memory, compression, target_ssim, in_worker),
+            )
+            for img_file, _, _ in tasks
+        ],
+        jobs,
+    )
+    quality = {}
+    for (img_file, name, key), (messages, outputs, compressed, chosen, image) in zip(
+        tasks, results
+    ):
+        quality.update(chosen)
+        if image is not None:
+            images[img_file.name] = image
         else:
-            # SVG or Pillow not available - just copy
-            shutil.copy2(img_file, dest_path)
+            images.pop(img_file.name, None)
+        for message in messages:
+            print(message)
+        if compression is not None:
+            compression.record(compressed)
+        # Images that fell back to a plain copy are retried next time
+        if cache is not None and outputs is not None:
+            cache.record(name, key, outputs)
 
-        # For optimized version, create gzip and brotli compressed versions
-        if optimized:
-            # Create gzip compressed version
-            print(f"    Compressing {img_file.name} with gzip...")
-            with open(dest_path, "rb") as f_in:
-                with gzip.open(str(dest_path) + ".gz", "wb", compresslevel=9) as f_out:
-                    shutil.copyfileobj(f_in, f_out)
-
-            # Create brotli compressed version
-            print(f"    Compressing {img_file.name} with brotli...")
-            with open(dest_path, "rb") as f_in:
-                compressed_data = brotli.compress(f_in.read(), quality=11)
-                with open(str(dest_path) + ".br", "wb") as f_out:
-                    f_out.write(compressed_data)
+    if tasks:
+        path = output_dir / IMAGE_MANIFEST
+        path.write_text(json.dumps(dict(sorted(images.items())), indent=2))
+        breakpoints = [
+            f"{name} {', '.join(str(w) for w, _ in images[name]['variants'])}"
+            for name in sorted(images)
+            if images[name]["variants"]
+        ]
+        if breakpoints:
+            print(f"  ✓ Planned breakpoints: {'; '.join(breakpoints)}")
+    if quality:
+        rebuilt = [img_file for img_file, _, _ in tasks]
+        path = _write_quality_manifest(output_dir, quality, target_ssim, rebuilt)
+        print(f"  ✓ Recorded the quality of {len(quality)} images and variants in {path.name}")
@@ -0,0 +1,386 @@
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+import asyncio
+import json
+import mimetypes
+import time
+
+from fingerprint import HEADERS_MANIFEST, load_headers_manifest
+
+# Formats missing from older mimetypes tables
+mimetypes.add_type("image/avif", ".avif")
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("image/svg+xml", ".svg")
+
+# Precompressed sidecars in order of preference
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+# Cache-Control of the two layouts, matching the http-server flags of serve.sh
+OPTIMIZED_CACHE_CONTROL = "public, max-age=86400"
+UNOPTIMIZED_CACHE_CONTROL = "no-cache, no-store, must-revalidate"
+
+# Seconds an idle keep-alive connection stays open
+KEEP_ALIVE_TIMEOUT = 5
+
+STATUS_REASONS = {
+    200: "OK",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+}
+
+
+def parse_accept_encoding(header):
+    """Content codings accepted by the client, with q=0 codings removed
+
+    A wildcard accepts the precompressed codings not refused by name.
+    """
+    accepted = set()
+    refused = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(coding)
+        else:
+            refused.add(coding)
+    if "*" in accepted:
+        accepted.update(coding for coding, _ in ENCODINGS if coding not in refused)
+    return accepted
+
+
+def is_sidecar(path):
+    """Whether a path names a precompressed sidecar rather than a resource"""
+    return any(str(path).endswith(suffix) for _, suffix in ENCODINGS)
+
+
+class StaticSite:
+    """Files of one generated website and their precompressed sidecars"""
+
+    def __init__(self, root, cache_control, precompressed=True):
+        self.root = Path(root).resolve()
+        self.cache_control = cache_control
+        self.precompressed = precompressed
+        self.headers = {}
+        self.headers_mtime = None
+
+    def cache_control_for(self, url_path):
+        """Cache-Control from the site's headers manifest, if it has one for
+        the path, otherwise the site default
+
+        The manifest is re-read whenever a rebuild replaces it.
+        """
+        manifest = self.root / HEADERS_MANIFEST
+        mtime = manifest.stat().st_mtime_ns if manifest.is_file() else None
+        if mtime != self.headers_mtime:
+            self.headers = load_headers_manifest(self.root)
+            self.headers_mtime = mtime
+        headers = self.headers.get(unquote(url_path)) or {}
+        return headers.get("Cache-Control", self.cache_control)
+
+    def resolve(self, url_path):
+        """File for a request path, or None if it is missing, hidden or a
+        precompressed sidecar"""
+        relative = unquote(url_path).lstrip("/")
+        if relative == "" or relative.endswith("/"):
+            relative += "index.html"
+        if any(part.startswith(".") for part in Path(relative).parts):
+            return None
+        # Sidecars are only served as an encoding of their file
+        if is_sidecar(relative):
+            return None
+
+        path = (self.root / relative).resolve()
+        if not path.is_relative_to(self.root) or not path.is_file():
+            return None
+        return path
+
+    def lookup(self, url_path, accept_encoding=""):
+        """Pick the representation of a resource for the given Accept-Encoding
+
+        Returns a dict describing the file to send, or None.
+        """
+        path = self.resolve(url_path)
+        if path is None:
+            return None
+
+        accepted = set()
+        if self.precompressed:
+            accepted = parse_accept_encoding(accept_encoding)
+        encoding = None
+        file = path
+        for coding, suffix in ENCODINGS:
+            sidecar = Path(str(path) + suffix)
+            if coding in accepted and sidecar.is_file():
+                encoding, file = coding, sidecar
+                break
+
+        stat = file.stat()
+        # Each encoding is a separate representation with its own ETag
+        suffix = f"-{encoding}" if encoding else ""
+        etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}{suffix}"'
+        return {
+            "file": file,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "etag": etag,
+            "encoding": encoding,
+            "content_type": mimetypes.guess_type(path.name)[0]
+            or "application/octet-stream",
+            "cache_control": self.cache_control_for(url_path),
+        }
+
+
+class StaticServer:
+    """Asyncio HTTP/1.1 server for a StaticSite
+
+    Connections are kept alive, precompressed sidecars are chosen from
+    Accept-Encoding, conditional requests are answered with 304 and file
+    bodies are sent with loop.sendfile (os.sendfile where available), or
+    written as is when the site holds them in memory.
+    Every request is timed and optionally appended to a JSON lines log.
+    """
+
+    def __init__(self, site, name, access_log=None, quiet=False):
+        self.site = site
+        self.name = name
+        self.access_log = access_log
+        self.quiet = quiet
+        self.timings = []
+
+    async def start(self, host, port):
+        """Start listening and return the asyncio server"""
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    async def handle_connection(self, reader, writer):
+        """Serve requests on one connection until it is closed"""
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(
+                        reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT
+                    )
+                except (
+                    asyncio.TimeoutError,
+                    asyncio.IncompleteReadError,
+                    asyncio.LimitOverrunError,
+                    ConnectionError,
+                ):
+                    break
+
+                start = time.perf_counter()
+                keep_alive = await self.handle_request(head, writer, start)
+                if not keep_alive:
+                    break
+        except asyncio.CancelledError:
+            # The server is shutting down, drop the connection quietly
+            pass
+        except ConnectionError:
+            # The client went away in the middle of a response
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, asyncio.CancelledError):
+                pass
+
+    def parse_request(self, head):
+        """Split a request head into method, path, version and headers"""
+        lines = head.decode("latin-1").split("\r\n")
+        method, target, version = lines[0].split(" ")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+        return method, urlsplit(target).path, version, headers
+
+    def is_not_modified(self, resource, headers):
+        """Evaluate If-None-Match and If-Modified-Since"""
+        if "if-none-match" in headers:
+            tags = [tag.strip() for tag in headers["if-none-match"].split(",")]
+            return "*" in tags or resource["etag"] in tags
+        if "if-modified-since" in headers:
+            try:
+                since = parsedate_to_datetime(headers["if-modified-since"])
+            except (TypeError, ValueError):
+                return False
+            return int(resource["mtime"]) <= since.timestamp()
+        return False
+
+    async def handle_request(self, head, writer, start):
+        """Answer one request, returning whether to keep the connection"""
+        try:
+            method, path, version, headers = self.parse_request(head)
+        except ValueError:
+            await self.send_response(writer, 400, {"Connection": "close"})
+            self.log("-", "-", 400, None, 0, start)
+            return False
+
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.0":
+            keep_alive = connection == "keep-alive"
+        else:
+            keep_alive = connection != "close"
+        base_headers = {"Connection": "keep-alive" if keep_alive else "close"}
+
+        if method not in ("GET", "HEAD"):
+            # The request body is not read, so the connection cannot be
+            # reused
+            base_headers = {"Connection": "close", "Allow": "GET, HEAD"}
+            await self.send_response(writer, 405, base_headers)
+            self.log(method, path, 405, None, 0, start)
+            return False
+
+        resource = self.site.lookup(path, headers.get("accept-encoding", ""))
+        if resource is None:
+            await self.send_response(writer, 404, base_headers)
+            self.log(method, path, 404, None, 0, start)
+            return keep_alive
+
+        response_headers = dict(base_headers)
+        response_headers.update(
+            {
+                "Content-Type": resource["content_type"],
+                "Cache-Control": resource["cache_control"],
+                "ETag": resource["etag"],
+                "Last-Modified": formatdate(resource["mtime"], usegmt=True),
+                "Vary": "Accept-Encoding",
+                "Access-Control-Allow-Origin": "*",
+            }
+        )
+        if resource["encoding"]:
+            response_headers["Content-Encoding"] = resource["encoding"]
+
+        if self.is_not_modified(resource, headers):
+            await self.send_response(writer, 304, response_headers)
+            self.log(method, path, 304, resource["encoding"], 0, start)
+            return keep_alive
+
+        response_headers["Content-Length"] = str(resource["size"])
+        await self.send_response(writer, 200, response_headers, has_body=True)
+        sent = 0
+        if method == "GET" and resource["size"] and "body" in resource:
+            writer.write(resource["body"])
+            await writer.drain()
+            sent = resource["size"]
+        elif method == "GET" and resource["size"]:
+            with open(resource["file"], "rb") as f:
+                loop = asyncio.get_running_loop()
+                sent = await loop.sendfile(writer.transport, f, 0, resource["size"])
+        self.log(method, path, 200, resource["encoding"], sent, start)
+        return keep_alive
+
+    async def send_response(self, writer, status, headers, has_body=False):
+        """Write the status line and headers of a response"""
+        headers = dict(headers)
+        headers["Date"] = formatdate(usegmt=True)
+        headers["Server"] = "WebPerformanceComparison"
+        if not has_body and status != 304:
+            headers["Content-Length"] = "0"
+        lines = [f"HTTP/1.1 {status} {STATUS_REASONS[status]}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+    def log(self, method, path, status, encoding, size, start):
+        """Record the timing of a request"""
+        duration = (time.perf_counter() - start) * 1000
+        entry = {
+            "time": time.time(),
+            "server": self.name,
+            "method": method,
+            "path": path,
+            "status": status,
+            "encoding": encoding,
+            "bytes": size,
+            "duration_ms": round(duration, 3),
+        }
+        self.timings.append(entry)
+        if self.access_log is not None:
+            self.access_log.write(json.dumps(entry) + "\n")
+        if not self.quiet:
+            print(
+                f"  [{self.name}] {method} {path} {status} "
+                f"{encoding or 'identity'} {size}B {duration:.2f}ms"
+            )
+
+
+async def serve_sites(
+    sites, host="127.0.0.1", access_log=None, quiet=False, server_class=StaticServer
+):
+    """Run one server_class server per (name, site, port) until cancelled"""
+    servers = []
+    for name, site, port in sites:
+        server = server_class(site, name, access_log=access_log, quiet=quiet)
+        servers.append(await server.start(host, port))
+        print(f"{name.upper()} version:".ljust(21) + f"http://{host}:{port}")
+    print("=" * 50)
+
+    print("\nPress Ctrl+C to stop both servers\n")
+    try:
+        await asyncio.gather(*(server.serve_forever() for server in servers))
+    finally:
+        for server in servers:
+            server.close()
+
+
+def serve(
+    output_dir,
+    host="127.0.0.1",
+    port=8080,
+    unoptimized_port=8081,
+    access_log=None,
+    quiet=False,
+):
+    """Serve the optimized and unoptimized builds on two ports
+
+    Mirrors serve.sh: the optimized build is served with its
+    precompressed sidecars and a one day cache lifetime, the unoptimized
+    build uncompressed and uncached. Files listed in a site's headers
+    manifest get the Cache-Control given there instead.
+    """
+    output_dir = Path(output_dir)
+    sites = [
+        (
+            "optimized",
+            StaticSite(output_dir / "optimized", OPTIMIZED_CACHE_CONTROL),
+            port,
+        ),
+        (
+            "unoptimized",
+            StaticSite(
+                output_dir / "unoptimized",
+                UNOPTIMIZED_CACHE_CONTROL,
+                precompressed=False,
+            ),
+            unoptimized_port,
+        ),
+    ]
+    for _, site, _ in sites:
+        if not site.root.is_dir():
+            print(f"  ⚠ Warning: {site.root} does not exist, run the generator first")
+
+    print("Starting HTTP servers for performance comparison...")
+    print("\n" + "=" * 50)
+    log_file = open(access_log, "a") if access_log else None
+    try:
+        asyncio.run(serve_sites(sites, host, log_file, quiet))
+    except KeyboardInterrupt:
+        print("\nStopping servers...")
+    finally:
+        if log_file is not None:
+            log_file.close()
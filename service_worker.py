@@ -0,0 +1,169 @@
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+import hashlib
+import json
+import math
+
+from analyzer import DEFAULT_IMAGE_WIDTH, PageParser
+from fingerprint import HASH_LENGTH
+
+SERVICE_WORKER = "sw.js"
+
+# Precache manifest written next to the pages, for inspection and tooling
+PRECACHE_MANIFEST = ".precache.json"
+
+# Bytes of responsive image variants precached on top of pages, styles,
+# scripts and the favicon
+PRECACHE_IMAGE_BUDGET = 512 * 1024
+
+# Resource types of the analyzer that are always precached
+PRECACHED_TYPES = {"stylesheet", "script", "favicon", "prefetch", "preload:style", "preload:script"}
+
+SERVICE_WORKER_TEMPLATE = """// Generated service worker, precaches the site for repeat visits
+const VERSION = '__VERSION__';
+const PRECACHE = __PRECACHE__;
+const CACHE = 'precache-' + VERSION;
+const URLS = new Set(PRECACHE.map(entry => new URL(entry.url, self.location).href));
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(CACHE)
+            .then(cache => cache.addAll(PRECACHE.map(entry => entry.url)))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys()
+            .then(keys => Promise.all(
+                keys.filter(key => key.startsWith('precache-') && key !== CACHE)
+                    .map(key => caches.delete(key))
+            ))
+            .then(() => self.clients.claim())
+    );
+});
+
+// Pages: answer from the cache and refresh it in the background
+function staleWhileRevalidate(request, url) {
+    return caches.open(CACHE).then(cache => cache.match(url).then(cached => {
+        const network = fetch(request).then(response => {
+            if (response.ok) {
+                cache.put(url, response.clone());
+            }
+            return response;
+        });
+        if (cached) {
+            network.catch(() => {});
+            return cached;
+        }
+        return network;
+    }));
+}
+
+// Assets: their URL (or the cache version) changes with their content
+function cacheFirst(request) {
+    return caches.open(CACHE).then(cache => cache.match(request).then(cached =>
+        cached || fetch(request).then(response => {
+            if (response.ok) {
+                cache.put(request, response.clone());
+            }
+            return response;
+        })
+    ));
+}
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    const url = new URL(request.url);
+    if (request.method !== 'GET' || url.origin !== self.location.origin) {
+        return;
+    }
+    url.search = '';
+    url.hash = '';
+    if (url.pathname.endsWith('/')) {
+        url.pathname += 'index.html';
+    }
+    if (request.mode === 'navigate' || url.pathname.endsWith('.html')) {
+        event.respondWith(staleWhileRevalidate(request, url.href));
+    } else if (URLS.has(url.href)) {
+        event.respondWith(cacheFirst(url.href));
+    }
+});
+"""
+
+
+def _revision(path):
+    return hashlib.sha256(path.read_bytes()).hexdigest()[:HASH_LENGTH]
+
+
+def _image_order(width, image_width):
+    """Sort key putting the variants closest to the layout width first"""
+    return abs(math.log(max(width, 1) / image_width))
+
+
+def precache_entries(
+    site_dir, pages, budget=PRECACHE_IMAGE_BUDGET, image_width=DEFAULT_IMAGE_WIDTH
+):
+    """The files a service worker should precache, as url, revision and
+    size dicts
+
+    Pages and every stylesheet, script, favicon and prefetch they refer to
+    are always included. Of the srcset candidates a browser may pick for
+    the images (the first supported <picture> source), the ones closest
+    to image_width are added while they fit within budget bytes.
+    """
+    site_dir = Path(site_dir)
+    urls = list(pages)
+    candidates = {}
+    for page in pages:
+        parser = PageParser(image_width)
+        parser.feed((site_dir / page).read_text(encoding="utf-8"))
+        for resource in parser.resources:
+            url = urlsplit(urljoin(page, resource["url"])).path
+            if resource["type"] in PRECACHED_TYPES:
+                urls.append(url)
+            elif resource["type"] == "image":
+                for candidate, width in zip(resource["srcset"], resource["srcset_widths"]):
+                    candidates[urlsplit(urljoin(page, candidate)).path] = width
+                if not resource["srcset"]:
+                    candidates[url] = image_width
+
+    entries = {}
+    for url in urls:
+        path = site_dir / url
+        if url not in entries and path.is_file():
+            entries[url] = {"url": url, "revision": _revision(path), "size": path.stat().st_size}
+
+    used = 0
+    for url in sorted(candidates, key=lambda url: (_image_order(candidates[url], image_width), url)):
+        path = site_dir / url
+        if url in entries or not path.is_file():
+            continue
+        size = path.stat().st_size
+        if used + size > budget:
+            continue
+        used += size
+        entries[url] = {"url": url, "revision": _revision(path), "size": size}
+    return list(entries.values())
+
+
+def service_worker_js(entries):
+    """sw.js precaching the given entries
+
+    The cache is named after a hash of the entries, so the worker and its
+    cache are replaced whenever any precached file changes.
+    """
+    manifest = json.dumps([{"url": e["url"], "revision": e["revision"]} for e in entries])
+    version = hashlib.sha256(manifest.encode()).hexdigest()[:HASH_LENGTH]
+    return (
+        SERVICE_WORKER_TEMPLATE.replace("__VERSION__", version)
+        .replace("__PRECACHE__", json.dumps(json.loads(manifest), indent=4))
+    )
+
+
+def write_precache_manifest(site_dir, entries):
+    """Store the precached files with their revisions and sizes"""
+    path = Path(site_dir) / PRECACHE_MANIFEST
+    path.write_text(json.dumps(entries, indent=2))
+    return path
@@ -0,0 +1,123 @@
+import random
+
+from webpage import get_picture_html
+
+# Range of synthetic site sizes, in pages
+MIN_PAGES = 10
+MAX_PAGES = 100_000
+
+DEFAULT_PAGES = 100
+DEFAULT_IMAGES_PER_PAGE = 4
+DEFAULT_DOM_DEPTH = 6
+DEFAULT_CSS_RULES = 500
+DEFAULT_LINKS_PER_PAGE = 5
+
+# Content blocks per page, each nested dom_depth levels deep
+BLOCKS_PER_PAGE = 8
+
+# Source images the synthetic pages cycle through
+SYNTHETIC_IMAGES = ["image1.PNG", "image2.WebP", "image3.AVIF", "image4.JPEG"]
+
+WORDS = (
+    "performance render critical request bytes cache layout paint script style "
+    "image network latency browser server compress defer preload budget metric"
+).split()
+
+COLORS = ["#667eea", "#764ba2", "#2d3748", "#4a5568", "#718096", "#e2e8f0"]
+
+
+def page_name(index):
+    """File name of the synthetic page with the given index"""
+    return "index.html" if index == 0 else f"page{index}.html"
+
+
+def synthetic_css(rule_count):
+    """rule_count generated rules, .c0 to .c<rule_count - 1>
+
+    Pages only use the first half of them, so removing unused CSS has a
+    known amount of work to do.
+    """
+    for i in range(rule_count):
+        color = COLORS[i % len(COLORS)]
+        yield f"""
+.c{i} {{
+    margin: {i % 4}px 0;
+    padding: {i % 3}px;
+    color: {color};
+}}
+"""
+
+
+def _text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def page_body(index, params, optimized, images, image_attrs):
+    """Chunks of the <main> content of one synthetic page
+
+    image_attrs are the attributes of the lazy-loaded images and of the
+    first (LCP) image and whether lazy-loaded images get placeholders.
+    The page is generated from a random generator seeded with the page
+    index, so every page can be rendered on its own and in any order.
+    """
+    img_attrs, lcp_attrs, placeholders = image_attrs
+    rng = random.Random(params["seed"] * 1_000_003 + index)
+    used_classes = max(1, params["css_rules"] // 2)
+    image_count = params["images_per_page"]
+    depth = params["dom_depth"]
+
+    yield f"""
+        <section class="content">
+            <div class="container">
+                <h2>Synthetic page {index}</h2>"""
+
+    for block in range(BLOCKS_PER_PAGE):
+        for level in range(depth):
+            yield f'\n{"    " * (level + 4)}<div class="c{rng.randrange(used_classes)}">'
+        indent = "    " * (depth + 4)
+        yield f'\n{indent}<p class="c{rng.randrange(used_classes)}">{_text(rng, 24)}</p>'
+
+        # Spread the images over the blocks; the first one is eager
+        for image in range(block, image_count, BLOCKS_PER_PAGE):
+            img_name = SYNTHETIC_IMAGES[(index + image) % len(SYNTHETIC_IMAGES)]
+            if image == 0:
+                picture = get_picture_html(
+                    optimized, img_name, "Image 1", lcp_attrs, images.get(img_name)
+                )
+            else:
+                picture = get_picture_html(
+                    optimized,
+                    img_name,
+                    f"Image {image + 1}",
+                    img_attrs,
+                    images.get(img_name),
+                    placeholders,
+                )
+            yield f"""
+{indent}<div class="image-item">
+{indent}    {picture}
+{indent}</div>"""
+
+        for level in reversed(range(depth)):
+            yield f'\n{"    " * (level + 4)}</div>'
+
+    links = related_pages(index, params["links_per_page"], params["pages"], rng)
+    yield """
+                <ul class="nav-links">"""
+    for link in links:
+        yield f'\n                    <li><a href="{page_name(link)}">Page {link}</a></li>'
+    yield """
+                </ul>
+            </div>
+        </section>
+    """
+
+
+def related_pages(index, count, pages, rng):
+    """Indexes of the pages a page links to: the next page, then random ones"""
+    links = [(index + 1) % pages]
+    while len(links) < min(count, pages - 1):
+        link = rng.randrange(pages)
+        if link != index and link not in links:
+            links.append(link)
+    return links[:count]
@@ -0,0 +1,27 @@
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# The modules under test live at the root of the repository
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+NODE = shutil.which("node")
+
+
+@pytest.fixture
+def node():
+    """Function running a script under node and returning what it prints,
+    or the name of the error it throws; skips the test without node"""
+    if NODE is None:
+        pytest.skip("node is not installed")
+
+    def run(js):
+        result = subprocess.run([NODE, "-e", js], capture_output=True, text=True, timeout=30)
+        if result.returncode:
+            return "error: " + result.stderr.strip().splitlines()[-1]
+        return result.stdout
+
+    return run
@@ -0,0 +1,36 @@
+from analyzer import analyze_page, site_path
+
+
+def test_site_paths_stay_inside_the_site(tmp_path):
+    assert site_path(tmp_path, "index.html", "/images/a%20b.png") == "images/a b.png"
+    assert site_path(tmp_path, "docs/page.html", "a.png") == "docs/a.png"
+    assert site_path(tmp_path, "index.html", "/%2e%2e/outside.png") is None
+
+
+def test_root_relative_images_are_checked(tmp_path):
+    (tmp_path / "images").mkdir()
+    (tmp_path / "images" / "hero.png").write_bytes(b"png")
+    (tmp_path / "index.html").write_text(
+        '<img src="/images/hero.png" width="800" height="400" loading="lazy">'
+    )
+    report = analyze_page(tmp_path, "index.html")
+    assert report["missing"] == []
+    assert report["lcp_image"] == "/images/hero.png"
+    assert report["image_issues"] == ["LCP image /images/hero.png is lazy-loaded"]
+
+
+def test_lcp_is_not_taken_from_the_generator_choice(tmp_path):
+    for name in ("first.png", "second.png"):
+        (tmp_path / name).write_bytes(b"png")
+    # The larger second image got the priority, but the first one is
+    # what the analyzer expects to paint first
+    (tmp_path / "index.html").write_text(
+        '<img src="first.png" width="600" height="300" loading="lazy">'
+        '<img src="second.png" width="800" height="400" fetchpriority="high">'
+    )
+    report = analyze_page(tmp_path, "index.html")
+    assert report["lcp_image"] == "first.png"
+    assert report["image_issues"] == [
+        "LCP image first.png is lazy-loaded",
+        "second.png has fetchpriority=high but is not the LCP image",
+    ]
@@ -0,0 +1,26 @@
+from critical_css import critical_css, lcp_image
+
+PARAGRAPHS = "".join(f"<p>paragraph {i}</p>" for i in range(200))
+PAGE = f'<header class="top"><h1>Title</h1></header>{PARAGRAPHS}<footer class="bottom">f</footer>'
+CSS = ".top{color:red}.bottom{color:blue}p{margin:0}"
+
+
+def test_rules_below_the_fold_are_left_out():
+    assert critical_css(PAGE, CSS) == ".top{color:red}p{margin:0}"
+
+
+def test_a_taller_viewport_takes_more_rules():
+    assert critical_css(PAGE, CSS, viewport_height=100000) == CSS
+
+
+def test_lcp_image_is_the_largest_above_the_fold():
+    html = (
+        '<img src="small.png" width="100" height="100">'
+        '<img src="large.png" width="800" height="400">'
+        f'{PARAGRAPHS}<img src="below.png" width="1200" height="900">'
+    )
+    assert lcp_image(html, "") == "large.png"
+
+
+def test_no_lcp_image_below_the_fold():
+    assert lcp_image(f'{PARAGRAPHS}<img src="below.png" width="100" height="100">', "") is None
@@ -0,0 +1,101 @@
+import re
+
+import pytest
+
+from css_optimizer import minify_value, optimize_css, parse_css
+
+
+def applied(css, classes, properties):
+    """The last declaration of one of properties in the rules matching an
+    element with the given classes, all selectors being single classes,
+    possibly in :is()"""
+    found = None
+    for rule in parse_css(css):
+        names = {re.sub(r"^:is\((.*)\)$", r"\1", s).lstrip(".") for s in rule.selectors}
+        if names & classes:
+            for declaration in rule.declarations:
+                if declaration[0] in properties:
+                    found = declaration
+    return found
+
+
+def test_zero_lengths_lose_their_unit():
+    assert minify_value("margin", "0px 0em") == "0"
+    assert minify_value("width", "calc(100% - 0px)") == "calc(100% - 0px)"
+
+
+def test_flex_basis_keeps_its_unit():
+    assert optimize_css(".a{flex:0px}") == ".a{flex:0px}"
+    assert optimize_css(".a{flex:1 0px}") == ".a{flex:1 0px}"
+    assert optimize_css(".a{-webkit-flex:1 1 0px}") == ".a{-webkit-flex:1 1 0px}"
+
+
+@pytest.mark.parametrize(
+    "shorthand, longhand",
+    [
+        ("font:12px serif", "line-height:2"),
+        ("gap:1px", "row-gap:2px"),
+        ("gap:1px", "column-gap:2px"),
+        ("inset:1px", "top:2px"),
+        ("inset:1px", "left:2px"),
+        ("place-items:center", "align-items:end"),
+        ("place-content:center", "justify-content:end"),
+        ("place-self:center", "align-self:end"),
+        ("columns:2", "column-count:3"),
+        ("columns:2", "column-width:3em"),
+        ("margin-left:1px", "margin-inline-start:2px"),
+        ("border-top:1px solid", "border-color:red"),
+    ],
+)
+def test_shorthand_and_longhand_keep_their_order(shorthand, longhand):
+    css = f".x{{{longhand};color:red}}.y{{{shorthand}}}.z{{{longhand};color:red}}"
+    properties = {shorthand.split(":")[0], longhand.split(":")[0]}
+    assert applied(optimize_css(css), {"y", "z"}, properties) == applied(
+        css, {"y", "z"}, properties
+    )
+
+
+def test_values_are_shortened():
+    assert optimize_css(".a{color:#ffffff;margin:0px 0px 0px 0px}") == ".a{color:#fff;margin:0}"
+    assert optimize_css(".a{font-weight:bold;color:red!important}") == (
+        ".a{font-weight:700;color:red!important}"
+    )
+
+
+def test_longhands_are_merged_into_their_shorthand():
+    css = ".a{margin-top:1px;margin-right:2px;margin-bottom:1px;margin-left:2px}"
+    assert optimize_css(css) == ".a{margin:1px 2px}"
+
+
+def test_comments_are_removed_outside_strings():
+    assert optimize_css('/* c */ .a{content:"/* x */"}') == '.a{content:"/* x */"}'
+
+
+def test_rules_with_equal_declarations_are_merged():
+    assert optimize_css(".a{color:red}.b{color:red}") == ".a,.b{color:red}"
+
+
+def test_equal_media_queries_are_merged():
+    css = "@media (max-width:600px){.a{color:red}}@media (max-width: 600px){.b{color:blue}}"
+    assert optimize_css(css) == "@media (max-width:600px){.a{color:red}.b{color:blue}}"
+
+
+@pytest.mark.parametrize(
+    "css",
+    [
+        # .a and .b both apply to <p class="a b">, blue wins
+        ".a{color:red}.b{color:blue}.a{color:red}",
+        ".a{color:red}.b{color:blue}.a{background:red}",
+        ".a{color:red}:is(.b){color:blue}.c{color:red}",
+    ],
+)
+def test_cascade_order_is_kept(css):
+    optimized = optimize_css(css)
+    for classes in ({"a", "b"}, {"b", "c"}):
+        assert applied(optimized, classes, {"color"}) == applied(css, classes, {"color"})
+
+
+def test_rules_move_past_other_specificities():
+    # #b wins over .a and .c whatever the order
+    css = ".a{color:red}#b{color:blue}.c{color:red}"
+    assert optimize_css(css) == ".a,.c{color:red}#b{color:blue}"
@@ -0,0 +1,49 @@
+from css_purge import collect_usage, merge_usage, purge_css, script_classes
+
+PAGE = '<body><div id="main" class="card wide"><a href="/" data-x>x</a></div></body>'
+
+
+def test_unused_selectors_are_removed():
+    css, removed = purge_css(".card{color:red}.gone{color:blue}", collect_usage(PAGE))
+    assert css == ".card{color:red}"
+    assert removed == [".gone"]
+
+
+def test_selector_lists_keep_their_used_selectors():
+    css, removed = purge_css(".gone,.wide{color:red}", collect_usage(PAGE))
+    assert css == ".wide{color:red}"
+    assert removed == [".gone"]
+
+
+def test_tags_ids_and_attributes_are_matched():
+    usage = collect_usage(PAGE)
+    css, _ = purge_css(
+        "html{margin:0}#main a{color:red}#other{color:blue}[data-x]{color:green}"
+        "table{color:red}a:hover{color:blue}",
+        usage,
+    )
+    assert css == "html{margin:0}#main a{color:red}[data-x]{color:green}a:hover{color:blue}"
+
+
+def test_functional_pseudo_classes_are_kept():
+    css, _ = purge_css(":not(.gone){color:red}", collect_usage(PAGE))
+    assert css == ":not(.gone){color:red}"
+
+
+def test_empty_media_queries_and_unused_keyframes_are_removed():
+    css, removed = purge_css(
+        "@media print{.gone{color:red}}"
+        "@keyframes spin{to{color:red}}@keyframes fade{to{opacity:0}}"
+        ".card{animation:fade 1s}",
+        collect_usage(PAGE),
+    )
+    assert css == "@keyframes fade{to{opacity:0}}.card{animation:fade 1s}"
+    assert removed == [".gone", "@keyframes spin"]
+
+
+def test_script_and_safelisted_classes_are_kept():
+    js = "el.classList.add('open', \"shown\"); el.className += ' dark';"
+    assert script_classes(js) == {"open", "shown", "dark"}
+    usage = merge_usage(collect_usage(PAGE), safelist=[".open", "extra"])
+    css, _ = purge_css(".open{color:red}.extra{color:blue}", usage)
+    assert css == ".open{color:red}.extra{color:blue}"
@@ -0,0 +1,63 @@
+from fingerprint import (
+    IMMUTABLE_CACHE_CONTROL,
+    fingerprinted_name,
+    link_fingerprinted,
+    load_headers_manifest,
+    remove_stale,
+    rewrite_css_references,
+    rewrite_html_references,
+    write_headers_manifest,
+)
+
+MAPPING = {"a.png": "a.0123456789.png", "b.avif": "b.abcdef0123.avif"}
+
+
+def test_name_depends_on_the_content():
+    assert fingerprinted_name("a.png", b"x") != fingerprinted_name("a.png", b"y")
+    assert fingerprinted_name("a.png", b"x").startswith("a.")
+    assert fingerprinted_name("a.png", b"x").endswith(".png")
+
+
+def test_css_references_are_rewritten():
+    css = ".a{background:url(a.png)}.b{background:url( 'b.avif' )}.c{background:url(c.png)}"
+    assert rewrite_css_references(css, MAPPING) == (
+        ".a{background:url(a.0123456789.png)}"
+        ".b{background:url( 'b.abcdef0123.avif' )}"
+        ".c{background:url(c.png)}"
+    )
+
+
+def test_html_references_are_rewritten():
+    html = (
+        '<img src="a.png" srcset="a.png 300w, b.avif 600w">'
+        "<a href='c.png'>c</a><div style=\"background:url('a.png')\"></div>"
+    )
+    assert rewrite_html_references(html, MAPPING) == (
+        '<img src="a.0123456789.png" srcset="a.0123456789.png 300w, b.abcdef0123.avif 600w">'
+        "<a href='c.png'>c</a><div style=\"background:url('a.0123456789.png')\"></div>"
+    )
+
+
+def test_assets_are_linked_and_stale_ones_removed(tmp_path):
+    (tmp_path / "a.png").write_bytes(b"image")
+    (tmp_path / "a.png.br").write_bytes(b"compressed")
+    (tmp_path / "index.html").write_text("<p>page")
+    mapping = link_fingerprinted(tmp_path)
+    hashed = mapping["a.png"]
+    assert list(mapping) == ["a.png"]
+    assert (tmp_path / hashed).read_bytes() == b"image"
+    assert (tmp_path / (hashed + ".br")).read_bytes() == b"compressed"
+
+    stale = fingerprinted_name("a.png", b"old")
+    (tmp_path / stale).write_bytes(b"old")
+    (tmp_path / (stale + ".br")).write_bytes(b"old")
+    assert remove_stale(tmp_path, mapping.values()) == 2
+    assert (tmp_path / hashed).is_file()
+
+
+def test_headers_manifest_round_trip(tmp_path):
+    write_headers_manifest(tmp_path, ["a.0123456789.png"], ["index.html"])
+    headers = load_headers_manifest(tmp_path)
+    assert headers["/a.0123456789.png"]["Cache-Control"] == IMMUTABLE_CACHE_CONTROL
+    assert headers["/index.html"]["Cache-Control"] == "no-cache"
+    assert load_headers_manifest(tmp_path / "missing") == {}
@@ -0,0 +1,59 @@
+from html_minifier import minify_html
+
+
+def test_page_is_minified():
+    html = """<!DOCTYPE html>
+<html>
+<head>
+<title>x</title>
+</head>
+<body>
+<p>a  <b>b</b>  c</p>
+<!-- comment -->
+</body>
+</html>"""
+    assert minify_html(html) == "<!DOCTYPE html><title>x</title><p>a <b>b</b> c"
+
+
+def test_whitespace_between_inline_elements_is_kept():
+    assert minify_html("<p><b>a</b> <i>b</i></p>") == "<p><b>a</b> <i>b</i>"
+
+
+def test_whitespace_between_blocks_is_dropped():
+    assert minify_html("<div>\n  <p>x</p>\n</div>") == "<div><p>x</div>"
+
+
+def test_preformatted_content_is_kept():
+    assert minify_html("<pre>  x\n  y</pre>") == "<pre>  x\n  y</pre>"
+    assert minify_html("<textarea>  a  </textarea>") == "<textarea>  a  </textarea>"
+
+
+def test_optional_end_tags_are_omitted():
+    assert minify_html("<ul><li>a</li><li>b</li></ul>") == "<ul><li>a<li>b</ul>"
+    # A <p> inside an <a> must be closed
+    assert minify_html('<a href="x">a</a><p>b</p>') == "<a href=x>a</a><p>b"
+
+
+def test_attributes_are_shortened():
+    assert minify_html('<input disabled="disabled" type="text" value="a b">') == (
+        '<input disabled value="a b">'
+    )
+    assert minify_html('<script type="text/javascript">var a = 1;</script>') == (
+        "<script>var a = 1;</script>"
+    )
+    assert minify_html('<a href="a b" title="">x</a>') == '<a href="a b" title="">x</a>'
+
+
+def test_conditional_comments_are_kept():
+    html = "<!--[if IE]><p>x</p><![endif]-->"
+    assert minify_html(html) == html
+
+
+def test_inline_code_goes_to_the_callbacks():
+    html = (
+        "<style>a { color : red }</style><script>var a;</script>"
+        '<script type="text/plain">x</script>'
+    )
+    assert minify_html(html, minify_css=lambda css: "CSS", minify_js=lambda js: "JS") == (
+        "<style>CSS</style><script>JS</script><script type=text/plain>x</script>"
+    )
@@ -0,0 +1,113 @@
+import pytest
+
+from js_minifier import minify_js
+
+
+@pytest.fixture
+def check(node):
+    """Function asserting that minifying a script does not change what it
+    prints, returning the minified script"""
+
+    def check(js):
+        minified = minify_js(js)
+        assert node(minified) == node(js), minified
+        return minified
+
+    return check
+
+
+def test_block_let_shadowing_outer_variable(check):
+    check(
+        """(function () {
+            var x = 1;
+            function inner(c) {
+                if (c) {
+                    let x = 2;
+                }
+                return x;
+            }
+            globalThis.r = inner(true);
+            console.log(globalThis.r);
+        })();"""
+    )
+
+
+def test_for_let_shadowing_outer_variable(check):
+    check(
+        """(function () {
+            var total = 100;
+            const f = () => {
+                for (let total = 0; total < 3; total++) {}
+                return total;
+            };
+            console.log(f());
+        })();"""
+    )
+
+
+def test_catch_parameter_shadowing_outer_variable(check):
+    check(
+        """(function () {
+            var e = "outer";
+            try {
+                throw "inner";
+            } catch (e) {
+                console.log(e);
+            }
+            console.log(e);
+        })();"""
+    )
+
+
+def test_const_in_sibling_blocks(check):
+    check(
+        """(function () {
+            const value = "function";
+            {
+                const value = "first";
+                console.log(value);
+            }
+            {
+                const other = value + "!";
+                console.log(other);
+            }
+            console.log(value);
+        })();"""
+    )
+
+
+def test_async_function_declaration_is_renamed_with_its_calls(check):
+    minified = check(
+        """(function () {
+            async function load(n) {
+                return n * 2;
+            }
+            load(4).then((n) => console.log(n));
+        })();"""
+    )
+    assert "load" not in minified
+
+
+def test_async_function_expression_keeps_own_name_local(check):
+    check(
+        """(function () {
+            var load = 1;
+            var f = async function load() {
+                return typeof load;
+            };
+            f().then((t) => console.log(t, load));
+        })();"""
+    )
+
+
+def test_function_locals_are_shortened(check):
+    minified = check(
+        """(function () {
+            var longVariableName = 40;
+            function addTwo(value) {
+                return value + 2;
+            }
+            console.log(addTwo(longVariableName));
+        })();"""
+    )
+    assert "longVariableName" not in minified
@@ -0,0 +1,60 @@
+import pytest
+
+from js_tree_shaker import shake_js
+
+
+@pytest.fixture
+def check(node):
+    """Function asserting that shaking a script does not change what it
+    prints, returning the shaken script and the removed declarations"""
+
+    def check(js):
+        shaken, removed = shake_js(js)
+        assert node(shaken) == node(js), shaken
+        return shaken, removed
+
+    return check
+
+
+def test_getter_read_is_kept(check):
+    _, removed = check(
+        """(function () {
+            var o = { get x() { console.log("getter"); return 1; } };
+            var y = o.x;
+        })();"""
+    )
+    assert "y" not in removed
+
+
+def test_computed_read_is_kept(check):
+    _, removed = check(
+        """(function () {
+            var o = { get x() { console.log("getter"); return 1; } }, k = "x";
+            var y = o[k];
+        })();"""
+    )
+    assert "y" not in removed
+
+
+def test_literal_read_is_removed(check):
+    _, removed = check(
+        """(function () {
+            var size = ({ small: 1, large: 2 }).large;
+            var first = [1, 2][0];
+            console.log("done");
+        })();"""
+    )
+    assert set(removed) == {"size", "first"}
+
+
+def test_top_level_globals_are_kept(check):
+    shaken, removed = shake_js(
+        """function helper() { return 1; }
+var config = { debug: false };
+(function () {
+    function unused() {}
+    console.log("ready");
+})();"""
+    )
+    assert set(removed) == {"unused"}
+    assert "helper" in shaken and "config" in shaken
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from server import StaticServer, StaticSite, parse_accept_encoding
+
+
+@pytest.mark.parametrize(
+    "header, accepted",
+    [
+        ("gzip, deflate, br", {"gzip", "deflate", "br"}),
+        ("br;q=0, gzip", {"gzip"}),
+        ("gzip;q=0.5, br;Q=0", {"gzip"}),
+        ("gzip;q=0.000", set()),
+        ("*", {"*", "br", "gzip"}),
+        ("br;q=0, *", {"*", "gzip"}),
+        ("*;q=0", set()),
+        ("gzip;q=x", set()),
+        ("", set()),
+    ],
+)
+def test_accept_encoding(header, accepted):
+    assert parse_accept_encoding(header) == accepted
+
+
+@pytest.fixture
+def site(tmp_path):
+    (tmp_path / "index.html").write_bytes(b"<p>page")
+    (tmp_path / "index.html.gz").write_bytes(b"gzip")
+    (tmp_path / "index.html.br").write_bytes(b"brotli")
+    (tmp_path / ".headers.json").write_text("{}")
+    return StaticSite(tmp_path, "no-cache")
+
+
+def test_best_accepted_sidecar_is_served(site):
+    assert site.lookup("/", "gzip, br")["encoding"] == "br"
+    assert site.lookup("/index.html", "gzip")["encoding"] == "gzip"
+    assert site.lookup("/index.html", "br;q=0, gzip;q=0")["encoding"] is None
+
+
+def test_each_encoding_has_its_own_etag(site):
+    etags = {site.lookup("/", coding)["etag"] for coding in ("", "gzip", "br")}
+    assert len(etags) == 3
+
+
+def test_hidden_files_sidecars_and_outside_paths_are_not_found(site):
+    for path in ("/.headers.json", "/index.html.gz", "/index.html.br", "/../index.html", "/x"):
+        assert site.lookup(path) is None
+
+
+def exchange(site, *requests):
+    """Responses of a server for site to requests sent on one connection,
+    as (status line, headers, body); the server may close it earlier"""
+
+    async def run():
+        server = await StaticServer(site, "test", quiet=True).start("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"".join(requests))
+        await writer.drain()
+        responses = []
+        try:
+            while True:
+                head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 5)
+                lines = head.decode("latin-1").split("\r\n")[:-2]
+                headers = dict(line.split(": ", 1) for line in lines[1:])
+                body = await reader.readexactly(int(headers.get("Content-Length", 0)))
+                responses.append((lines[0], headers, body))
+        except asyncio.IncompleteReadError:
+            pass
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return responses
+
+    return asyncio.run(run())
+
+
+def test_conditional_request_is_not_modified(site):
+    [(status, headers, body)] = exchange(
+        site, b"GET / HTTP/1.1\r\nAccept-Encoding: br\r\nConnection: close\r\n\r\n"
+    )
+    assert status == "HTTP/1.1 200 OK"
+    assert headers["Content-Encoding"] == "br"
+    assert headers["Vary"] == "Accept-Encoding"
+    assert body == b"brotli"
+
+    etag = headers["ETag"].encode()
+    [(status, _, body)] = exchange(
+        site,
+        b"GET / HTTP/1.1\r\nAccept-Encoding: br\r\nIf-None-Match: "
+        + etag
+        + b"\r\nConnection: close\r\n\r\n",
+    )
+    assert (status, body) == ("HTTP/1.1 304 Not Modified", b"")
+
+    # The gzip representation does not match the brotli ETag
+    [(status, _, body)] = exchange(
+        site,
+        b"GET / HTTP/1.1\r\nAccept-Encoding: gzip\r\nIf-None-Match: "
+        + etag
+        + b"\r\nConnection: close\r\n\r\n",
+    )
+    assert (status, body) == ("HTTP/1.1 200 OK", b"gzip")
+
+
+def test_keep_alive_serves_several_requests(site):
+    responses = exchange(
+        site,
+        b"GET / HTTP/1.1\r\n\r\n",
+        b"GET /index.html HTTP/1.1\r\nConnection: close\r\n\r\n",
+    )
+    assert [response[0] for response in responses] == ["HTTP/1.1 200 OK"] * 2
+
+
+def test_other_methods_close_the_connection(site):
+    body = b"GET / HTTP/1.1\r\n\r\n"
+    responses = exchange(
+        site,
+        b"POST / HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % len(body) + body,
+    )
+    [(status, headers, _)] = responses
+    assert status == "HTTP/1.1 405 Method Not Allowed"
+    assert headers["Connection"] == "close"
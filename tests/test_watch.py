@@ -0,0 +1,40 @@
+import asyncio
+import gzip
+import os
+
+from watch import RELOAD_SCRIPT, MemorySite
+
+
+def refresh(site):
+    return asyncio.run(site.refresh())
+
+
+def test_pages_get_the_reload_script(tmp_path):
+    (tmp_path / "index.html").write_bytes(b"<p>page</body>")
+    (tmp_path / "index.html.gz").write_bytes(gzip.compress(b"<p>page</body>"))
+    site = MemorySite(tmp_path, "no-cache")
+    assert refresh(site) == ["index.html", "index.html.gz"]
+
+    page = site.lookup("/")
+    assert page["body"] == b"<p>page" + RELOAD_SCRIPT + b"</body>"
+    assert gzip.decompress(site.lookup("/", "gzip")["body"]) == page["body"]
+    assert site.lookup("/index.html.gz") is None
+
+
+def test_only_changed_files_are_reported(tmp_path):
+    (tmp_path / "a.css").write_text("a{}")
+    (tmp_path / "b.css").write_text("b{}")
+    site = MemorySite(tmp_path, "no-cache")
+    refresh(site)
+
+    # Rewritten with the same content
+    (tmp_path / "a.css").write_text("a{}")
+    os.utime(tmp_path / "a.css", ns=(0, 0))
+    (tmp_path / "b.css").write_text("b{color:red}")
+    (tmp_path / "c.css").write_text("c{}")
+    assert refresh(site) == ["b.css", "c.css"]
+    assert site.lookup("/b.css")["body"] == b"b{color:red}"
+
+    (tmp_path / "c.css").unlink()
+    assert refresh(site) == ["c.css"]
+    assert site.lookup("/c.css") is None
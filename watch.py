@@ -0,0 +1,361 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from urllib.parse import unquote
+import asyncio
+import gzip
+import hashlib
+import mimetypes
+import multiprocessing
+import time
+
+from fingerprint import load_headers_manifest
+from server import (
+    ENCODINGS,
+    UNOPTIMIZED_CACHE_CONTROL,
+    StaticServer,
+    StaticSite,
+    is_sidecar,
+    parse_accept_encoding,
+    serve_sites,
+)
+
+try:
+    import brotli
+
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# Sources whose changes trigger a rebuild: the generator modules and the
+# source images
+SOURCE_DIR = Path(__file__).resolve().parent
+IMAGES_DIR = Path("images")
+
+# Seconds between two looks at the sources; a change is rebuilt once the
+# sources stayed the same for one more interval, so editors can finish
+# writing
+POLL_INTERVAL = 0.1
+
+# Path of the server-sent event stream announcing rebuilds
+RELOAD_PATH = "/__reload"
+
+# Seconds between keep-alive comments on an idle event stream
+HEARTBEAT_INTERVAL = 15
+
+# Every page reloads itself when the site was rebuilt, after dropping the
+# caches of its service worker, which would otherwise answer with the
+# previous build
+RELOAD_SCRIPT = (
+    '<script>new EventSource("' + RELOAD_PATH + '").addEventListener("reload",function(){'
+    "var c=window.caches;(c?c.keys().then(function(k){return Promise.all(k.map("
+    "function(n){return c.delete(n)}))}):Promise.resolve()).then(function(){"
+    "location.reload()})})</script>"
+).encode()
+
+# Cache-Control of the optimized files the headers manifest does not cover,
+# revalidated so a reload picks up every rebuilt file
+WATCH_CACHE_CONTROL = "no-cache"
+
+
+def source_snapshot():
+    """Size and modification time of every watched source file"""
+    paths = list(SOURCE_DIR.glob("*.py"))
+    if IMAGES_DIR.is_dir():
+        paths += IMAGES_DIR.glob("*")
+    snapshot = {}
+    for path in paths:
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        snapshot[str(path)] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+
+def inject_reload_script(html):
+    """Page bytes with the live reload script before </body>, or at the
+    end of minified pages without one"""
+    index = html.rfind(b"</body>")
+    if index == -1:
+        return html + RELOAD_SCRIPT
+    return html[:index] + RELOAD_SCRIPT + html[index:]
+
+
+class MemorySite(StaticSite):
+    """Files of one generated website held in memory
+
+    refresh() loads the files a rebuild changed from the build directory
+    on a thread; requests are answered from memory only. Pages carry the live reload
+    script, with their precompressed sidecars re-encoded to match.
+    """
+
+    def __init__(self, root, cache_control, precompressed=True):
+        super().__init__(root, cache_control, precompressed)
+        self.files = {}
+        self.version = 0
+        self.reloaded = asyncio.Event()
+
+    async def refresh(self):
+        """Load new and changed files and drop deleted ones
+
+        The files are read on a thread so requests and event streams keep
+        being served, and swapped in at once on the event loop. Returns
+        the names of the changed files.
+        """
+        files, headers, changed = await asyncio.to_thread(self.scan)
+        self.files, self.headers = files, headers
+        return changed
+
+    def scan(self):
+        """The files of the build directory, its headers manifest and the
+        names of the files that changed since the last refresh
+
+        Only files whose size or modification time changed are read, and
+        only those whose content differs count as changed.
+        """
+        files = dict(self.files)
+        changed = []
+        seen = set()
+        for path in self.root.rglob("*"):
+            if not path.is_file():
+                continue
+            name = path.relative_to(self.root).as_posix()
+            stat = path.stat()
+            signature = (stat.st_size, stat.st_mtime_ns)
+            seen.add(name)
+            entry = files.get(name)
+            if entry is not None and entry["signature"] == signature:
+                continue
+            data = path.read_bytes()
+            digest = hashlib.sha256(data).hexdigest()
+            if entry is not None and entry["digest"] == digest:
+                files[name] = dict(entry, signature=signature)
+                continue
+            files[name] = self._entry(data, stat.st_mtime, signature, digest)
+            changed.append(name)
+        for name in set(files) - seen:
+            del files[name]
+            changed.append(name)
+
+        # Pages and their sidecars are re-derived from the page itself
+        pages = set()
+        for name in changed:
+            for suffix in [""] + [suffix for _, suffix in ENCODINGS]:
+                if name.endswith(".html" + suffix):
+                    pages.add(name.removesuffix(suffix))
+        for page in pages:
+            if page in files:
+                self._inject(files, page)
+
+        return files, load_headers_manifest(self.root), sorted(changed)
+
+    def _entry(self, data, mtime, signature, digest):
+        # digest is the hash of the file on disk, which for pages is not
+        # what is served
+        return {
+            "data": data,
+            "mtime": mtime,
+            "signature": signature,
+            "digest": digest,
+            "etag": hashlib.sha256(data).hexdigest()[:16],
+        }
+
+    def _inject(self, files, page):
+        entry = files[page]
+        data = inject_reload_script((self.root / page).read_bytes())
+        files[page] = self._entry(data, entry["mtime"], entry["signature"], entry["digest"])
+        for coding, suffix in ENCODINGS:
+            sidecar = files.get(page + suffix)
+            if sidecar is None:
+                continue
+            if coding == "gzip":
+                encoded = gzip.compress(data, compresslevel=9, mtime=0)
+            elif BROTLI_AVAILABLE:
+                encoded = brotli.compress(data)
+            else:
+                continue
+            files[page + suffix] = self._entry(
+                encoded, sidecar["mtime"], sidecar["signature"], sidecar["digest"]
+            )
+
+    def notify(self):
+        """Tell the open pages to reload"""
+        self.version += 1
+        reloaded, self.reloaded = self.reloaded, asyncio.Event()
+        reloaded.set()
+
+    def cache_control_for(self, url_path):
+        """Cache-Control from the headers manifest loaded by refresh(), if
+        it has one for the path, otherwise the site default"""
+        headers = self.headers.get(unquote(url_path)) or {}
+        return headers.get("Cache-Control", self.cache_control)
+
+    def lookup(self, url_path, accept_encoding=""):
+        """Pick the in-memory representation of a resource for the given
+        Accept-Encoding
+
+        Returns a dict describing the bytes to send, or None.
+        """
+        relative = unquote(url_path).lstrip("/")
+        if relative == "" or relative.endswith("/"):
+            relative += "index.html"
+        if any(part.startswith(".") for part in relative.split("/")) or is_sidecar(relative):
+            return None
+        if relative not in self.files:
+            return None
+
+        accepted = parse_accept_encoding(accept_encoding) if self.precompressed else set()
+        encoding = None
+        entry = self.files[relative]
+        for coding, suffix in ENCODINGS:
+            if coding in accepted and relative + suffix in self.files:
+                encoding, entry = coding, self.files[relative + suffix]
+                break
+
+        suffix = f"-{encoding}" if encoding else ""
+        return {
+            "body": entry["data"],
+            "size": len(entry["data"]),
+            "mtime": entry["mtime"],
+            "etag": f'"{entry["etag"]}{suffix}"',
+            "encoding": encoding,
+            "content_type": mimetypes.guess_type(relative)[0] or "application/octet-stream",
+            "cache_control": self.cache_control_for(url_path),
+        }
+
+
+class WatchServer(StaticServer):
+    """StaticServer for a MemorySite that also streams reload events"""
+
+    async def handle_request(self, head, writer, start):
+        """Answer one request, holding event stream requests open"""
+        try:
+            method, path, _, _ = self.parse_request(head)
+        except ValueError:
+            method = path = None
+        if method == "GET" and path == RELOAD_PATH:
+            await self.stream_reloads(writer, start)
+            return False
+        return await super().handle_request(head, writer, start)
+
+    async def stream_reloads(self, writer, start):
+        """Send a reload event after every rebuild until the page goes away"""
+        headers = {
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+        }
+        await self.send_response(writer, 200, headers, has_body=True)
+        self.log("GET", RELOAD_PATH, 200, None, 0, start)
+        seen = self.site.version
+        while True:
+            if self.site.version == seen:
+                try:
+                    await asyncio.wait_for(self.site.reloaded.wait(), HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    writer.write(b": ping\n\n")
+                    await writer.drain()
+                    continue
+            seen = self.site.version
+            writer.write(f"event: reload\ndata: {seen}\n\n".encode())
+            await writer.drain()
+
+
+async def run_build(build, args):
+    """Run a build in a freshly spawned process, so edited modules are
+    imported anew, and return its output"""
+    executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        return await asyncio.wrap_future(executor.submit(build, *args))
+    finally:
+        executor.shutdown(wait=False)
+
+
+def print_warnings(log):
+    for line in log.splitlines():
+        if "⚠" in line:
+            print(line)
+
+
+async def watch_sources(sites, build, args):
+    """Rebuild whenever the sources change and reload the affected sites"""
+    snapshot = source_snapshot()
+    while True:
+        await asyncio.sleep(POLL_INTERVAL)
+        current = source_snapshot()
+        if current == snapshot:
+            continue
+        # Wait for the sources to settle
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            latest = source_snapshot()
+            if latest == current:
+                break
+            current = latest
+
+        start = time.perf_counter()
+        changed = sorted(
+            Path(path).name
+            for path in current.keys() | snapshot.keys()
+            if current.get(path) != snapshot.get(path)
+        )
+        snapshot = current
+        print(f"\n↻ Changed: {', '.join(changed)}")
+        try:
+            print_warnings(await run_build(build, args))
+        except Exception as e:
+            print(f"  ⚠ Rebuild failed, still serving the previous build: {type(e).__name__}: {e}")
+            continue
+
+        for name, site, _ in sites:
+            files = await site.refresh()
+            if files:
+                site.notify()
+                print(f"  ✓ {name}: {len(files)} file(s) changed, reloading pages")
+            else:
+                print(f"  ↺ {name}: unchanged")
+        print(f"  ✓ Rebuilt in {time.perf_counter() - start:.2f}s")
+
+
+async def watch_sites(output_dir, build, args, host, port, unoptimized_port, quiet):
+    """Build once, then serve from memory and rebuild on changes"""
+    start = time.perf_counter()
+    print("Building both versions...")
+    print_warnings(await run_build(build, args))
+    sites = [
+        ("optimized", MemorySite(output_dir / "optimized", WATCH_CACHE_CONTROL), port),
+        (
+            "unoptimized",
+            MemorySite(output_dir / "unoptimized", UNOPTIMIZED_CACHE_CONTROL, precompressed=False),
+            unoptimized_port,
+        ),
+    ]
+    for name, site, _ in sites:
+        files = await site.refresh()
+        print(f"  ✓ Loaded {len(files)} {name} files into memory")
+    print(f"  ✓ Built in {time.perf_counter() - start:.2f}s, watching {SOURCE_DIR} and {IMAGES_DIR}/")
+
+    print("\n" + "=" * 50)
+    watcher = asyncio.create_task(watch_sources(sites, build, args))
+    try:
+        await serve_sites(sites, host, quiet=quiet, server_class=WatchServer)
+    finally:
+        watcher.cancel()
+
+
+def watch(output_dir, build, args, host="127.0.0.1", port=8080, unoptimized_port=8081, quiet=False):
+    """Serve both versions from memory and rebuild them on every change
+
+    build(*args) builds both versions into output_dir and returns its log;
+    it runs in a new process each time, so changes to the generator
+    modules take effect. Files the build cache finds unchanged, like the
+    encoded images, are reused, and only the files a rebuild changed are
+    reloaded into memory. Open pages reload through a server-sent event
+    stream.
+    """
+    try:
+        asyncio.run(
+            watch_sites(Path(output_dir), build, args, host, port, unoptimized_port, quiet)
+        )
+    except KeyboardInterrupt:
+        print("\nStopping servers...")
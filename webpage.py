@@ -1,25 +1,75 @@
 from pathlib import Path
 
+from resources import RESPONSIVE_WIDTHS, variant_formats
 
-def get_srcset_attr(optimized, img_name):
+
+def get_srcset_attr(optimized, img_name, suffix=None, widths=None):
+    """srcset and sizes of the responsive variants of an image, in the
+    source format or the one with the given suffix
+
+    widths are the planned breakpoints of the image, RESPONSIVE_WIDTHS if
+    they are not known.
+    """
     if optimized:
         # Extract filename and extension
         img_path = Path(img_name)
         stem = img_path.stem
-        suffix = img_path.suffix
-        return f' srcset="{stem}-200w{suffix} 200w, {stem}-400w{suffix} 400w, {stem}-800w{suffix} 800w, {stem}-1600w{suffix} 1600w" sizes="auto, (max-width: 30em) 100vw, (max-width: 50em) 50vw, calc(33vw - 100px)"'
+        suffix = suffix or img_path.suffix
+        candidates = ", ".join(
+            f"{stem}-{width}w{suffix} {width}w" for width in widths or RESPONSIVE_WIDTHS
+        )
+        return f' srcset="{candidates}" sizes="auto, (max-width: 30em) 100vw, (max-width: 50em) 50vw, calc(33vw - 100px)"'
     return ""
 
 
+def get_placeholder_attrs(image):
+    """style painting the blurred preview of an image (or its average
+    colour) as its background until the script clears it"""
+    if not image or not image.get("color"):
+        return ""
+    background = image["color"]
+    if image.get("placeholder"):
+        background += f' url({image["placeholder"]}) 50%/cover no-repeat'
+    return f' style="background:{background}" data-lqip'
+
+
+def get_picture_html(optimized, img_name, alt, img_attrs, image=None, placeholder=False):
+    """An image; optimized, a <picture> with one <source> per modern format
+    and the legacy fallback in the <img>
+
+    image is the image manifest entry written when the images were built;
+    optimized, its intrinsic size is set so the browser can reserve the
+    space before the image loads, and with placeholder that space shows
+    the blurred preview of the image meanwhile.
+    """
+    if not optimized:
+        return f'<img src="{img_name}" alt="{alt}"{img_attrs}>'
+
+    size_attrs = ""
+    if image:
+        size_attrs = f' width="{image["width"]}" height="{image["height"]}"'
+    if placeholder:
+        size_attrs += get_placeholder_attrs(image)
+
+    widths = [width for width, _ in (image or {}).get("variants", [])]
+    *modern, fallback = variant_formats(Path(img_name).suffix)
+    sources = "".join(
+        f'\n                            <source type="{mime_type}"{get_srcset_attr(optimized, img_name, extension, widths)}>'
+        for extension, mime_type, _, _ in modern
+    )
+    return f"""<picture>{sources}
+                            <img src="{img_name}" alt="{alt}"{img_attrs}{get_srcset_attr(optimized, img_name, fallback[0], widths)}{size_attrs}>
+                        </picture>"""
+
+
 def get_javascript(optimized, options=None):
     """Generate JavaScript content"""
     if options is None:
         options = {}
 
-    # Add unnecessary JavaScript for unoptimized version
-    extra_js = ""
-    if not optimized or not options.get("remove_unused_js", True):
-        extra_js = """
+    # Declarations nothing uses; the optimized build removes them when
+    # remove_unused_js is set
+    extra_js = """
 // Unused functions that bloat the JavaScript
 function unusedFunction1() {
     console.log("This function is never called");
@@ -38,6 +88,18 @@ const unusedObject = {
 };
 """
 
+    # Precaches the site for repeat visits (optimized only)
+    service_worker_js = ""
+    if optimized and options.get("service_worker", False):
+        service_worker_js = """
+    // Register the service worker that precaches the site
+    if ('serviceWorker' in navigator) {
+        window.addEventListener('load', function() {
+            navigator.serviceWorker.register('sw.js');
+        });
+    }
+"""
+
     js = f"""
 // Web Performance Comparison - JavaScript
 (function() {{
@@ -73,23 +135,39 @@ const unusedObject = {
         rootMargin: '0px 0px -50px 0px'
     }};
     
+    // Drop the inline placeholder of a lazy-loaded image once the image
+    // itself has loaded, so it does not show through transparent pixels
+    function clearPlaceholder(img) {{
+        if (img.complete) {{
+            img.style.background = '';
+        }} else {{
+            img.addEventListener('load', () => clearPlaceholder(img), {{ once: true }});
+        }}
+    }}
+    
     const observer = new IntersectionObserver(function(entries) {{
         entries.forEach(entry => {{
             if (entry.isIntersecting) {{
+                if ('lqip' in entry.target.dataset) {{
+                    clearPlaceholder(entry.target);
+                    observer.unobserve(entry.target);
+                    return;
+                }}
                 entry.target.style.opacity = '1';
                 entry.target.style.transform = 'translateY(0)';
             }}
         }});
     }}, observerOptions);
     
-    // Observe feature cards
+    // Observe feature cards and images with placeholders
+    document.querySelectorAll('img[data-lqip]').forEach(img => observer.observe(img));
     document.querySelectorAll('.feature-card').forEach(card => {{
         card.style.opacity = '0';
         card.style.transform = 'translateY(20px)';
         card.style.transition = 'opacity 0.6s ease, transform 0.6s ease';
         observer.observe(card);
     }});
-    
+{service_worker_js}
 {extra_js}
 }})();
 """
@@ -102,10 +180,9 @@ def get_css(optimized, options=None):
     if options is None:
         options = {}
 
-    # Add unnecessary CSS for unoptimized version
-    extra_css = ""
-    if not optimized or not options.get("remove_unused_css", True):
-        extra_css = """
+    # Styles no page uses; the optimized build purges them when
+    # remove_unused_css is set
+    extra_css = """
 /* Unused styles that bloat the CSS */
 .unused-class-1 { color: red; background: blue; }
 .unused-class-2 { margin: 50px; padding: 50px; }
@@ -354,18 +431,32 @@ footer {{
     return css
 
 
-def get_second_page_html(optimized=False, options=None):
+def get_css_include(optimized, options, css_content):
+    """Markup that applies the stylesheet to a page
+
+    With critical_css, css_content holds only the rules needed above the
+    fold and the full styles.css is loaded without blocking rendering.
+    """
+    if optimized and options.get("critical_css", False):
+        return f"""<style>{css_content}</style>
+    <link rel="preload" href="styles.css" as="style" onload="this.onload=null;this.rel='stylesheet'">
+    <noscript><link rel="stylesheet" href="styles.css"></noscript>"""
+    if optimized and options.get("inline_css", False):
+        return f"<style>{css_content}</style>"
+    return '<link rel="stylesheet" href="styles.css">'
+
+
+def get_second_page_html(optimized=False, options=None, css_content=None, js_content=None):
     """Generate second page HTML"""
     if options is None:
         options = {}
 
-    css_content = get_css(optimized, options)
-    js_content = get_javascript(optimized, options)
+    if css_content is None:
+        css_content = get_css(optimized, options)
+    if js_content is None:
+        js_content = get_javascript(optimized, options)
 
-    if optimized and options.get("inline_css", False):
-        css_include = f"<style>{css_content}</style>"
-    else:
-        css_include = '<link rel="stylesheet" href="styles.css">'
+    css_include = get_css_include(optimized, options, css_content)
 
     if optimized and options.get("inline_js", False):
         js_include = f"<script>{js_content}</script>"
@@ -434,8 +525,28 @@ def get_second_page_html(optimized=False, options=None):
 
 
 def get_html_page(
-    optimized, css_include, js_include, resource_hints, preconnect, img_attrs
+    optimized,
+    css_include,
+    js_include,
+    resource_hints,
+    preconnect,
+    img_attrs,
+    images=None,
+    lcp_image=None,
+    lcp_attrs="",
+    placeholders=False,
 ):
+    images = images or {}
+
+    def picture(img_name, alt):
+        # The LCP image loads eagerly, all others as given by img_attrs and
+        # with a placeholder until they arrive
+        if img_name == lcp_image:
+            return get_picture_html(optimized, img_name, alt, lcp_attrs, images.get(img_name))
+        return get_picture_html(
+            optimized, img_name, alt, img_attrs, images.get(img_name), placeholders
+        )
+
     return f"""<!DOCTYPE html>
 <html lang="en">
 <head>
@@ -477,16 +588,16 @@ def get_html_page(
                 <h2>Gallery</h2>
                 <div class="image-grid">
                     <div class="image-item">
-                        <img src="image1.PNG" alt="Image 1"{img_attrs}{get_srcset_attr(optimized, 'image1.PNG')} width="40vw" height="30vw">
+                        {picture('image1.PNG', 'Image 1')}
                     </div>
                     <div class="image-item">
-                        <img src="image2.WebP" alt="Image 2"{img_attrs}{get_srcset_attr(optimized, 'image2.WebP')} width="40vw" height="30vw">
+                        {picture('image2.WebP', 'Image 2')}
                     </div>
                     <div class="image-item">
-                        <img src="image3.AVIF" alt="Image 3"{img_attrs}{get_srcset_attr(optimized, 'image3.AVIF')} width="40vw" height="30vw">
+                        {picture('image3.AVIF', 'Image 3')}
                     </div>
                     <div class="image-item">
-                        <img src="image4.JPEG" alt="Image 4"{img_attrs}{get_srcset_attr(optimized, 'image4.JPEG')} width="40vw" height="30vw">
+                        {picture('image4.JPEG', 'Image 4')}
                     </div>
                 </div>
             </div>